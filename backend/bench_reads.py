@@ -0,0 +1,87 @@
+"""
+Concurrent read benchmark for the community API.
+
+Fires the same set of GET requests at one or more running deployments and
+reports throughput and latency percentiles for each, e.g. the sync DRF
+views under gunicorn against the async views under uvicorn:
+
+    gunicorn config.wsgi:application -w 4 -b 127.0.0.1:8000
+    uvicorn config.asgi:application --workers 4 --port 8001
+
+    python bench_reads.py \\
+        --target wsgi=http://127.0.0.1:8000/api/community/ \\
+        --target asgi=http://127.0.0.1:8001/api/community/async/ \\
+        --path posts/ --path posts/1/ --path "comments/?post=1" --path categories/ \\
+        --concurrency 64 --requests 2000
+
+Paths are relative to each target's base URL. Pass --token to benchmark
+authenticated (uncached) reads.
+"""
+import argparse
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def fetch(url, token):
+    request = urllib.request.Request(url, headers={'Accept': 'application/json'})
+    if token:
+        request.add_header('Authorization', f'Bearer {token}')
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            ok = response.status == 200
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def run(base_url, paths, concurrency, total, token):
+    urls = [base_url.rstrip('/') + '/' + paths[i % len(paths)].lstrip('/') for i in range(total)]
+    # Warm connections, caches and lazy imports before measuring
+    for url in urls[:len(paths)]:
+        fetch(url, token)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda url: fetch(url, token), urls))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, ok in results if ok)
+    errors = sum(1 for _, ok in results if not ok)
+    if not latencies:
+        return {'rps': 0.0, 'errors': errors}
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': quantiles[49] * 1000,
+        'p95': quantiles[94] * 1000,
+        'p99': quantiles[98] * 1000,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--target', action='append', required=True, help='name=base_url (repeatable)')
+    parser.add_argument('--path', action='append', required=True, help='path relative to each base URL (repeatable)')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--token', help='JWT access token for authenticated reads')
+    args = parser.parse_args()
+
+    print(f"{'target':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for target in args.target:
+        name, _, base_url = target.partition('=')
+        stats = run(base_url, args.path, args.concurrency, args.requests, args.token)
+        if 'p50' not in stats:
+            print(f"{name:<12}{'-':>10}{'-':>10}{'-':>10}{'-':>10}{stats['errors']:>8}")
+            continue
+        print(f"{name:<12}{stats['rps']:>10.1f}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}{stats['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
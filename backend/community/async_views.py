@@ -0,0 +1,239 @@
+"""
+Async read endpoints for the busiest pages.
+
+Native Django async views over the async ORM, mounted under
+/api/community/async/ and meant to be served by an ASGI server
+(e.g. uvicorn config.asgi:application) so a request waiting on the
+database does not hold a worker thread. They return the same payloads as
+the DRF ViewSets' list/detail actions (feeds use page-number pagination)
+and share their querysets, viewer-state hydration, response cache and
+ETag/Last-Modified validators.
+
+Serializers run on the event loop, so every relation they touch must be
+select_related/prefetched or supplied through hydrate_viewer_state first;
+a lazy query there raises SynchronousOnlyOperation.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.exceptions import InvalidToken
+from config.renderers import dumps
+from users.authentication import ClaimsJWTAuthentication
+
+from .cache import get_cache, get_timeout, get_validators, record, response_etag, response_key, response_scopes
+from .directory import get_category_listing
+from .events import format_sse, subscribe
+from .models import Category
+from .pagination import StandardResultsSetPagination
+from .ranking import sort_field
+from .serializers import (
+    CategorySerializer, CommentSerializer, PostListSerializer, PostSerializer, has_sparse_params, output_fields,
+)
+from .viewer_state import VIEWER_FIELDS, hydrate_viewer_state
+from .views import (
+    CATEGORY_SCOPES, comment_list_queryset, comment_list_scopes, post_detail_scopes, post_feed_queryset,
+    post_list_scopes,
+)
+
+HEARTBEAT_INTERVAL = 15
+
+
+def _json(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+async def _authenticate(request):
+    """
+    Resolves the JWT bearer user the way the DRF views do. Returns None
+    when a token was sent but is invalid.
+    """
+    try:
+        result = await sync_to_async(ClaimsJWTAuthentication().authenticate)(request)
+    except (AuthenticationFailed, InvalidToken):
+        return None
+    return result[0] if result else AnonymousUser()
+
+
+def _page_params(request):
+    paginator = StandardResultsSetPagination
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    try:
+        page_size = min(max(int(request.GET.get(paginator.page_size_query_param)), 1), paginator.max_page_size)
+    except (TypeError, ValueError):
+        page_size = paginator.page_size
+    return page, page_size
+
+
+def _page_links(request, page, page_size, count):
+    url = request.build_absolute_uri()
+    next_link = replace_query_param(url, 'page', page + 1) if page * page_size < count else None
+    previous_link = None
+    if page == 2:
+        previous_link = remove_query_param(url, 'page')
+    elif page > 2:
+        previous_link = replace_query_param(url, 'page', page - 1)
+    return next_link, previous_link
+
+
+async def _respond(request, name, scopes, build):
+    """
+    Async counterpart of CachedResponseMixin.cached_response: authenticates,
+    answers matching conditional requests with 304, serves anonymous
+    requests from the response cache and otherwise awaits build(user),
+    which returns (data, status).
+    """
+    user = await _authenticate(request)
+    if user is None:
+        return _json({'detail': 'Given token not valid for any token type'}, status=401)
+    request.user = user
+
+    scopes = response_scopes(scopes, user)
+    generations, last_modified = await sync_to_async(get_validators)(scopes)
+    etag = response_etag(request, scopes, generations)
+
+    def with_validators(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    if get_conditional_response(request, etag=etag, last_modified=int(last_modified)) is not None:
+        return with_validators(HttpResponseNotModified())
+
+    if user.is_authenticated:
+        data, status = await build(user)
+        response = _json(data, status)
+        return with_validators(response) if status == 200 else response
+
+    cache = get_cache()
+    key = response_key(request, scopes, generations)
+    data = await cache.aget(key)
+    if data is not None:
+        await sync_to_async(record)(name, 'hit')
+        return with_validators(_json(data))
+
+    await sync_to_async(record)(name, 'miss')
+    data, status = await build(user)
+    if status != 200:
+        return _json(data, status)
+    await cache.aset(key, data, get_timeout())
+    return with_validators(_json(data))
+
+
+async def _serialize_posts(request, user, posts, serializer_class, many=True):
+    context = {'request': request}
+    if VIEWER_FIELDS & output_fields(serializer_class, request):
+        context.update(await sync_to_async(hydrate_viewer_state)(user, posts=posts))
+    return serializer_class(posts if many else posts[0], many=many, context=context).data
+
+
+@require_safe
+async def post_list(request):
+    ranking_field = sort_field(request.GET.get('sort'), request.GET.get('window'))
+
+    async def build(user):
+        queryset = await sync_to_async(post_feed_queryset)(request.GET, ranking_field)
+        queryset = PostListSerializer.optimize_queryset(queryset, output_fields(PostListSerializer, request))
+        page, page_size = _page_params(request)
+        count = await queryset.acount()
+        if count and (page - 1) * page_size >= count:
+            return {'detail': 'Invalid page.'}, 404
+        posts = [post async for post in queryset[(page - 1) * page_size:page * page_size]]
+        next_link, previous_link = _page_links(request, page, page_size, count)
+        return {
+            'count': count,
+            'next': next_link,
+            'previous': previous_link,
+            'results': await _serialize_posts(request, user, posts, PostListSerializer),
+        }, 200
+
+    return await _respond(request, 'post', post_list_scopes(request.GET), build)
+
+
+@require_safe
+async def post_detail(request, pk):
+    async def build(user):
+        post = await post_feed_queryset({}).filter(pk=pk).afirst()
+        if post is None:
+            return {'detail': 'No Post matches the given query.'}, 404
+        return await _serialize_posts(request, user, [post], PostSerializer, many=False), 200
+
+    return await _respond(request, 'post', post_detail_scopes(pk), build)
+
+
+@require_safe
+async def comment_list(request):
+    async def build(user):
+        comments = [comment async for comment in comment_list_queryset(request.GET)]
+        context = {'request': request}
+        if VIEWER_FIELDS & output_fields(CommentSerializer, request):
+            context.update(await sync_to_async(hydrate_viewer_state)(user, comments=comments))
+        return CommentSerializer(comments, many=True, context=context).data, 200
+
+    return await _respond(request, 'comment', comment_list_scopes(request.GET), build)
+
+
+@require_safe
+async def category_list(request):
+    async def build(user):
+        def serialize(queryset):
+            return CategorySerializer(queryset, many=True, context={'request': request}).data
+        if has_sparse_params(request):
+            return await sync_to_async(serialize)(
+                Category.objects.select_related('created_by').order_by('-post_count', 'name')
+            ), 200
+        return await sync_to_async(get_category_listing)(serialize), 200
+
+    return await _respond(request, 'category', CATEGORY_SCOPES, build)
+
+
+@require_safe
+async def event_stream(request):
+    """
+    Server-Sent Events for one post (?post=<id>: new comments and score
+    changes), one category (?category=<slug>) or by default the whole feed
+    (new posts and post score changes). Sends a comment line every
+    HEARTBEAT_INTERVAL seconds so proxies keep the connection open.
+
+    Only served under ASGI: a WSGI worker would be held for the lifetime of
+    every open stream, so WSGI requests get a 501.
+    """
+    if not isinstance(request, ASGIRequest):
+        return _json({'detail': 'Live updates require the ASGI server (config.asgi:application).'}, status=501)
+
+    post_id = request.GET.get('post')
+    category_slug = request.GET.get('category')
+    if post_id is not None:
+        if not post_id.isdigit():
+            return _json({'post': 'A valid integer is required.'}, status=400)
+        channels = [f'post:{post_id}']
+    elif category_slug is not None:
+        channels = [f'category:{category_slug}']
+    else:
+        channels = ['feed']
+
+    async def stream():
+        yield 'retry: 5000\n\n'
+        events = subscribe(channels, HEARTBEAT_INTERVAL)
+        try:
+            async for message in events:
+                yield format_sse(message) if message is not None else ': keep-alive\n\n'
+        finally:
+            await events.aclose()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
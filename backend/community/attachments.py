@@ -0,0 +1,80 @@
+"""
+Multi-image post attachments.
+
+The images of a post are written to storage (and their variants rendered)
+concurrently on a bounded thread pool before any row is inserted; the
+PostImage rows then go in with a single bulk_create. If a write or the
+insert fails, every file written so far is deleted again so a failed
+request leaves neither rows nor orphaned files behind.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db.models.fields.files import ImageFieldFile
+
+from .imaging import delete_variants, generate_variants
+from .models import PostImage
+
+DEFAULT_WORKERS = 4
+
+
+def get_workers():
+    return getattr(settings, 'POST_IMAGE_UPLOAD_WORKERS', DEFAULT_WORKERS)
+
+
+def _store(uploaded):
+    field = PostImage._meta.get_field('image')
+    image = PostImage()
+    name = field.storage.save(field.generate_filename(image, uploaded.name), uploaded)
+    field_file = ImageFieldFile(image, field, name)
+    try:
+        variants = generate_variants(field_file)
+    except Exception:
+        field.storage.delete(name)
+        raise
+    return name, variants
+
+
+def store_post_images(files):
+    """
+    Saves the uploaded files and their variants, at most get_workers() at a
+    time. Returns [(name, variants)] in upload order. Touches no database
+    rows, so it runs outside the caller's transaction. Waits for every write
+    to settle before cleaning up and re-raising the first failure.
+    """
+    files = list(files)
+    if not files:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(get_workers(), len(files))) as pool:
+        futures = [pool.submit(_store, uploaded) for uploaded in files]
+
+    stored, errors = [], []
+    for future in futures:
+        if future.exception() is not None:
+            errors.append(future.exception())
+        else:
+            stored.append(future.result())
+    if errors:
+        discard_post_images(stored)
+        raise errors[0]
+    return stored
+
+
+def attach_post_images(post, stored):
+    """
+    Inserts the PostImage rows for files returned by store_post_images with
+    one bulk_create. Variants are already in place, so the post_save
+    handlers that bulk_create skips have nothing left to do.
+    """
+    return PostImage.objects.bulk_create([
+        PostImage(post=post, image=name, image_variants=variants)
+        for name, variants in stored
+    ])
+
+
+def discard_post_images(stored):
+    storage = PostImage._meta.get_field('image').storage
+    for name, variants in stored:
+        delete_variants(storage, variants)
+        storage.delete(name)
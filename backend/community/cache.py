@@ -0,0 +1,275 @@
+"""
+Versioned response cache for anonymous reads.
+
+Cached entries are keyed by the request URL plus the current value of one or
+more generation counters ("scopes"). Writes never delete entries; they bump
+the counters for the scopes they affect, so every key built afterwards is
+new and stale entries simply age out.
+
+Scopes:
+    all                 every cached response (bumped after bulk rebuilds)
+    posts               main feed and author feeds
+    post:<id>           post detail and the post's comment list
+    category:<slug>     ?category=<slug> feeds
+    categories          category list and detail, and every response that
+                        embeds a category (post lists and detail); bumped
+                        on category edits and when posts are created,
+                        deleted or moved, not on votes or comments
+    category-slugs      the category slug -> id map (community.directory)
+    users               every response that embeds a user (authors, category
+                        creators); bumped on profile edits
+    rankings            post lists, whose hot/top order decay_rankings changes
+    comments            comment lists not filtered by post
+    viewer:<user id>    per-viewer state such as saved posts
+
+A response must list the scope of everything it embeds, not only of what it
+is about: a post detail that is only keyed on post:<id> would keep serving
+the old category name after a rename.
+
+The same counters double as HTTP validators: list and detail responses carry
+an ETag derived from the generations they were built from and a Last-Modified
+from the time those scopes were last bumped, and a conditional GET that still
+matches is answered with 304 before any query or serialization runs.
+
+Backed by Django's cache framework (COMMUNITY_CACHE_ALIAS, "default" unless
+configured); point that alias at a shared backend such as Redis when running
+more than one worker process, otherwise each process only sees its own bumps
+and can serve stale data for up to COMMUNITY_CACHE_TIMEOUT seconds.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+KEY_PREFIX = 'community'
+
+
+def get_cache():
+    return caches[getattr(settings, 'COMMUNITY_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'COMMUNITY_CACHE_TIMEOUT', 60)
+
+
+def _generation_key(scope):
+    return f'{KEY_PREFIX}:gen:{scope}'
+
+
+def _modified_key(scope):
+    return f'{KEY_PREFIX}:mod:{scope}'
+
+
+def _initial_generation():
+    # Seed counters from the clock so a counter that was evicted never comes
+    # back with a value an old entry was keyed on.
+    return int(time.time() * 1000)
+
+
+def get_validators(scopes):
+    """
+    Returns ([generation per scope], last_modified) where last_modified is
+    the latest time any of the scopes was bumped or first seen, as a Unix
+    timestamp.
+    """
+    cache = get_cache()
+    keys = [_generation_key(scope) for scope in scopes]
+    modified_keys = [_modified_key(scope) for scope in scopes]
+    values = cache.get_many(keys + modified_keys)
+    missing = [key for key in keys + modified_keys if key not in values]
+    if missing:
+        seeds = {key: _initial_generation() for key in keys}
+        now = time.time()
+        for key in missing:
+            cache.add(key, seeds.get(key, now), timeout=None)
+        values.update(cache.get_many(missing))
+    generations = [values.get(key, 0) for key in keys]
+    last_modified = max((values.get(key, 0) for key in modified_keys), default=0)
+    return generations, last_modified
+
+
+def get_generations(scopes):
+    return get_validators(scopes)[0]
+
+
+def bump(*scopes):
+    """
+    Invalidates every cached response keyed on any of the given scopes.
+    """
+    cache = get_cache()
+    now = time.time()
+    for scope in set(scopes):
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), timeout=None)
+        cache.set(_modified_key(scope), now, timeout=None)
+
+
+def post_scopes(post, *category_slugs, categories=False):
+    """
+    Scopes touched by a write to post (or to one of its comments or votes).
+    Pass the old category slug as well when a post moves category, and
+    categories=True when it is created, deleted or moved: only those change
+    the category post counts that every post response embeds.
+    """
+    slugs = {post.category.slug, *category_slugs}
+    scopes = ['posts', 'comments', f'post:{post.pk}', *[f'category:{slug}' for slug in slugs if slug]]
+    if categories:
+        scopes.append('categories')
+    return scopes
+
+
+def invalidate_post(post, *category_slugs, categories=False):
+    bump(*post_scopes(post, *category_slugs, categories=categories))
+
+
+def invalidate_categories():
+    # Post responses list 'categories' since they embed their category
+    bump('categories', 'category-slugs')
+
+
+def invalidate_users():
+    bump('users')
+
+
+def invalidate_rankings():
+    bump('rankings')
+
+
+def invalidate_all():
+    # Per-post scopes cannot be enumerated; every response key includes 'all'.
+    bump('all', 'categories', 'category-slugs')
+
+
+def response_scopes(scopes, user):
+    """
+    Full scope list for a response: the view's own scopes plus 'all' and,
+    for authenticated requests, the viewer's scope.
+    """
+    scopes = ['all', *scopes]
+    if user is not None and user.is_authenticated:
+        scopes.append(f'viewer:{user.pk}')
+    return scopes
+
+
+def invalidate_viewer(user):
+    bump(f'viewer:{user.pk}')
+
+
+def invalidate_viewers(user_ids):
+    bump(*[f'viewer:{user_id}' for user_id in user_ids])
+
+
+def _versioned_digest(request, scopes, generations):
+    raw = '|'.join([request.get_full_path()] + [f'{s}={g}' for s, g in zip(scopes, generations)])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def response_key(request, scopes, generations=None):
+    if generations is None:
+        generations = get_generations(scopes)
+    return f'{KEY_PREFIX}:resp:{_versioned_digest(request, scopes, generations)}'
+
+
+def response_etag(request, scopes, generations):
+    # Rendered bytes also depend on the negotiated format
+    accept = hashlib.sha1(request.META.get('HTTP_ACCEPT', '').encode('utf-8')).hexdigest()[:8]
+    return quote_etag(f'{_versioned_digest(request, scopes, generations)}-{accept}')
+
+
+def record(view_name, outcome):
+    cache = get_cache()
+    for key in (f'{KEY_PREFIX}:stats:{outcome}', f'{KEY_PREFIX}:stats:{view_name}:{outcome}'):
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+
+
+def get_stats(view_names):
+    """
+    Returns hit/miss counters overall and per view for tuning.
+    """
+    cache = get_cache()
+    names = [None, *view_names]
+    keys = {
+        (name, outcome): f'{KEY_PREFIX}:stats:{name + ":" if name else ""}{outcome}'
+        for name in names for outcome in ('hit', 'miss')
+    }
+    values = cache.get_many(list(keys.values()))
+
+    def summary(name):
+        hits = values.get(keys[(name, 'hit')], 0)
+        misses = values.get(keys[(name, 'miss')], 0)
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / total, 4) if total else None}
+
+    stats = summary(None)
+    stats['views'] = {name: summary(name) for name in view_names}
+    return stats
+
+
+class CachedResponseMixin:
+    """
+    ViewSet mixin for list/retrieve. Views describe what their responses
+    depend on through get_cache_scopes(). Every response carries ETag and
+    Last-Modified validators built from those scopes (plus the viewer's own
+    scope when authenticated), and matching conditional requests get a 304
+    before the view runs. Anonymous responses are additionally served from
+    the response cache; authenticated ones carry per-viewer fields and always
+    go to the database.
+    """
+    cache_name = None
+
+    def get_cache_scopes(self):
+        raise NotImplementedError
+
+    def get_cache_name(self):
+        return self.cache_name or self.basename
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        authenticated = bool(request.user and request.user.is_authenticated)
+        scopes = response_scopes(self.get_cache_scopes(), request.user)
+        generations, last_modified = get_validators(scopes)
+        etag = response_etag(request, scopes, generations)
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if not_modified is not None:
+            return self.with_validators(not_modified, etag, last_modified)
+
+        if authenticated:
+            return self.with_validators(handler(request, *args, **kwargs), etag, last_modified)
+
+        cache = get_cache()
+        key = response_key(request, scopes, generations)
+        data = cache.get(key)
+        if data is not None:
+            record(self.get_cache_name(), 'hit')
+            return self.with_validators(Response(data), etag, last_modified)
+
+        record(self.get_cache_name(), 'miss')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, get_timeout())
+        return self.with_validators(response, etag, last_modified)
+
+    def with_validators(self, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            # Authenticated representations differ per viewer
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
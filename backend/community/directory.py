@@ -0,0 +1,79 @@
+"""
+Category directory.
+
+Categories carry a persisted post_count kept current by the Post signals, so
+listing them needs no aggregate over posts. The serialized listing and the
+slug -> id map used by ?category=<slug> feeds are held in the community
+cache under the 'categories' and 'category-slugs' generation counters (see
+community.cache), the listing also under 'users' for its embedded creators,
+so a warm cache answers both without querying categories.
+"""
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .cache import KEY_PREFIX, get_cache, get_generations
+from .models import Category
+
+
+def get_timeout():
+    return getattr(settings, 'CATEGORY_DIRECTORY_TIMEOUT', 3600)
+
+
+def _versioned_key(name, *scopes):
+    generations = get_generations(scopes)
+    return f"{KEY_PREFIX}:{name}:{':'.join(map(str, generations))}"
+
+
+def adjust_post_count(category_id, delta):
+    if category_id is not None and delta:
+        Category.objects.filter(pk=category_id).update(post_count=F('post_count') + delta)
+
+
+def rebuild_category_counts(category_model, post_model):
+    """
+    Recomputes post_count for every category. Takes the models as arguments
+    so migrations can pass their historical versions.
+    """
+    posts = (
+        post_model.objects
+        .filter(category=OuterRef('pk'))
+        .order_by()
+        .values('category')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return category_model.objects.update(post_count=Coalesce(Subquery(posts), Value(0)))
+
+
+def get_category_ids():
+    """
+    Returns {slug: id} for every category.
+    """
+    cache = get_cache()
+    key = _versioned_key('category-ids', 'category-slugs')
+    ids = cache.get(key)
+    if ids is None:
+        ids = dict(Category.objects.values_list('slug', 'id'))
+        cache.set(key, ids, get_timeout())
+    return ids
+
+
+def category_id_for_slug(slug):
+    return get_category_ids().get(slug)
+
+
+def get_category_listing(serialize):
+    """
+    Returns the serialized category list, busiest first. serialize turns a
+    queryset into response data and only runs on a cache miss.
+    """
+    cache = get_cache()
+    # The listing embeds each category's creator
+    key = _versioned_key('category-listing', 'categories', 'users')
+    listing = cache.get(key)
+    if listing is None:
+        queryset = Category.objects.select_related('created_by').order_by('-post_count', 'name')
+        listing = serialize(queryset)
+        cache.set(key, listing, get_timeout())
+    return listing
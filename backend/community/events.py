@@ -0,0 +1,200 @@
+"""
+Live update events.
+
+Views publish small JSON events (post-created, comment-created,
+score-changed) to named channels; the SSE endpoint in community.async_views
+subscribes to the channels a page cares about and streams them to the
+browser instead of the page re-polling the REST API.
+
+Channels:
+    feed                every new post and post score change
+    category:<slug>     the same, for one category
+    post:<id>           new comments and score changes on one post
+
+The bus is pluggable through COMMUNITY_EVENT_BACKEND: a backend implements
+publish(channel, message) and an async generator subscribe(channels,
+timeout). LocalEventBackend (the default) only reaches subscribers in the
+publishing process, which is enough when a single ASGI process serves both
+the API and the streams; RedisEventBackend fans events out across processes
+through Redis pub/sub (requires the redis package and
+COMMUNITY_EVENT_REDIS_URL).
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+CHANNEL_PREFIX = 'community:events:'
+QUEUE_SIZE = 100
+
+
+class LocalEventBackend:
+    """
+    In-process bus. Publishing is thread-safe: sync views run in worker
+    threads while subscribers wait on their own event loop.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            targets = list(self._subscribers.get(channel, ()))
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:
+                # The subscriber's loop has already closed
+                pass
+
+    async def subscribe(self, channels, timeout):
+        queue = asyncio.Queue(QUEUE_SIZE)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscriber)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                for channel in channels:
+                    subscribers = self._subscribers.get(channel, set())
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        self._subscribers.pop(channel, None)
+
+
+class RedisEventBackend:
+    def __init__(self):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as exc:
+            raise ImproperlyConfigured('RedisEventBackend requires the redis package') from exc
+        url = getattr(settings, 'COMMUNITY_EVENT_REDIS_URL', None)
+        if not url:
+            raise ImproperlyConfigured('RedisEventBackend requires COMMUNITY_EVENT_REDIS_URL')
+        self._client = redis.Redis.from_url(url)
+        self._async_redis = redis.asyncio
+        self._url = url
+
+    def publish(self, channel, message):
+        self._client.publish(CHANNEL_PREFIX + channel, message)
+
+    async def subscribe(self, channels, timeout):
+        client = self._async_redis.Redis.from_url(self._url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*[CHANNEL_PREFIX + channel for channel in channels])
+        try:
+            while True:
+                item = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+                if item is None:
+                    yield None
+                    continue
+                data = item['data']
+                yield data.decode('utf-8') if isinstance(data, bytes) else data
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+def _offer(queue, message):
+    # Slow consumers lose events rather than growing without bound
+    if not queue.full():
+        queue.put_nowait(message)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'COMMUNITY_EVENT_BACKEND', 'community.events.LocalEventBackend')
+                _backend = import_string(path)()
+    return _backend
+
+
+def publish(channels, event, data):
+    """
+    Sends event to every subscriber of any of channels once the current
+    transaction commits, so listeners never hear about rolled-back writes.
+    """
+    message = json.dumps({'event': event, 'data': data}, cls=DjangoJSONEncoder)
+
+    def send():
+        backend = get_backend()
+        for channel in set(channels):
+            backend.publish(channel, message)
+
+    transaction.on_commit(send)
+
+
+def subscribe(channels, timeout):
+    """
+    Async iterator over the JSON messages published to channels. Yields
+    None whenever timeout seconds pass without one, so callers can send
+    keep-alives.
+    """
+    return get_backend().subscribe(list(channels), timeout)
+
+
+def publish_post_created(post):
+    publish(
+        ['feed', f'category:{post.category.slug}'],
+        'post-created',
+        {
+            'id': post.pk,
+            'title': post.title,
+            'category': post.category.slug,
+            'author': post.author.username,
+            'created_at': post.created_at,
+        },
+    )
+
+
+def publish_comment_created(comment):
+    publish(
+        [f'post:{comment.post_id}'],
+        'comment-created',
+        {
+            'id': comment.pk,
+            'post': comment.post_id,
+            'parent': comment.parent_id,
+            'author': comment.author.username,
+            'created_at': comment.created_at,
+        },
+    )
+
+
+def publish_score_changed(target, score):
+    """
+    target is the Post or Comment that was voted on.
+    """
+    if target._meta.model_name == 'post':
+        channels = ['feed', f'category:{target.category.slug}', f'post:{target.pk}']
+        data = {'kind': 'post', 'id': target.pk, 'post': target.pk, 'score': score}
+    else:
+        channels = [f'post:{target.post_id}']
+        data = {'kind': 'comment', 'id': target.pk, 'post': target.post_id, 'score': score}
+    publish(channels, 'score-changed', data)
+
+
+def format_sse(message):
+    """
+    Frames a published message as a Server-Sent Event.
+    """
+    payload = json.loads(message)
+    return f"event: {payload['event']}\ndata: {json.dumps(payload['data'])}\n\n"
@@ -0,0 +1,122 @@
+"""
+NDJSON export of posts with their comments and vote totals.
+
+One line per post, oldest first, with the post's comments nested in thread
+order. Posts are read with QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+and their comments prefetched one chunk at a time, so memory use depends on
+the chunk size and not on the size of the export. Vote totals are the
+denormalized upvotes/downvotes/score columns (see rebuild_vote_counts).
+"""
+import datetime
+
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from config.renderers import dumps
+
+from .models import Category, Comment, Post
+
+EXPORT_CHUNK_SIZE = 500
+
+CONTENT_TYPE = 'application/x-ndjson'
+
+
+def parse_bound(value, end=False):
+    """
+    Parses a --since/--until value: an ISO 8601 datetime, or a date meaning
+    the start of that day (end=False) or the start of the next one (end=True).
+    Raises ValueError when it is neither.
+    """
+    # Dates first: parse_datetime also accepts a bare date, as midnight
+    day = parse_date(value)
+    if day is not None:
+        if end:
+            day += datetime.timedelta(days=1)
+        moment = datetime.datetime.combine(day, datetime.time())
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(f'{value!r} is not an ISO 8601 date or datetime')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(category=None, since=None, until=None):
+    """
+    Posts to export: in the category with slug category (if given) created
+    in [since, until) as parsed by parse_bound. Raises ValueError for an
+    unknown category or a malformed bound.
+    """
+    queryset = Post.objects.select_related('author', 'category')
+    if category:
+        category_id = Category.objects.filter(slug=category).values_list('pk', flat=True).first()
+        if category_id is None:
+            raise ValueError(f'No category with slug {category!r}')
+        queryset = queryset.filter(category_id=category_id)
+    if since:
+        queryset = queryset.filter(created_at__gte=parse_bound(since))
+    if until:
+        queryset = queryset.filter(created_at__lt=parse_bound(until, end=True))
+    comments = Comment.objects.select_related('author').order_by('path')
+    return queryset.prefetch_related(Prefetch('comments', queryset=comments)).order_by('created_at', 'id')
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'parent': comment.parent_id,
+        'depth': comment.depth,
+        'author': comment.author.username,
+        'content': comment.content,
+        'upvotes': comment.upvotes,
+        'downvotes': comment.downvotes,
+        'score': comment.score,
+        'created_at': comment.created_at,
+        'updated_at': comment.updated_at,
+    }
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'category': post.category.slug,
+        'author': post.author.username,
+        'title': post.title,
+        'content': post.content,
+        'post_type': post.post_type,
+        'link_url': post.link_url,
+        'image': post.image.name or None,
+        'video': post.video.name or None,
+        'upvotes': post.upvotes,
+        'downvotes': post.downvotes,
+        'score': post.score,
+        'comment_count': post.comment_count,
+        'created_at': post.created_at,
+        'updated_at': post.updated_at,
+        'comments': [serialize_comment(comment) for comment in post.comments.all()],
+    }
+
+
+def export_lines(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields one NDJSON line (bytes) per post of queryset.
+    """
+    for post in queryset.iterator(chunk_size=chunk_size):
+        yield dumps(serialize_post(post)) + b'\n'
+
+
+async def aiter_lines(lines):
+    """
+    Adapts export_lines for ASGI, where Django would otherwise read a sync
+    iterator into memory before sending it. Every step runs in the same
+    thread (thread_sensitive), so the database cursor stays usable.
+    """
+    lines = iter(lines)
+    step = sync_to_async(next, thread_sensitive=True)
+    while True:
+        line = await step(lines, None)
+        if line is None:
+            return
+        yield line
@@ -0,0 +1,233 @@
+"""
+Image derivatives for uploaded pictures.
+
+For every uploaded image (post images, post cover images, category icons and
+profile pictures) we store fixed-width JPEG (PNG for images with
+transparency) and WebP variants next to the original, with EXIF/ICC metadata
+stripped and orientation applied. The stored names are recorded in a
+<field>_variants JSONField on the model so serializers can build a srcset
+without touching storage:
+
+    {"source": "post_images/a.jpg",
+     "widths": {"320": {"webp": "post_images/a__w320.webp", "jpeg": "post_images/a__w320.jpg"}, ...}}
+
+Originals are cleaned on the way in: StrippedImageField re-encodes uploads
+that carry EXIF (including GPS), XMP or comment metadata, and rejects images
+over Pillow's MAX_IMAGE_PIXELS before they are decoded.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import ExifTags, Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+DEFAULT_WIDTHS = (320, 640, 1280)
+DEFAULT_QUALITY = 80
+ORIGINAL_QUALITY = 95
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+STRIPPABLE_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+def get_widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_VARIANT_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def get_quality():
+    return getattr(settings, 'IMAGE_VARIANT_QUALITY', DEFAULT_QUALITY)
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=get_quality(), method=4)
+    elif fmt == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.convert('RGB').save(buffer, 'JPEG', quality=get_quality(), optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _open(fp):
+    # Pillow only warns between MAX_IMAGE_PIXELS and twice that; refuse those
+    # sizes too, so nothing over the limit is ever decoded. Open is lazy, so
+    # the size is known before any pixel data is read. (Escalating the
+    # warning instead would change process-wide warning filters from the
+    # upload worker threads.)
+    image = Image.open(fp)
+    pixels = image.width * image.height
+    if Image.MAX_IMAGE_PIXELS and pixels > Image.MAX_IMAGE_PIXELS:
+        image.close()
+        raise Image.DecompressionBombError(
+            f'Image size ({pixels} pixels) exceeds limit of {Image.MAX_IMAGE_PIXELS} pixels'
+        )
+    return image
+
+
+def _load(field_file):
+    field_file.open('rb')
+    try:
+        image = ImageOps.exif_transpose(_open(field_file))
+        image.load()
+    finally:
+        field_file.close()
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    return image.convert('RGBA' if has_alpha else 'RGB'), has_alpha
+
+
+def render_variants(field_file):
+    """
+    Decodes field_file once and returns [(width, fmt, extension, bytes)] for
+    every configured width below the original's (or a single full-width set
+    when the original is already small). Runs no storage writes, so it is
+    safe to call from worker threads.
+    """
+    image, has_alpha = _load(field_file)
+    fallback = ('png', 'png') if has_alpha else ('jpeg', 'jpg')
+    widths = [width for width in get_widths() if width < image.width] or [image.width]
+
+    rendered = []
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        rendered.append((width, 'webp', 'webp', _encode(resized, 'webp')))
+        rendered.append((width, fallback[0], fallback[1], _encode(resized, fallback[0])))
+    return rendered
+
+
+def store_variants(field_file, rendered):
+    """
+    Saves rendered variants next to field_file and returns the variants map.
+    """
+    storage = field_file.storage
+    stem, _ = os.path.splitext(field_file.name)
+    widths = {}
+    for width, fmt, extension, data in rendered:
+        name = storage.save(f"{stem}__w{width}.{extension}", ContentFile(data))
+        widths.setdefault(str(width), {})[fmt] = name
+    return {'source': field_file.name, 'widths': widths}
+
+
+def generate_variants(field_file):
+    """
+    Renders and stores the variants of field_file. Returns the variants map,
+    or {} when the file is missing or not a decodable image.
+    """
+    if not field_file:
+        return {}
+    try:
+        rendered = render_variants(field_file)
+    except (FileNotFoundError, UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+        return {}
+    return store_variants(field_file, rendered)
+
+
+def strip_metadata(uploaded):
+    """
+    Returns uploaded re-encoded without EXIF, XMP or comment metadata and
+    with its EXIF orientation applied, or uploaded itself when it carries
+    none (or is animated or in a format we do not re-encode). ICC profiles
+    are kept. Raises Image.DecompressionBombError for oversized images.
+    """
+    uploaded.seek(0)
+    image = _open(uploaded)
+    exif = image.getexif()
+    if image.format not in STRIPPABLE_FORMATS or getattr(image, 'n_frames', 1) > 1:
+        return uploaded
+    if not exif and not any(key in image.info for key in METADATA_KEYS):
+        uploaded.seek(0)
+        return uploaded
+
+    fmt = image.format
+    options = {'exif': b''}
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    if fmt == 'JPEG' and exif.get(ExifTags.Base.Orientation, 1) == 1:
+        # Nothing to rotate, so reuse the original quantization and avoid
+        # another generation of JPEG loss
+        options.update(quality='keep', subsampling='keep')
+    else:
+        image = ImageOps.exif_transpose(image)
+        if fmt != 'PNG':
+            options['quality'] = ORIGINAL_QUALITY
+    for key in METADATA_KEYS:
+        image.info.pop(key, None)
+
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return ContentFile(buffer.getvalue(), name=uploaded.name)
+
+
+def delete_variants(storage, variants):
+    for formats in (variants or {}).get('widths', {}).values():
+        for name in formats.values():
+            storage.delete(name)
+
+
+def needs_variants(field_file, variants):
+    return bool(field_file) and (variants or {}).get('source') != field_file.name
+
+
+def refresh_variants(instance, field_name, force=False):
+    """
+    Regenerates the variants of instance.<field_name> when the file changed
+    (or force is set), drops the stale ones and stores the new map with a
+    queryset update so no save() signals fire again.
+    """
+    field_file = getattr(instance, field_name)
+    variants_field = f'{field_name}_variants'
+    old = getattr(instance, variants_field) or {}
+    if not force and not needs_variants(field_file, old):
+        return old
+
+    # Drop the stale files first so regenerated variants keep their names.
+    if old:
+        delete_variants(field_file.storage, old)
+    new = generate_variants(field_file)
+    setattr(instance, variants_field, new)
+    type(instance)._default_manager.filter(pk=instance.pk).update(**{variants_field: new})
+    return new
+
+
+def srcset(field_file, variants):
+    """
+    Serializer representation: variant URLs per width and ready-made srcset
+    strings per format. None when there is no image.
+    """
+    if not field_file:
+        return None
+    storage = field_file.storage
+    widths = (variants or {}).get('widths', {}) if (variants or {}).get('source') == field_file.name else {}
+    urls = {
+        width: {fmt: storage.url(name) for fmt, name in formats.items()}
+        for width, formats in sorted(widths.items(), key=lambda item: int(item[0]))
+    }
+    sets = {}
+    for width, formats in urls.items():
+        for fmt, url in formats.items():
+            sets.setdefault(fmt, []).append(f"{url} {width}w")
+    return {
+        'original': field_file.url,
+        'widths': urls,
+        'srcset': {fmt: ', '.join(entries) for fmt, entries in sets.items()},
+    }
+
+
+class StrippedImageField(serializers.ImageField):
+    """
+    ImageField that runs uploads through strip_metadata before they are
+    stored, answering oversized images with a 400 instead of decoding them.
+    """
+    default_error_messages = {
+        'too_large': 'Image dimensions exceed {max_pixels} pixels.',
+    }
+
+    def to_internal_value(self, data):
+        uploaded = super().to_internal_value(data)
+        try:
+            return strip_metadata(uploaded)
+        except Image.DecompressionBombError:
+            self.fail('too_large', max_pixels=Image.MAX_IMAGE_PIXELS)
+        except (OSError, ValueError, SyntaxError):
+            self.fail('invalid_image')
@@ -0,0 +1,35 @@
+"""
+Rebuilds every denormalized column and side table from the base tables.
+
+Model signals keep these current for writes made through the ORM one row at
+a time; bulk loads (seed_forum, import_forum) bypass the signals and call
+rebuild_derived_data() once at the end instead.
+"""
+from .cache import invalidate_all
+from .directory import rebuild_category_counts
+from .models import Category, Comment, Post, PostRanking, Vote
+from .ranking import rebuild_comment_counts, rebuild_rankings
+from .search import rebuild_index
+from .threads import rebuild_comment_paths
+from .votes import rebuild_vote_counters
+
+
+def rebuild_derived_data(log=None):
+    """
+    Runs every rebuild in dependency order (rankings read the vote and
+    comment counters). log, if given, is called with a message per step.
+    """
+    steps = [
+        ('comment paths', lambda: rebuild_comment_paths(Comment)),
+        ('post vote counters', lambda: rebuild_vote_counters(Post, Vote, 'post')),
+        ('comment vote counters', lambda: rebuild_vote_counters(Comment, Vote, 'comment')),
+        ('comment counts', lambda: rebuild_comment_counts(Post, Comment)),
+        ('category post counts', lambda: rebuild_category_counts(Category, Post)),
+        ('rankings', lambda: rebuild_rankings(Post, PostRanking)),
+        ('search index', rebuild_index),
+    ]
+    for name, step in steps:
+        step()
+        if log is not None:
+            log(f"Rebuilt {name}")
+    invalidate_all()
@@ -0,0 +1,152 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from community.models import Category, Comment, Post, Vote
+from community.views import CategoryViewSet, CommentViewSet, PostViewSet
+
+User = get_user_model()
+
+PAGE_SIZE = 10
+
+
+def viewset_queryset(viewset_class, action, params=None, user=None, **kwargs):
+    """
+    The queryset viewset_class would run for action with query params,
+    after filter backends, as a page of PAGE_SIZE rows.
+    """
+    request = Request(APIRequestFactory().get('/', params or {}))
+    request.user = user or AnonymousUser()
+    view = viewset_class(action=action, request=request, kwargs=kwargs, format_kwarg=None)
+    queryset = view.filter_queryset(view.get_queryset())
+    if kwargs:
+        return queryset.filter(**kwargs)[:1]
+    return queryset[:PAGE_SIZE]
+
+
+def sqlite_findings(plan):
+    """
+    Parses SQLite's EXPLAIN QUERY PLAN output, one "id parent notused
+    detail" row per line.
+    """
+    details = [line.split(' ', 3)[-1] for line in plan.splitlines() if line.strip()]
+    scans = [detail.split()[1] for detail in details if detail.startswith('SCAN ') and ' USING ' not in detail]
+    sorts = [detail for detail in details if detail.startswith('USE TEMP B-TREE')]
+    return {'seq_scans': scans, 'temp_sorts': sorts, 'rows': None, 'plan': details}
+
+
+def postgres_findings(plan):
+    """
+    Walks a Postgres EXPLAIN (FORMAT JSON) plan tree. Sorts are reported
+    whenever the planner needs one; with ANALYZE, 'Sort Space Type' tells
+    whether it spilled to disk.
+    """
+    parsed = json.loads(plan)
+    # Django flattens the JSON column, dropping the outer list when the
+    # driver has already decoded it
+    root = (parsed[0] if isinstance(parsed, list) else parsed)['Plan']
+    scans, sorts, lines = [], [], []
+
+    def walk(node, depth):
+        relation = node.get('Relation Name')
+        lines.append(
+            '  ' * depth + node['Node Type'] + (f' on {relation}' if relation else '')
+            + (f" using {node['Index Name']}" if node.get('Index Name') else '')
+            + f" (rows={node.get('Plan Rows')})"
+        )
+        if node['Node Type'] == 'Seq Scan':
+            scans.append(relation)
+        if node['Node Type'] in ('Sort', 'Incremental Sort'):
+            space = node.get('Sort Space Type')
+            sorts.append(f"{node['Node Type']} on {', '.join(node.get('Sort Key', []))}" + (f' ({space})' if space else ''))
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    return {'seq_scans': scans, 'temp_sorts': sorts, 'rows': root.get('Plan Rows'), 'plan': lines}
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on the ViewSets' querysets for representative parameters and reports scans, sorts and row estimates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true', help='Postgres only: EXPLAIN ANALYZE, i.e. actually run the queries')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not only the flagged ones')
+        parser.add_argument('--fail-on-issues', action='store_true', help='Exit with an error when any query scans or sorts a table')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'audit_queries supports SQLite and Postgres, not {connection.vendor}')
+        if options['analyze'] and connection.vendor != 'postgresql':
+            raise CommandError('--analyze is only supported on Postgres')
+
+        issues = 0
+        for name, queryset in self.cases():
+            findings = self.explain(queryset, options['analyze'])
+            flagged = findings['seq_scans'] or findings['temp_sorts']
+            issues += bool(flagged)
+
+            notes = []
+            if findings['seq_scans']:
+                notes.append(f"seq scan: {', '.join(findings['seq_scans'])}")
+            if findings['temp_sorts']:
+                notes.append(f"sort: {'; '.join(findings['temp_sorts'])}")
+            rows = f"~{findings['rows']} rows" if findings['rows'] is not None else ''
+            status = self.style.WARNING('CHECK') if flagged else self.style.SUCCESS('OK   ')
+            self.stdout.write(f"{status} {name:<44}{rows:>14}  {' | '.join(notes)}")
+            if flagged or options['verbose_plans']:
+                for line in findings['plan']:
+                    self.stdout.write(f"        {line}")
+
+        if issues:
+            message = f"{issues} queries scan or sort a table"
+            if options['fail_on_issues']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("Every audited query is index-driven"))
+
+    def explain(self, queryset, analyze):
+        if connection.vendor == 'postgresql':
+            return postgres_findings(queryset.explain(format='json', analyze=analyze))
+        return sqlite_findings(queryset.explain())
+
+    def cases(self):
+        """
+        Yields (label, queryset) for the hot read paths, using ids from the
+        current data where there is some so plans reflect real selectivity.
+        """
+        category = Category.objects.order_by('-post_count').first()
+        slug = category.slug if category else 'general'
+        post_id = Post.objects.order_by('-comment_count').values_list('pk', flat=True).first() or 1
+        author_id = Post.objects.values_list('author_id', flat=True).first() or 1
+        user = User.objects.order_by('pk').first()
+
+        yield 'category-list', viewset_queryset(CategoryViewSet, 'list')
+
+        yield 'post-list', viewset_queryset(PostViewSet, 'list')
+        yield f'post-list ?category={slug}', viewset_queryset(PostViewSet, 'list', {'category': slug})
+        yield f'post-list ?author={author_id}', viewset_queryset(PostViewSet, 'list', {'author': author_id})
+        yield 'post-list ?sort=hot', viewset_queryset(PostViewSet, 'list', {'sort': 'hot'})
+        yield f'post-list ?sort=hot&category={slug}', viewset_queryset(PostViewSet, 'list', {'sort': 'hot', 'category': slug})
+        yield 'post-list ?sort=top&window=day', viewset_queryset(PostViewSet, 'list', {'sort': 'top', 'window': 'day'})
+        yield 'post-list ?search=exam', viewset_queryset(PostViewSet, 'list', {'search': 'exam'})
+        yield f'post-detail {post_id}', viewset_queryset(PostViewSet, 'retrieve', pk=post_id)
+
+        yield 'comment-list', viewset_queryset(CommentViewSet, 'list')
+        yield f'comment-list ?post={post_id}', viewset_queryset(CommentViewSet, 'list', {'post': post_id})
+        yield f'comment-list ?author={author_id}', viewset_queryset(CommentViewSet, 'list', {'author': author_id})
+        yield f'comment-tree {post_id}', Comment.objects.filter(post_id=post_id).order_by('path')[:200]
+
+        # Vote lookups outside the ViewSets: the viewer's own votes on a
+        # page and the per-target tallies behind rebuild_vote_counters
+        if user is not None:
+            yield 'viewer votes on a page of posts', Vote.objects.filter(user=user, post_id__in=range(post_id, post_id + PAGE_SIZE)).values_list('post_id', 'value')
+        yield f'vote tally post {post_id}', Vote.objects.filter(post_id=post_id, value=1).order_by().values('post').annotate(total=Count('pk'))
+        comment_id = Comment.objects.filter(post_id=post_id).values_list('pk', flat=True).first() or 1
+        yield f'vote tally comment {comment_id}', Vote.objects.filter(comment_id=comment_id, value=1).order_by().values('comment').annotate(total=Count('pk'))
@@ -0,0 +1,247 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from community.models import Comment, Post, Vote
+from community.management.commands.seed_forum import WORDS
+from users.token_views import CustomTokenObtainPairSerializer
+
+User = get_user_model()
+
+API = '/api/community'
+
+
+class Command(BaseCommand):
+    help = 'Measures latency, throughput and query counts of the main API endpoints against the current database'
+
+    scenarios = ['feed', 'feed_cursor', 'feed_hot', 'detail', 'comments', 'comment_tree', 'vote', 'search']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Threads sending requests at once, each with its own client and database connection '
+                 '(the vote scenario always runs on one, see run())',
+        )
+        parser.add_argument('--scenario', action='append', choices=self.scenarios, help='Scenario to run (repeatable, default all)')
+        parser.add_argument('--user', help='Username to authenticate as (default: the first active user)')
+        parser.add_argument('--anonymous', action='store_true', help='Send unauthenticated requests, i.e. go through the response cache')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--label', help='Name for this run in the JSON output (default: current git commit)')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON file from an earlier run to print the changes against')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+        self.seed = options['seed']
+        post_ids = list(Post.objects.order_by('-score', '-id').values_list('pk', flat=True)[:200])
+        if not post_ids:
+            raise CommandError('No posts to benchmark against; run seed_forum first')
+        # Requests favour the popular posts, like real traffic
+        self.post_ids = post_ids
+        self.post_weights = [1 / rank for rank in range(1, len(post_ids) + 1)]
+
+        self.headers = {}
+        anonymous = options['anonymous']
+        if not anonymous:
+            users = User.objects.filter(is_active=True)
+            user = users.filter(username=options['user']).first() if options['user'] else users.order_by('pk').first()
+            if user is None:
+                raise CommandError('No user to authenticate as')
+            token = CustomTokenObtainPairSerializer.get_token(user).access_token
+            self.headers = {'Authorization': f'Bearer {token}'}
+
+        selected = options['scenario'] or self.scenarios
+        if anonymous and 'vote' in selected:
+            selected = [name for name in selected if name != 'vote']
+            self.stdout.write('Skipping vote: it needs an authenticated user')
+
+        results = {}
+        for name in selected:
+            results[name] = self.run(name, options['requests'], options['concurrency'])
+            self.stdout.write(self.format_row(name, results[name]))
+
+        report = {
+            'label': options['label'] or self.git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'anonymous': anonymous,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'votes': Vote.objects.count(),
+            },
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def pick_post(self, rng):
+        return rng.choices(self.post_ids, weights=self.post_weights)[0]
+
+    def requests_for(self, name, rng):
+        """
+        Yields (method, path, data) tuples for one scenario forever.
+        """
+        next_cursor = None
+        while True:
+            if name == 'feed':
+                yield 'get', f'{API}/posts/?page={rng.randint(1, 5)}', None
+            elif name == 'feed_cursor':
+                # Walk a few pages deep, then start again from the top
+                path = next_cursor or f'{API}/posts/?pagination=cursor'
+                response = yield 'get', path, None
+                next_cursor = response.get('next') if response and rng.random() < 0.8 else None
+            elif name == 'feed_hot':
+                yield 'get', f'{API}/posts/?sort=hot&page={rng.randint(1, 3)}', None
+            elif name == 'detail':
+                yield 'get', f'{API}/posts/{self.pick_post(rng)}/', None
+            elif name == 'comments':
+                yield 'get', f'{API}/comments/?post={self.pick_post(rng)}', None
+            elif name == 'comment_tree':
+                yield 'get', f'{API}/posts/{self.pick_post(rng)}/comment-tree/', None
+            elif name == 'vote':
+                yield 'post', f'{API}/posts/{self.pick_post(rng)}/vote/', {'value': rng.choice([1, -1])}
+            elif name == 'search':
+                yield 'get', f"{API}/posts/search/?q={'+'.join(rng.sample(WORDS, 2))}", None
+
+    def send(self, client, method, path, data):
+        if method == 'get':
+            return client.get(path, headers=self.headers)
+        return client.post(path, data, content_type='application/json', headers=self.headers)
+
+    def run(self, name, count, concurrency=1):
+        """
+        Sends count requests for one scenario, split across concurrency
+        threads. The vote scenario runs on this thread's connection inside a
+        transaction that is rolled back, so benchmarking leaves the votes
+        and counters as they were. It therefore always runs on one thread,
+        and with the vote buffer off: a buffered vote would be written by
+        the flush thread, outside the transaction.
+        """
+        if name == 'vote':
+            if concurrency > 1:
+                self.stdout.write('vote runs on one thread so its writes can be rolled back')
+            with override_settings(VOTE_BUFFER_ENABLED=False), transaction.atomic():
+                stats = self.measure(name, count, 1)
+                transaction.set_rollback(True)
+            return stats
+        return self.measure(name, count, concurrency)
+
+    def measure(self, name, count, concurrency):
+        shares = [count // concurrency + (1 if i < count % concurrency else 0) for i in range(concurrency)]
+        if concurrency == 1:
+            runs = [self.worker(name, count, self.seed)]
+        else:
+            barrier = threading.Barrier(concurrency)
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                futures = [
+                    pool.submit(self.threaded_worker, name, share, self.seed + i, barrier)
+                    for i, share in enumerate(shares)
+                ]
+                runs = [future.result() for future in futures]
+
+        latencies = [latency for run in runs for latency in run['latencies']]
+        queries = [total for run in runs for total in run['queries']]
+        errors = sum(run['errors'] for run in runs)
+        elapsed = max(run['finished'] for run in runs) - min(run['started'] for run in runs)
+
+        latencies.sort()
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'requests': count,
+            'errors': errors,
+            'rps': round(count / elapsed, 1),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+            'p50_ms': round(quantiles[49] * 1000, 2),
+            'p95_ms': round(quantiles[94] * 1000, 2),
+            'p99_ms': round(quantiles[98] * 1000, 2),
+            'queries': round(statistics.fmean(queries), 1),
+        }
+
+    def threaded_worker(self, *args):
+        try:
+            return self.worker(*args)
+        finally:
+            # Pool threads open their own connection; don't leave it behind
+            connection.close()
+
+    def worker(self, name, count, seed, barrier=None):
+        rng = random.Random(seed)
+        client = Client()
+        requests = self.requests_for(name, rng)
+        # Warm imports, caches and connections before measuring
+        request = next(requests)
+        self.send(client, *request)
+        if barrier is not None:
+            barrier.wait()
+
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as captured:
+                request_started = time.perf_counter()
+                response = self.send(client, *request)
+                latencies.append(time.perf_counter() - request_started)
+            queries.append(len(captured))
+            if response.status_code >= 400:
+                errors += 1
+            payload = None
+            if name == 'feed_cursor' and response.status_code == 200:
+                payload = response.json()
+                # Follow links relative to the in-process client
+                if payload.get('next'):
+                    payload['next'] = payload['next'].replace('http://testserver', '')
+            request = requests.send(payload) if name == 'feed_cursor' else next(requests)
+        return {
+            'latencies': latencies, 'queries': queries, 'errors': errors,
+            'started': started, 'finished': time.perf_counter(),
+        }
+
+    def format_row(self, name, stats):
+        return (
+            f"{name:<14}{stats['rps']:>9.1f} req/s  p50 {stats['p50_ms']:>7.2f} ms  p95 {stats['p95_ms']:>7.2f} ms"
+            f"  p99 {stats['p99_ms']:>7.2f} ms  {stats['queries']:>5.1f} queries  {stats['errors']} errors"
+        )
+
+    def compare(self, path, results):
+        with open(path) as f:
+            baseline = json.load(f)
+        self.stdout.write(f"\nChange against {baseline.get('label') or path}:")
+        for name, stats in results.items():
+            old = baseline['scenarios'].get(name)
+            if old is None:
+                continue
+            changes = []
+            for key in ('p50_ms', 'p95_ms', 'rps', 'queries'):
+                if old[key]:
+                    changes.append(f"{key} {(stats[key] - old[key]) / old[key] * 100:+.1f}%")
+                else:
+                    changes.append(f"{key} {old[key]} -> {stats[key]}")
+            self.stdout.write(f"{name:<14}" + '  '.join(changes))
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
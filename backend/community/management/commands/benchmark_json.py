@@ -0,0 +1,82 @@
+import gzip
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from community.models import Post
+from community.serializers import PostListSerializer, PostSerializer, output_fields
+from community.views import post_feed_queryset
+from config import compression
+from config.renderers import FastJSONParser, FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = 'Compares render/parse time and encoded size of a page of serialized posts with the stdlib and fast JSON codecs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50, help='Posts per payload')
+        parser.add_argument('--rounds', type=int, default=200, help='Timed iterations per codec')
+        parser.add_argument('--list', action='store_true', help='Use the compact feed serializer instead of PostSerializer')
+
+    def handle(self, *args, **options):
+        if options['rounds'] < 1 or options['posts'] < 1:
+            raise CommandError('--rounds and --posts must be positive')
+        request = Request(APIRequestFactory().get('/api/community/posts/'))
+        serializer_class = PostListSerializer if options['list'] else PostSerializer
+        queryset = post_feed_queryset({})
+        if options['list']:
+            queryset = PostListSerializer.optimize_queryset(queryset, output_fields(PostListSerializer, request))
+        posts = list(queryset[:options['posts']])
+        if not posts:
+            raise CommandError('No posts to serialize; run seed_forum first')
+        data = {
+            'count': Post.objects.count(),
+            'next': None,
+            'previous': None,
+            'results': serializer_class(posts, many=True, context={'request': request}).data,
+        }
+        self.stdout.write(f"{len(posts)} posts with {serializer_class.__name__}, {options['rounds']} rounds")
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed: the fast codecs fall back to the stdlib'))
+
+        stdlib = JSONRenderer().render(data)
+        fast = FastJSONRenderer().render(data)
+        if JSONParser().parse(io.BytesIO(fast)) != JSONParser().parse(io.BytesIO(stdlib)):
+            raise CommandError('The fast renderer decodes to different data than the stdlib one')
+
+        rounds = options['rounds']
+        timings = [
+            ('render stdlib', self.time(lambda: JSONRenderer().render(data), rounds)),
+            ('render fast', self.time(lambda: FastJSONRenderer().render(data), rounds)),
+            ('parse stdlib', self.time(lambda: JSONParser().parse(io.BytesIO(stdlib)), rounds)),
+            ('parse fast', self.time(lambda: FastJSONParser().parse(io.BytesIO(stdlib)), rounds)),
+        ]
+        for name, (median, p95) in timings:
+            self.stdout.write(f"{name:<16}median {median:>8.3f} ms  p95 {p95:>8.3f} ms")
+        for kind in ('render', 'parse'):
+            slow, quick = (median for name, (median, _) in timings if name.startswith(kind))
+            self.stdout.write(self.style.SUCCESS(f"{kind}: {slow / quick:.1f}x faster"))
+
+        self.stdout.write(f"{'bytes raw':<16}{len(stdlib):>10}")
+        self.stdout.write(f"{'bytes gzip':<16}{len(gzip.compress(stdlib)):>10}")
+        if compression.brotli is not None:
+            encoded = compression.brotli.compress(stdlib, quality=compression.BROTLI_QUALITY)
+            self.stdout.write(f"{'bytes brotli':<16}{len(encoded):>10}")
+
+    def time(self, func, rounds):
+        """
+        Returns the median and p95 duration of func in milliseconds.
+        """
+        func()
+        durations = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            func()
+            durations.append((time.perf_counter() - started) * 1000)
+        durations.sort()
+        return statistics.median(durations), durations[int(len(durations) * 0.95) - 1]
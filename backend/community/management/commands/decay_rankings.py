@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from community.cache import invalidate_rankings
+from community.models import Post, PostRanking, Comment
+from community.ranking import decay_rankings, rebuild_comment_counts, rebuild_rankings
+
+class Command(BaseCommand):
+    help = 'Re-decays hot scores and expires day/week top windows; run it every few minutes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Recount comments and rebuild the ranking row of every post, not just recent ones',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            rebuild_comment_counts(Post, Comment)
+            count = rebuild_rankings(Post, PostRanking)
+            invalidate_rankings()
+        else:
+            count = decay_rankings()
+        self.stdout.write(self.style.SUCCESS(f"Updated rankings for {count} posts"))
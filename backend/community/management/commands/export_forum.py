@@ -0,0 +1,41 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from community.export import EXPORT_CHUNK_SIZE, export_lines, export_queryset
+
+
+class Command(BaseCommand):
+    help = 'Writes posts with their comments and vote totals as NDJSON, one post per line'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', help='Only posts in the category with this slug')
+        parser.add_argument('--since', help='Only posts created at or after this ISO date/datetime')
+        parser.add_argument('--until', help='Only posts created before this ISO datetime, or up to the end of this date')
+        parser.add_argument('--output', help='File to write (default: standard output)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='Posts fetched per query')
+
+    def handle(self, *args, **options):
+        try:
+            queryset = export_queryset(options['category'], options['since'], options['until'])
+        except ValueError as exc:
+            raise CommandError(exc)
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        started = time.perf_counter()
+        count = 0
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for line in export_lines(queryset, options['chunk_size']):
+                out.write(line)
+                count += 1
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
+
+        elapsed = time.perf_counter() - started
+        # Progress goes to stderr so stdout stays valid NDJSON
+        self.stderr.write(f'Exported {count} posts in {elapsed:.1f}s', style_func=self.style.SUCCESS)
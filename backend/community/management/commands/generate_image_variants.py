@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from community.imaging import needs_variants, refresh_variants
+from community.models import Category, Post, PostImage
+
+class Command(BaseCommand):
+    help = 'Generates thumbnails and WebP variants for existing uploaded images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate variants that already exist')
+
+    def handle(self, *args, **options):
+        targets = [
+            (PostImage, 'image'),
+            (Post, 'image'),
+            (Category, 'icon'),
+            (get_user_model(), 'profile_picture'),
+        ]
+        for model, field_name in targets:
+            queryset = model._default_manager.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            processed = 0
+            for instance in queryset.only('pk', field_name, f'{field_name}_variants').iterator(chunk_size=200):
+                if options['force'] or needs_variants(getattr(instance, field_name), getattr(instance, f'{field_name}_variants')):
+                    refresh_variants(instance, field_name, force=options['force'])
+                    processed += 1
+            self.stdout.write(self.style.SUCCESS(f"{model.__name__}.{field_name}: generated variants for {processed} images"))
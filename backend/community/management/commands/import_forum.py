@@ -0,0 +1,401 @@
+import gzip
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+from community.maintenance import rebuild_derived_data
+from community.models import Category, Comment, Post, Vote
+from config.renderers import loads
+
+User = get_user_model()
+
+# Insert order within a chunk: every type only references earlier ones
+RECORD_TYPES = ('user', 'category', 'post', 'comment', 'vote')
+MODELS = {'user': User, 'category': Category, 'post': Post, 'comment': Comment}
+
+PROGRESS_INTERVAL = 5
+
+
+class RecordError(Exception):
+    def __init__(self, line, message):
+        super().__init__(f'line {line}: {message}')
+
+
+class OrphanRecord(RecordError):
+    """
+    A record referencing a legacy id that was never imported.
+    """
+
+
+def parse_timestamp(value, line, field):
+    if value is None:
+        return None
+    moment = parse_datetime(str(value))
+    if moment is None:
+        raise RecordError(line, f'{field} {value!r} is not an ISO 8601 datetime')
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def legacy_id(record, line):
+    value = record.get('id')
+    if not isinstance(value, (int, str)) or isinstance(value, bool):
+        raise RecordError(line, f"{record['type']} needs an integer or string 'id'")
+    return value
+
+
+@contextmanager
+def imported_timestamps(*models):
+    """
+    Lets bulk_create keep the input's created_at/updated_at by switching
+    auto_now/auto_now_add off on models' fields until the block exits.
+    """
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Checkpoint:
+    """
+    Append-only log of committed chunks, one JSON line each with the last
+    input line the chunk covers and the [legacy id, new id] pairs it
+    mapped. Entries are written and fsynced inside the chunk's transaction,
+    so a chunk whose commit failed leaves an entry behind whose rows do not
+    exist; load() checks the last entry and drops it in that case.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def load(self):
+        """
+        Returns (last committed line, id maps, whether the last entry was dropped).
+        """
+        with open(self.path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        dropped = False
+        if entries and not self.committed(entries[-1]):
+            entries.pop()
+            dropped = True
+            with open(self.path, 'w') as f:
+                f.writelines(json.dumps(entry) + '\n' for entry in entries)
+
+        maps = {kind: {} for kind in MODELS}
+        for entry in entries:
+            for kind, pairs in entry['ids'].items():
+                maps[kind].update(pairs)
+        return (entries[-1]['line'] if entries else 0), maps, dropped
+
+    def committed(self, entry):
+        for kind, pairs in entry['ids'].items():
+            pks = {pk for _, pk in pairs}
+            if MODELS[kind].objects.filter(pk__in=pks).count() != len(pks):
+                return False
+        return True
+
+    def append(self, line, ids):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'line': line, 'ids': ids}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class Command(BaseCommand):
+    help = 'Bulk-imports users, categories, posts, threaded comments and votes from a legacy forum JSONL dump'
+
+    importers = {
+        'user': 'import_users', 'category': 'import_categories', 'post': 'import_posts',
+        'comment': 'import_comments', 'vote': 'import_votes',
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL file (optionally .gz), one {"type": ..., "id": ...} record per line')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Records per transaction')
+        parser.add_argument('--checkpoint', help='Progress file for --resume (default: <path>.checkpoint)')
+        parser.add_argument('--resume', action='store_true', help='Continue after the last chunk recorded in the checkpoint')
+        parser.add_argument('--skip-orphans', action='store_true', help='Skip records referencing ids that were never imported instead of failing')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        self.batch_size = options['batch_size']
+        self.skip_orphans = options['skip_orphans']
+        self.checkpoint = Checkpoint(options['checkpoint'] or f"{options['path']}.checkpoint")
+
+        start_line, self.maps = 0, {kind: {} for kind in MODELS}
+        if options['resume'] and self.checkpoint.exists():
+            start_line, self.maps, dropped = self.checkpoint.load()
+            if dropped:
+                self.stdout.write(self.style.WARNING('Dropped the last checkpoint entry: its chunk was never committed'))
+            self.stdout.write(f'Resuming after line {start_line}')
+        elif self.checkpoint.exists():
+            raise CommandError(
+                f'{self.checkpoint.path} exists: pass --resume to continue that import, or delete it to start over'
+            )
+
+        self.stats = {kind: {'created': 0, 'existing': 0, 'skipped': 0} for kind in RECORD_TYPES}
+        self.pending = {kind: [] for kind in RECORD_TYPES}
+        self.started = self.last_report = time.perf_counter()
+        try:
+            with imported_timestamps(Category, Post, Comment):
+                self.read(options['path'], start_line)
+        except RecordError as exc:
+            raise CommandError(f'{exc}; fix the input and rerun with --resume')
+        except IntegrityError as exc:
+            raise CommandError(f'chunk ending at line {self.line}: {exc}; fix the input and rerun with --resume')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        elapsed = time.perf_counter() - self.started
+        for kind in RECORD_TYPES:
+            stats = self.stats[kind]
+            self.stdout.write(
+                f"{kind:<10}{stats['created']:>10} created{stats['existing']:>10} existing{stats['skipped']:>10} skipped"
+            )
+        self.stdout.write(f'{self.rows()} rows in {elapsed:.1f}s ({self.rows() / max(elapsed, 1e-9):.0f} rows/s)')
+        rebuild_derived_data(log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'Imported {options["path"]}'))
+
+    def rows(self):
+        return sum(stats['created'] for stats in self.stats.values())
+
+    def read(self, path, start_line):
+        opener = gzip.open if path.endswith('.gz') else open
+        count = 0
+        with opener(path, 'rb') as f:
+            for self.line, raw in enumerate(f, 1):
+                if self.line <= start_line or not raw.strip():
+                    continue
+                try:
+                    record = loads(raw)
+                except ValueError as exc:
+                    raise RecordError(self.line, f'invalid JSON ({exc})')
+                kind = record.get('type') if isinstance(record, dict) else None
+                if kind not in self.pending:
+                    raise RecordError(self.line, f"'type' must be one of {', '.join(RECORD_TYPES)}")
+                self.pending[kind].append((self.line, record))
+                count += 1
+                if count >= self.batch_size:
+                    self.flush()
+                    count = 0
+        if count:
+            self.flush()
+
+    def flush(self):
+        """
+        Inserts every pending record in one transaction, parents first, and
+        records the chunk in the checkpoint before committing.
+        """
+        ids = {}
+        with transaction.atomic():
+            for kind in RECORD_TYPES:
+                batch, self.pending[kind] = self.pending[kind], []
+                if batch:
+                    pairs = getattr(self, self.importers[kind])(batch)
+                    if pairs:
+                        # Later types in the chunk resolve against these
+                        self.maps[kind].update(pairs)
+                        ids[kind] = pairs
+            self.checkpoint.append(self.line, ids)
+
+        now = time.perf_counter()
+        if now - self.last_report >= PROGRESS_INTERVAL:
+            self.last_report = now
+            elapsed = now - self.started
+            self.stdout.write(f'line {self.line}: {self.rows()} rows ({self.rows() / elapsed:.0f} rows/s)')
+
+    def resolve(self, kind, value, line, field):
+        """
+        The new id for legacy id value of kind. Raises OrphanRecord when it
+        was never imported.
+        """
+        pk = self.maps[kind].get(value)
+        if pk is None:
+            raise OrphanRecord(line, f'{field} refers to unknown {kind} {value!r}')
+        return pk
+
+    def build(self, kind, batch, make):
+        """
+        Calls make(line, record) for each record, skipping or raising on
+        orphans. Returns [(record, instance)].
+        """
+        built = []
+        for line, record in batch:
+            try:
+                built.append((record, make(line, record)))
+            except OrphanRecord:
+                if not self.skip_orphans:
+                    raise
+                self.stats[kind]['skipped'] += 1
+        return built
+
+    def insert(self, kind, built):
+        instances = MODELS[kind].objects.bulk_create([instance for _, instance in built], batch_size=self.batch_size)
+        self.stats[kind]['created'] += len(instances)
+        return [[record['id'], instance.pk] for (record, _), instance in zip(built, instances)]
+
+    def import_users(self, batch):
+        def make(line, record):
+            legacy_id(record, line)
+            if not record.get('username'):
+                raise RecordError(line, "user needs a 'username'")
+            role = record.get('role') or User.Role.STUDENT
+            if role not in User.Role.values:
+                raise RecordError(line, f'unknown role {role!r}')
+            password = record.get('password') or ''
+            try:
+                identify_hasher(password)
+            except ValueError:
+                # Only existing hashes are kept; the owner resets anything else
+                password = make_password(None)
+            return User(
+                username=record['username'], email=record.get('email') or '', password=password, role=role,
+                first_name=record.get('first_name') or '', last_name=record.get('last_name') or '',
+                bio=record.get('bio') or '', is_staff=bool(record.get('is_staff')),
+                is_active=record.get('is_active', True) is not False,
+                date_joined=parse_timestamp(record.get('date_joined'), line, 'date_joined') or timezone.now(),
+            )
+
+        return self.import_unique('user', batch, make, 'username')
+
+    def import_categories(self, batch):
+        def make(line, record):
+            legacy_id(record, line)
+            if not record.get('name'):
+                raise RecordError(line, "category needs a 'name'")
+            record['slug'] = record.get('slug') or slugify(record['name'])
+            created_by = record.get('created_by')
+            if created_by is not None:
+                try:
+                    created_by = self.resolve('user', created_by, line, 'created_by')
+                except OrphanRecord:
+                    if not self.skip_orphans:
+                        raise
+                    created_by = None
+            return Category(
+                name=record['name'], slug=record['slug'], description=record.get('description') or '',
+                created_by_id=created_by,
+                created_at=parse_timestamp(record.get('created_at'), line, 'created_at') or timezone.now(),
+            )
+
+        return self.import_unique('category', batch, make, 'slug')
+
+    def import_unique(self, kind, batch, make, key):
+        """
+        Users and categories: rows whose username/slug already exists are
+        mapped to the existing row rather than inserted again.
+        """
+        built = self.build(kind, batch, make)
+        values = {getattr(instance, key) for _, instance in built}
+        existing = dict(MODELS[kind].objects.filter(**{f'{key}__in': values}).values_list(key, 'pk'))
+
+        pairs, new, first = [], [], {}
+        for record, instance in built:
+            value = getattr(instance, key)
+            if value in existing:
+                pairs.append([record['id'], existing[value]])
+                self.stats[kind]['existing'] += 1
+            elif value in first:
+                # Repeated within the chunk: alias to the first record
+                first[value][1].append(record['id'])
+                self.stats[kind]['existing'] += 1
+            else:
+                first[value] = (record, [])
+                new.append((record, instance))
+        for (record, instance), pair in zip(new, self.insert(kind, new)):
+            pairs.append(pair)
+            pairs.extend([alias, instance.pk] for alias in first[getattr(instance, key)][1])
+        return pairs
+
+    def import_posts(self, batch):
+        def make(line, record):
+            legacy_id(record, line)
+            post_type = str(record.get('post_type') or Post.PostType.TEXT).upper()
+            if post_type not in Post.PostType.values:
+                raise RecordError(line, f'unknown post_type {post_type!r}')
+            created_at = parse_timestamp(record.get('created_at'), line, 'created_at') or timezone.now()
+            return Post(
+                author_id=self.resolve('user', record.get('author'), line, 'author'),
+                category_id=self.resolve('category', record.get('category'), line, 'category'),
+                title=record.get('title') or '', content=record.get('content') or '', post_type=post_type,
+                link_url=record.get('link_url') or None, created_at=created_at,
+                updated_at=parse_timestamp(record.get('updated_at'), line, 'updated_at') or created_at,
+            )
+
+        return self.insert('post', self.build('post', batch, make))
+
+    def import_comments(self, batch):
+        """
+        Inserts a chunk's comments in rounds, so a reply whose parent is in
+        the same chunk is built once the parent has its id.
+        """
+        pairs = []
+        while batch:
+            waiting_ids = {record.get('id') for _, record in batch}
+            ready, waiting = [], []
+            for line, record in batch:
+                parent = record.get('parent')
+                if parent in waiting_ids and parent not in self.maps['comment']:
+                    waiting.append((line, record))
+                else:
+                    ready.append((line, record))
+            if not ready:
+                raise RecordError(waiting[0][0], 'comment parents form a cycle')
+
+            def make(line, record):
+                legacy_id(record, line)
+                parent = record.get('parent')
+                created_at = parse_timestamp(record.get('created_at'), line, 'created_at') or timezone.now()
+                return Comment(
+                    post_id=self.resolve('post', record.get('post'), line, 'post'),
+                    author_id=self.resolve('user', record.get('author'), line, 'author'),
+                    parent_id=self.resolve('comment', parent, line, 'parent') if parent is not None else None,
+                    content=record.get('content') or '', created_at=created_at,
+                    updated_at=parse_timestamp(record.get('updated_at'), line, 'updated_at') or created_at,
+                )
+
+            inserted = self.insert('comment', self.build('comment', ready, make))
+            self.maps['comment'].update(inserted)
+            pairs.extend(inserted)
+            batch = waiting
+        return pairs
+
+    def import_votes(self, batch):
+        def make(line, record):
+            if record.get('value') not in Vote.VoteValue.values:
+                raise RecordError(line, 'vote value must be 1 or -1')
+            if (record.get('post') is None) == (record.get('comment') is None):
+                raise RecordError(line, "vote needs exactly one of 'post' and 'comment'")
+            target = 'post' if record.get('post') is not None else 'comment'
+            return Vote(
+                user_id=self.resolve('user', record.get('user'), line, 'user'), value=record['value'],
+                **{f'{target}_id': self.resolve(target, record[target], line, target)},
+            )
+
+        votes = [vote for _, vote in self.build('vote', batch, make)]
+        # Legacy data repeats votes; keep the first, as the unique constraints
+        # do. Conflicting rows are dropped silently, so count what was inserted.
+        before = Vote.objects.count()
+        Vote.objects.bulk_create(votes, batch_size=self.batch_size, ignore_conflicts=True)
+        created = Vote.objects.count() - before
+        self.stats['vote']['created'] += created
+        self.stats['vote']['existing'] += len(votes) - created
+        return None
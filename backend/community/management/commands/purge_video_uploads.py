@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from community.models import VideoUpload
+from community.uploads import discard_upload
+
+class Command(BaseCommand):
+    help = 'Deletes chunked video uploads (and their temp files) that were abandoned before finalizing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Age of the last chunk after which an upload is abandoned')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = VideoUpload.objects.filter(status=VideoUpload.Status.PENDING, updated_at__lt=cutoff)
+        count = 0
+        for upload in stale.iterator():
+            discard_upload(upload)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Removed {count} abandoned uploads"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from community.cache import invalidate_categories
+from community.directory import rebuild_category_counts
+from community.models import Category, Post
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized Category.post_count column from the Post table'
+
+    def handle(self, *args, **kwargs):
+        categories = rebuild_category_counts(Category, Post)
+        invalidate_categories()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt post counts for {categories} categories"))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from community.search import rebuild_index
+
+class Command(BaseCommand):
+    help = 'Rebuilds the post full-text search index from the Post table'
+
+    def handle(self, *args, **kwargs):
+        backend = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search index using {type(backend).__name__}"))
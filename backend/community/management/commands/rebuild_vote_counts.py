@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from community.models import Post, Comment, Vote
+from community.votes import rebuild_vote_counters
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized upvotes/downvotes/score columns from the Vote table'
+
+    def handle(self, *args, **kwargs):
+        posts = rebuild_vote_counters(Post, Vote, 'post')
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt vote counters for {posts} posts"))
+
+        comments = rebuild_vote_counters(Comment, Vote, 'comment')
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt vote counters for {comments} comments"))
@@ -0,0 +1,232 @@
+import random
+import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+from community.maintenance import rebuild_derived_data
+from community.models import Category, Post, Comment, Vote, SavedPost
+
+User = get_user_model()
+
+TOPICS = [
+    'Announcements', 'Academics', 'Placements', 'Hostel Life', 'Clubs', 'Sports',
+    'Research', 'Events', 'Lost and Found', 'Tech Talk', 'Library', 'Alumni',
+]
+
+WORDS = (
+    'exam schedule lecture notes assignment deadline project campus library hostel mess '
+    'placement interview internship resume workshop seminar hackathon robotics club sports '
+    'cricket football festival cultural research paper lab professor semester syllabus '
+    'result scholarship registration timetable canteen wifi network python django react '
+    'database algorithm machine learning design startup alumni meetup volunteer event '
+    'announcement question answer help review feedback discussion update reminder'
+).split()
+
+# Usernames and emails of generated accounts, numbered from 0
+SEED_NAME = re.compile(r'^seed_user_([0-9]+)(@example\.com)?$', re.IGNORECASE)
+
+
+def zipf_weights(count, exponent=1.1):
+    """
+    Cumulative weights giving rank r a share proportional to 1 / r**exponent,
+    for random.choices(cum_weights=...).
+    """
+    total, cumulative = 0.0, []
+    for rank in range(1, count + 1):
+        total += 1 / rank ** exponent
+        cumulative.append(total)
+    return cumulative
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generates users, categories, posts, threaded comments, votes and saves with realistic skew'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--categories', type=int, default=8)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--votes', type=int, default=50000)
+        parser.add_argument('--saves', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=30, help='Spread post creation times over this many days')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible data')
+        parser.add_argument('--password', default='password', help='Password for every generated user')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.validate_counts(options)
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
+        with transaction.atomic():
+            users = self.create_users(options['users'], options['password'])
+            categories = self.create_categories(options['categories'])
+            posts = self.create_posts(options['posts'], users, categories, options['days'])
+            comments = self.create_comments(options['comments'], users, posts)
+            votes = self.create_votes(options['votes'], users, posts, comments)
+            saves = self.create_saves(options['saves'], users, posts)
+
+        self.stdout.write(
+            f"Created {len(users)} users, {len(categories)} categories, {len(posts)} posts, "
+            f"{len(comments)} comments, {votes} votes and {saves} saves"
+        )
+        rebuild_derived_data(log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS("Seeded forum data"))
+
+    def validate_counts(self, options):
+        counts = ('users', 'categories', 'posts', 'comments', 'votes', 'saves', 'days')
+        negative = [name for name in counts if options[name] < 0]
+        if negative:
+            raise CommandError(f"--{', --'.join(negative)} cannot be negative")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['posts'] and not (options['users'] and options['categories']):
+            raise CommandError('Posts need at least one new user and one category')
+        if (options['comments'] or options['votes'] or options['saves']) and not options['users']:
+            raise CommandError('Comments, votes and saves need at least one new user')
+
+    def text(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def create_users(self, count, password):
+        password = make_password(password)
+        start = self.next_seed_number()
+        users = []
+        for i in range(start, start + count):
+            # Roughly one in ten accounts can post
+            role = User.Role.FACULTY if self.rng.random() < 0.1 else User.Role.STUDENT
+            users.append(User(
+                username=f'seed_user_{i}', email=f'seed_user_{i}@example.com',
+                password=password, role=role,
+            ))
+        users = User.objects.bulk_create(users, batch_size=self.batch_size)
+        if not any(user.role == User.Role.FACULTY for user in users) and users:
+            users[0].role = User.Role.FACULTY
+            User.objects.filter(pk=users[0].pk).update(role=User.Role.FACULTY)
+        return users
+
+    def next_seed_number(self):
+        """
+        First seed_user_N number after every one already taken, so repeated
+        runs never collide with earlier seeds (counting accounts would, as
+        soon as any were deleted or made by hand).
+        """
+        taken = User.objects.filter(
+            Q(username__regex=r'^seed_user_[0-9]+$') | Q(email__iregex=r'^seed_user_[0-9]+@example\.com$')
+        ).values_list('username', 'email')
+        numbers = [int(match[1]) for pair in taken for value in pair if (match := SEED_NAME.match(value))]
+        return max(numbers, default=-1) + 1
+
+    def create_categories(self, count):
+        names = [TOPICS[i] if i < len(TOPICS) else f'{TOPICS[i % len(TOPICS)]} {i // len(TOPICS) + 1}' for i in range(count)]
+        existing = {category.slug: category for category in Category.objects.filter(slug__in=[slugify(n) for n in names])}
+        new = [Category(name=name, slug=slugify(name), description=self.text(5, 15)) for name in names if slugify(name) not in existing]
+        return list(existing.values()) + Category.objects.bulk_create(new)
+
+    def create_posts(self, count, users, categories, days):
+        authors = [user for user in users if user.role == User.Role.FACULTY]
+        # A few prolific authors and busy categories
+        author_weights = zipf_weights(len(authors))
+        category_weights = zipf_weights(len(categories), exponent=0.8)
+        posts = []
+        for _ in range(count):
+            posts.append(Post(
+                author=self.rng.choices(authors, cum_weights=author_weights)[0],
+                category=self.rng.choices(categories, cum_weights=category_weights)[0],
+                title=self.text(4, 10).capitalize(),
+                content=self.text(20, 120),
+            ))
+        posts = Post.objects.bulk_create(posts, batch_size=self.batch_size)
+
+        # auto_now_add overrides timestamps on insert, so backdate afterwards
+        span = timedelta(days=days).total_seconds()
+        for post in posts:
+            post.created_at = post.updated_at = self.now - timedelta(seconds=self.rng.random() * span)
+        Post.objects.bulk_update(posts, ['created_at', 'updated_at'], batch_size=self.batch_size)
+        return posts
+
+    def create_comments(self, count, users, posts):
+        """
+        Creates comments level by level so replies can point at parents that
+        already have ids: half are top-level and each deeper level has half
+        as many, attached to random comments one level up.
+        """
+        post_order = posts[:]
+        self.rng.shuffle(post_order)
+        post_weights = zipf_weights(len(post_order))
+        user_weights = zipf_weights(len(users), exponent=0.9)
+
+        created, parents, remaining, level_size = [], [], count, max(count // 2, 1)
+        while remaining > 0 and post_order:
+            size = min(level_size, remaining)
+            level, times = [], []
+            for _ in range(size):
+                if parents:
+                    parent = self.rng.choice(parents)
+                    post_id, after = parent.post_id, parent.created_at
+                else:
+                    parent = None
+                    post = self.rng.choices(post_order, cum_weights=post_weights)[0]
+                    post_id, after = post.pk, post.created_at
+                level.append(Comment(
+                    post_id=post_id, parent=parent,
+                    author=self.rng.choices(users, cum_weights=user_weights)[0],
+                    content=self.text(5, 40),
+                ))
+                times.append(min(after + timedelta(minutes=self.rng.randint(1, 2880)), self.now))
+            level = Comment.objects.bulk_create(level, batch_size=self.batch_size)
+            for comment, created_at in zip(level, times):
+                comment.created_at = comment.updated_at = created_at
+            Comment.objects.bulk_update(level, ['created_at', 'updated_at'], batch_size=self.batch_size)
+            created.extend(level)
+            parents, remaining, level_size = level, remaining - size, max(level_size // 2, 1)
+        return created
+
+    def create_votes(self, count, users, posts, comments):
+        total = 0
+        if not posts:
+            return total
+        post_order = posts[:]
+        self.rng.shuffle(post_order)
+        targets = [('post', post_order, zipf_weights(len(post_order)), int(count * 0.7))]
+        if comments:
+            comment_order = comments[:]
+            self.rng.shuffle(comment_order)
+            targets.append(('comment', comment_order, zipf_weights(len(comment_order)), count - int(count * 0.7)))
+
+        for field, objects, weights, wanted in targets:
+            pairs = set()
+            # Popular targets saturate, so cap the attempts
+            for _ in range(wanted * 3):
+                if len(pairs) >= wanted:
+                    break
+                target = self.rng.choices(objects, cum_weights=weights)[0]
+                pairs.add((self.rng.choice(users).pk, target.pk))
+            votes = [
+                Vote(user_id=user_id, value=1 if self.rng.random() < 0.8 else -1, **{f'{field}_id': target_id})
+                for user_id, target_id in pairs
+            ]
+            Vote.objects.bulk_create(votes, batch_size=self.batch_size)
+            total += len(votes)
+        return total
+
+    def create_saves(self, count, users, posts):
+        post_order = posts[:]
+        self.rng.shuffle(post_order)
+        weights = zipf_weights(len(post_order))
+        pairs = set()
+        for _ in range(count * 3):
+            if len(pairs) >= count or not post_order:
+                break
+            pairs.add((self.rng.choice(users).pk, self.rng.choices(post_order, cum_weights=weights)[0].pk))
+        saves = SavedPost.objects.bulk_create(
+            [SavedPost(user_id=user_id, post_id=post_id) for user_id, post_id in pairs], batch_size=self.batch_size
+        )
+        return len(saves)
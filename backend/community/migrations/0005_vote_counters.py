@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:05
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_vote_counters(apps, schema_editor):
+    # Inlined rather than imported from community.votes, which may change later
+    Vote = apps.get_model('community', 'Vote')
+    for model_name, field in (('Post', 'post'), ('Comment', 'comment')):
+        model = apps.get_model('community', model_name)
+
+        def tally(value):
+            votes = (
+                Vote.objects
+                .filter(**{field: OuterRef('pk'), 'value': value})
+                .order_by()
+                .values(field)
+                .annotate(total=Count('pk'))
+                .values('total')
+            )
+            return Coalesce(Subquery(votes), Value(0))
+
+        model.objects.update(upvotes=tally(1), downvotes=tally(-1))
+        model.objects.update(score=F('upvotes') - F('downvotes'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0004_category_created_by_savedpost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='downvotes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='upvotes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='downvotes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='upvotes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_vote_counters, migrations.RunPython.noop),
+    ]
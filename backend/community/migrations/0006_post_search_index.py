@@ -0,0 +1,82 @@
+from django.db import DatabaseError, migrations, transaction
+
+SQLITE_TABLE = 'community_post_fts'
+POSTGRES_TABLE = 'community_post_search'
+
+
+def _tables(apps):
+    return (
+        apps.get_model('community', 'Post')._meta.db_table,
+        apps.get_model('users', 'User')._meta.db_table,
+    )
+
+
+def _create_sqlite(cursor, post_table, user_table):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} "
+        "USING fts5(title, content, author, tokenize='porter unicode61')"
+    )
+    cursor.execute(f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0, 2.0)')")
+    cursor.execute(
+        f"INSERT INTO {SQLITE_TABLE}(rowid, title, content, author) "
+        f"SELECT p.id, p.title, p.content, u.username FROM {post_table} p "
+        f"JOIN {user_table} u ON u.id = p.author_id"
+    )
+
+
+def _create_postgres(cursor, post_table, user_table):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+        f"post_id bigint PRIMARY KEY REFERENCES {post_table}(id) ON DELETE CASCADE, "
+        f"document tsvector NOT NULL)"
+    )
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_document_gin "
+        f"ON {POSTGRES_TABLE} USING GIN (document)"
+    )
+    cursor.execute(
+        f"INSERT INTO {POSTGRES_TABLE} (post_id, document) "
+        f"SELECT p.id, "
+        f"setweight(to_tsvector('english', coalesce(p.title, '')), 'A') || "
+        f"setweight(to_tsvector('simple', coalesce(u.username, '')), 'B') || "
+        f"setweight(to_tsvector('english', coalesce(p.content, '')), 'C') "
+        f"FROM {post_table} p JOIN {user_table} u ON u.id = p.author_id"
+    )
+
+
+CREATE = {'sqlite': _create_sqlite, 'postgresql': _create_postgres}
+TABLES = {'sqlite': SQLITE_TABLE, 'postgresql': POSTGRES_TABLE}
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    create = CREATE.get(connection.vendor)
+    if create is None:
+        return
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            create(cursor, *_tables(apps))
+    except DatabaseError:
+        # e.g. an SQLite build without FTS5; search falls back to unindexed
+        # matching until the index can be created.
+        pass
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    table = TABLES.get(connection.vendor)
+    if table is not None:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0005_vote_counters'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:10
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+# The ranking formula as of this migration (see community.ranking)
+GRAVITY = 1.5
+COMMENT_WEIGHT = 0.5
+WINDOWS = {'day': timedelta(days=1), 'week': timedelta(days=7)}
+
+
+def backfill_rankings(apps, schema_editor):
+    Post = apps.get_model('community', 'Post')
+    Comment = apps.get_model('community', 'Comment')
+    PostRanking = apps.get_model('community', 'PostRanking')
+
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('pk')).values('total')
+    Post.objects.update(comment_count=Coalesce(Subquery(comments), Value(0)))
+
+    now = timezone.now()
+    batch = []
+    columns = ['id', 'category_id', 'created_at', 'score', 'comment_count']
+    for post in Post.objects.order_by('pk').values(*columns).iterator(chunk_size=1000):
+        age_hours = max((now - post['created_at']).total_seconds(), 0) / 3600
+        batch.append(PostRanking(
+            post_id=post['id'],
+            category_id=post['category_id'],
+            created_at=post['created_at'],
+            hot=(post['score'] + COMMENT_WEIGHT * post['comment_count']) / (age_hours + 2) ** GRAVITY,
+            score=post['score'],
+            decayed_at=now,
+            **{
+                f'top_{window}': post['score'] if now - post['created_at'] <= span else None
+                for window, span in WINDOWS.items()
+            },
+        ))
+        if len(batch) >= 1000:
+            PostRanking.objects.bulk_create(batch)
+            batch = []
+    PostRanking.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0006_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='PostRanking',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='community.post')),
+                ('created_at', models.DateTimeField()),
+                ('hot', models.FloatField(default=0)),
+                ('score', models.IntegerField(default=0)),
+                ('top_day', models.IntegerField(blank=True, null=True)),
+                ('top_week', models.IntegerField(blank=True, null=True)),
+                ('decayed_at', models.DateTimeField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='community.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-hot', '-post'], name='ranking_hot'), models.Index(fields=['category', '-hot', '-post'], name='ranking_cat_hot'), models.Index(fields=['-top_day', '-post'], name='ranking_top_day'), models.Index(fields=['category', '-top_day', '-post'], name='ranking_cat_top_day'), models.Index(fields=['-top_week', '-post'], name='ranking_top_week'), models.Index(fields=['category', '-top_week', '-post'], name='ranking_cat_top_week'), models.Index(fields=['-score', '-post'], name='ranking_top_all'), models.Index(fields=['category', '-score', '-post'], name='ranking_cat_top_all')],
+            },
+        ),
+        migrations.RunPython(backfill_rankings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+PATH_WIDTH = 10
+
+
+def backfill_comment_paths(apps, schema_editor):
+    Comment = apps.get_model('community', 'Comment')
+    parents = dict(Comment.objects.values_list('id', 'parent_id'))
+    positions = {}
+
+    def position(pk):
+        # Walk up to the nearest ancestor with a known position, then back down.
+        chain = []
+        while pk is not None and pk not in positions:
+            chain.append(pk)
+            pk = parents.get(pk)
+        for node in reversed(chain):
+            segment = str(node).zfill(PATH_WIDTH)
+            parent = positions.get(parents[node])
+            positions[node] = (f'{parent[0]}/{segment}', parent[1] + 1) if parent else (segment, 0)
+        return positions[chain[0]] if chain else positions[pk]
+
+    batch = []
+    for pk in sorted(parents):
+        path, depth = position(pk)
+        batch.append(Comment(pk=pk, path=path, depth=depth))
+        if len(batch) >= 1000:
+            Comment.objects.bulk_update(batch, ['path', 'depth'])
+            batch = []
+    if batch:
+        Comment.objects.bulk_update(batch, ['path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0007_post_ranking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=2000),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path'),
+        ),
+        migrations.RunPython(backfill_comment_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_post_counts(apps, schema_editor):
+    Category = apps.get_model('community', 'Category')
+    Post = apps.get_model('community', 'Post')
+    posts = (
+        Post.objects
+        .filter(category=OuterRef('pk'))
+        .order_by()
+        .values('category')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Category.objects.update(post_count=Coalesce(Subquery(posts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0010_videoupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_post_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0012_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='savedpost',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='saved_user_created'),
+        ),
+    ]
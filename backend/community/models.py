@@ -1,3 +1,6 @@
+import os
+import uuid
+
 from django.db import models
 from django.conf import settings
 
@@ -6,6 +9,9 @@ class Category(models.Model):
     slug = models.SlugField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     icon = models.ImageField(upload_to='category_icons/', blank=True, null=True)
+    icon_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Denormalized, maintained by the Post signals (see community.directory)
+    post_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_categories')
 
@@ -31,34 +37,127 @@ class Post(models.Model):
     
     # Media/Link fields
     image = models.ImageField(upload_to='post_images/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     video = models.FileField(upload_to='post_videos/', blank=True, null=True)
     link_url = models.URLField(blank=True, null=True)
 
+    # Denormalized vote counters, maintained by community.votes
+    upvotes = models.PositiveIntegerField(default=0)
+    downvotes = models.PositiveIntegerField(default=0)
+    score = models.IntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Newest-first feeds, overall and filtered by ?category= / ?author=
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_created'),
+            models.Index(fields=['category', '-created_at', '-id'], name='post_cat_created'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so the save signal can tell when a post moves category
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        return instance
+
     def __str__(self):
         return self.title
 
+class PostRanking(models.Model):
+    """
+    Materialized feed ranking for one post, maintained by community.ranking.
+
+    top_day/top_week hold the score while the post is inside that window and
+    are cleared once it ages out, so each ranked feed is a single index range
+    scan, globally or per category.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='ranking')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+    hot = models.FloatField(default=0)
+    score = models.IntegerField(default=0)
+    top_day = models.IntegerField(null=True, blank=True)
+    top_week = models.IntegerField(null=True, blank=True)
+    decayed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-hot', '-post'], name='ranking_hot'),
+            models.Index(fields=['category', '-hot', '-post'], name='ranking_cat_hot'),
+            models.Index(fields=['-top_day', '-post'], name='ranking_top_day'),
+            models.Index(fields=['category', '-top_day', '-post'], name='ranking_cat_top_day'),
+            models.Index(fields=['-top_week', '-post'], name='ranking_top_week'),
+            models.Index(fields=['category', '-top_week', '-post'], name='ranking_cat_top_week'),
+            models.Index(fields=['-score', '-post'], name='ranking_top_all'),
+            models.Index(fields=['category', '-score', '-post'], name='ranking_cat_top_all'),
+        ]
+
+    def __str__(self):
+        return f"Ranking for {self.post_id}"
+
 class PostImage(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='post_images/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Image for {self.post.title}"
 
+COMMENT_PATH_WIDTH = 10
+
+def comment_tree_position(parent_path, parent_depth, pk):
+    """
+    Returns (path, depth) for a comment under a parent (None for top-level).
+    Paths are '/'-joined zero-padded ids, so ordering by path yields the
+    thread depth-first with siblings oldest first.
+    """
+    segment = str(pk).zfill(COMMENT_PATH_WIDTH)
+    if parent_path is None:
+        return segment, 0
+    return f"{parent_path}/{segment}", parent_depth + 1
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='comments')
     content = models.TextField()
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies')
+    upvotes = models.PositiveIntegerField(default=0)
+    downvotes = models.PositiveIntegerField(default=0)
+    score = models.IntegerField(default=0)
+    # Materialized thread position, see comment_tree_position()
+    path = models.CharField(max_length=2000, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'path'], name='comment_post_path'),
+            models.Index(fields=['post', '-created_at'], name='comment_post_created'),
+            models.Index(fields=['author', '-created_at'], name='comment_author_created'),
+            models.Index(fields=['-created_at'], name='comment_created'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding and not self.path:
+            # The path embeds the row's own id, so it is filled in right after the insert.
+            parent = self.parent
+            self.path, self.depth = comment_tree_position(
+                parent.path if parent else None, parent.depth if parent else 0, self.pk
+            )
+            Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+
 class Vote(models.Model):
     class VoteValue(models.IntegerChoices):
         UPVOTE = 1, 'Upvote'
@@ -75,6 +174,11 @@ class Vote(models.Model):
             ('user', 'post'),
             ('user', 'comment'),
         ]
+        # Per-target tallies (rebuild_vote_counters)
+        indexes = [
+            models.Index(fields=['post', 'value'], name='vote_post_value'),
+            models.Index(fields=['comment', 'value'], name='vote_comment_value'),
+        ]
 
 class SavedPost(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='saved_posts')
@@ -84,6 +188,35 @@ class SavedPost(models.Model):
     class Meta:
         unique_together = ('user', 'post')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='saved_user_created'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} saved {self.post.title}"
+
+class VideoUpload(models.Model):
+    """
+    A resumable, chunked video upload. Chunks are appended to a temp file
+    under CHUNKED_UPLOAD_DIR and the file is attached to a Post on finalize.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        COMPLETE = 'COMPLETE', 'Complete'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='video_uploads')
+    post = models.ForeignKey(Post, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.filename} ({self.offset}/{self.size})"
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{self.pk}.part")
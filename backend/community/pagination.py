@@ -0,0 +1,224 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Keeps full microsecond precision on datetimes; DjangoJSONEncoder rounds
+    them to milliseconds, which would skip rows sharing a boundary.
+    """
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, reverse=False):
+    """
+    Packs a boundary row's ordering values into an opaque cursor token.
+    """
+    payload = json.dumps({'v': list(values), 'r': int(reverse)}, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(encoded):
+    """
+    Inverse of encode_cursor. Returns (values, reverse) and raises
+    ValueError for anything that is not a well-formed token.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        values, reverse = payload['v'], bool(payload.get('r'))
+    except (TypeError, KeyError, binascii.Error, UnicodeError) as exc:
+        raise ValueError('Malformed cursor') from exc
+    if not isinstance(values, list):
+        raise ValueError('Malformed cursor')
+    return values, reverse
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on a unique ordering, e.g. (created_at, id).
+
+    Each page is fetched with a "WHERE (created_at, id) < (?, ?)" style
+    filter and a LIMIT, so it never counts the table and never scans past
+    an OFFSET. Cursors are opaque base64 tokens holding the boundary row's
+    ordering values and the direction of travel.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.fields = self.get_ordering(view)
+
+        values, reverse = self.decode_cursor(request)
+        if values is not None:
+            values = self.clean_values(queryset.model, values)
+        ordering = [(name, desc != reverse) for name, desc in self.fields]
+        queryset = queryset.order_by(*[('-' if desc else '') + name for name, desc in ordering])
+        if values is not None:
+            queryset = queryset.filter(self.boundary_filter(ordering, values))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.page = results
+        self.has_next = has_more if not reverse else values is not None
+        self.has_previous = values is not None if not reverse else has_more
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, view):
+        """
+        Returns [(field, descending), ...]. Views may override the ordering
+        with a cursor_ordering attribute; the last field must be unique.
+        """
+        ordering = getattr(view, 'cursor_ordering', None) or self.ordering
+        return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+    @staticmethod
+    def boundary_filter(ordering, values):
+        """
+        Builds (a < x) OR (a = x AND b < y) OR ... for the given ordering,
+        flipping each comparison for ascending fields.
+        """
+        condition = Q()
+        equal = Q()
+        for (name, desc), value in zip(ordering, values):
+            lookup = f"{name}__{'lt' if desc else 'gt'}"
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            values, reverse = decode_cursor(encoded)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def clean_values(self, model, values):
+        """
+        Converts decoded cursor values to the ordering fields' Python types,
+        so a tampered token is a 404 rather than an error in the query.
+        """
+        cleaned = []
+        for (name, _), value in zip(self.fields, values):
+            *relations, field_name = name.split('__')
+            field_model = model
+            for relation in relations:
+                field_model = field_model._meta.get_field(relation).related_model
+            field = field_model._meta.get_field(field_name)
+            if value is None or isinstance(value, (bool, list, dict)):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                cleaned.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def encode_cursor(self, obj, reverse):
+        values = [attrgetter(name.replace('__', '.'))(obj) for name, _ in self.fields]
+        return replace_query_param(self.base_url, self.cursor_query_param, encode_cursor(values, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class FeedPagination(BasePagination):
+    """
+    Page-number pagination by default, keyset pagination when the client
+    asks for it with ?pagination=cursor or is following a cursor link.
+    """
+    mode_query_param = 'pagination'
+    page_number_class = StandardResultsSetPagination
+    keyset_class = KeysetPagination
+
+    def __init__(self):
+        self.page_number = self.page_number_class()
+        self.keyset = self.keyset_class()
+        self.active = self.page_number
+
+    def uses_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.keyset.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.active = self.keyset if self.uses_keyset(request) else self.page_number
+        return self.active.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
@@ -0,0 +1,151 @@
+"""
+Hot and top feed rankings.
+
+Each post has a PostRanking row holding its precomputed hot score and its
+score for each "top" window. Rows are refreshed whenever the post's votes or
+comment count change, and the decay_rankings management command periodically
+re-decays hot scores and drops posts out of the day/week windows.
+
+hot = (score + COMMENT_WEIGHT * comments) / (age_hours + 2) ** GRAVITY
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import invalidate_rankings
+from .models import Post, PostRanking
+
+GRAVITY = 1.5
+COMMENT_WEIGHT = 0.5
+DECAY_HORIZON = timedelta(days=7)
+
+WINDOWS = {
+    'day': timedelta(days=1),
+    'week': timedelta(days=7),
+}
+
+SORT_FIELDS = {
+    ('hot', None): 'hot',
+    ('top', 'day'): 'top_day',
+    ('top', 'week'): 'top_week',
+    ('top', 'all'): 'score',
+}
+
+
+def hot_score(score, comment_count, created_at, now):
+    age_hours = max((now - created_at).total_seconds(), 0) / 3600
+    return (score + COMMENT_WEIGHT * comment_count) / (age_hours + 2) ** GRAVITY
+
+
+def ranking_fields(post, now):
+    """
+    Returns the PostRanking column values as of now for a post given as a
+    values() dict of category_id, created_at, score and comment_count.
+    """
+    created_at, score = post['created_at'], post['score']
+    fields = {
+        'category_id': post['category_id'],
+        'created_at': created_at,
+        'hot': hot_score(score, post['comment_count'], created_at, now),
+        'score': score,
+        'decayed_at': now,
+    }
+    for window, span in WINDOWS.items():
+        fields[f'top_{window}'] = score if now - created_at <= span else None
+    return fields
+
+
+def sort_field(sort, window):
+    """
+    Maps ?sort=/&window= to a PostRanking column, or None for an unknown
+    combination. hot ignores the window; top defaults to the week.
+    """
+    if sort == 'hot':
+        return SORT_FIELDS[('hot', None)]
+    if sort == 'top':
+        return SORT_FIELDS.get(('top', window or 'week'))
+    return None
+
+
+def refresh_post_ranking(post_id, now=None):
+    """
+    Recomputes one post's ranking row after its votes, comments or category
+    changed.
+    """
+    now = now or timezone.now()
+    post = (
+        Post.objects.filter(pk=post_id)
+        .values('category_id', 'created_at', 'score', 'comment_count')
+        .first()
+    )
+    if post is None:
+        return
+    PostRanking.objects.update_or_create(post_id=post_id, defaults=ranking_fields(post, now))
+
+
+def rebuild_rankings(post_model, ranking_model, now=None, since=None, batch_size=1000):
+    """
+    Upserts ranking rows for every post (or only those created after since)
+    in batches, then clears window scores for posts that aged out. Takes the
+    models as arguments so migrations can pass their historical versions.
+    """
+    now = now or timezone.now()
+    posts = post_model.objects.order_by('pk')
+    if since is not None:
+        posts = posts.filter(created_at__gte=since)
+
+    updated = 0
+    batch = []
+    columns = ['id', 'category_id', 'created_at', 'score', 'comment_count']
+    for post in posts.values(*columns).iterator(chunk_size=batch_size):
+        batch.append(ranking_model(post_id=post['id'], **ranking_fields(post, now)))
+        if len(batch) >= batch_size:
+            updated += _upsert(ranking_model, batch)
+            batch = []
+    if batch:
+        updated += _upsert(ranking_model, batch)
+
+    for window, span in WINDOWS.items():
+        field = f'top_{window}'
+        ranking_model.objects.filter(
+            **{'created_at__lt': now - span, f'{field}__isnull': False}
+        ).update(**{field: None})
+    return updated
+
+
+def _upsert(ranking_model, rows):
+    with transaction.atomic():
+        ranking_model.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['post'],
+            update_fields=['category', 'created_at', 'hot', 'score', 'top_day', 'top_week', 'decayed_at'],
+        )
+    return len(rows)
+
+
+def decay_rankings(now=None, horizon=DECAY_HORIZON):
+    """
+    Re-decays hot scores for posts younger than horizon; older posts keep
+    their last (already negligible) hot score.
+    """
+    now = now or timezone.now()
+    count = rebuild_rankings(Post, PostRanking, now=now, since=now - horizon)
+    # Cached feeds are keyed on 'rankings', so they pick up the new order
+    invalidate_rankings()
+    return count
+
+
+def rebuild_comment_counts(post_model, comment_model):
+    comments = (
+        comment_model.objects
+        .filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return post_model.objects.update(comment_count=Coalesce(Subquery(comments), Value(0)))
@@ -0,0 +1,285 @@
+"""
+Full-text search over posts.
+
+The index lives in a side table kept in sync by the signal handlers in
+community.signals:
+
+* SQLite: an FTS5 virtual table (community_post_fts) whose rowid is the post
+  id, ranked with bm25().
+* PostgreSQL: community_post_search holding a weighted tsvector per post with
+  a GIN index, ranked with ts_rank_cd().
+
+Other databases (or SQLite builds without FTS5) fall back to icontains
+filtering ordered by recency, so the endpoint keeps working everywhere.
+
+Every backend returns hits ordered by (rank, post_id) ascending, where a lower
+rank is a better match; that pair is what the search cursor encodes.
+"""
+import html
+import re
+from dataclasses import dataclass
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.db.models import Q
+
+from .models import Post
+
+SQLITE_TABLE = 'community_post_fts'
+POSTGRES_TABLE = 'community_post_search'
+
+# Private-use code points used as highlight markers so that the snippet can
+# be HTML-escaped before the real <mark> tags go in.
+MARK_START, MARK_END = '\ue000', '\ue001'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+@dataclass
+class SearchHit:
+    post_id: int
+    rank: float
+    title: str
+    snippet: str
+
+
+def render_highlight(text):
+    """
+    Escapes an index snippet and turns the markers into <mark> tags.
+    """
+    escaped = html.escape(text or '')
+    return escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query or '')[:16]
+
+
+def _tables():
+    return Post._meta.db_table, get_user_model()._meta.db_table
+
+
+class SQLiteSearchBackend:
+    vendor = 'sqlite'
+
+    def install(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} "
+            "USING fts5(title, content, author, tokenize='porter unicode61')"
+        )
+        # Title matches outweigh author matches, which outweigh body matches.
+        cursor.execute(f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0, 2.0)')")
+
+    def uninstall(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+
+    def index(self, cursor, post_id, title, content, author):
+        cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [post_id])
+        cursor.execute(
+            f"INSERT INTO {SQLITE_TABLE}(rowid, title, content, author) VALUES (%s, %s, %s, %s)",
+            [post_id, title, content, author],
+        )
+
+    def remove(self, cursor, post_id):
+        cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [post_id])
+
+    def rebuild(self, cursor):
+        post_table, user_table = _tables()
+        cursor.execute(f"DELETE FROM {SQLITE_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {SQLITE_TABLE}(rowid, title, content, author) "
+            f"SELECT p.id, p.title, p.content, u.username FROM {post_table} p "
+            f"JOIN {user_table} u ON u.id = p.author_id"
+        )
+
+    def search(self, cursor, terms, limit, after=None):
+        # Quote every term so user input can never be parsed as FTS syntax;
+        # the last one is a prefix match for search-as-you-type.
+        match = ' '.join(f'"{term}"' for term in terms) + '*'
+        params = [match]
+        boundary = ''
+        if after is not None:
+            boundary = 'AND (rank > %s OR (rank = %s AND rowid > %s))'
+            params += [after[0], after[0], after[1]]
+        cursor.execute(
+            f"SELECT rowid, rank, "
+            f"highlight({SQLITE_TABLE}, 0, %s, %s), "
+            f"snippet({SQLITE_TABLE}, 1, %s, %s, '…', 32) "
+            f"FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s {boundary} "
+            f"ORDER BY rank, rowid LIMIT %s",
+            [MARK_START, MARK_END, MARK_START, MARK_END] + params + [limit],
+        )
+        return [SearchHit(*row) for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    vendor = 'postgresql'
+    config = 'english'
+    document_sql = (
+        "setweight(to_tsvector(%(config)s, coalesce(%(title)s, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(%(author)s, '')), 'B') || "
+        "setweight(to_tsvector(%(config)s, coalesce(%(content)s, '')), 'C')"
+    )
+
+    def install(self, cursor):
+        post_table, _ = _tables()
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+            f"post_id bigint PRIMARY KEY REFERENCES {post_table}(id) ON DELETE CASCADE, "
+            f"document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_document_gin "
+            f"ON {POSTGRES_TABLE} USING GIN (document)"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {POSTGRES_TABLE}")
+
+    def index(self, cursor, post_id, title, content, author):
+        document = self.document_sql % {
+            'config': '%s', 'title': '%s', 'author': '%s', 'content': '%s',
+        }
+        cursor.execute(
+            f"INSERT INTO {POSTGRES_TABLE} (post_id, document) VALUES (%s, {document}) "
+            f"ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document",
+            [post_id, self.config, title, author, self.config, content],
+        )
+
+    def remove(self, cursor, post_id):
+        cursor.execute(f"DELETE FROM {POSTGRES_TABLE} WHERE post_id = %s", [post_id])
+
+    def rebuild(self, cursor):
+        post_table, user_table = _tables()
+        document = self.document_sql % {
+            'config': '%s', 'title': 'p.title', 'author': 'u.username', 'content': 'p.content',
+        }
+        cursor.execute(f"DELETE FROM {POSTGRES_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {POSTGRES_TABLE} (post_id, document) "
+            f"SELECT p.id, {document} FROM {post_table} p JOIN {user_table} u ON u.id = p.author_id",
+            [self.config, self.config],
+        )
+
+    def search(self, cursor, terms, limit, after=None):
+        post_table, _ = _tables()
+        # Prefix-match every term and require all of them.
+        tsquery = ' & '.join(f"{term}:*" for term in terms)
+        headline = f"StartSel={MARK_START}, StopSel={MARK_END}"
+        params = [
+            self.config, tsquery,
+            self.config, f"{headline}, HighlightAll=true",
+            self.config, f"{headline}, MaxWords=35, MinWords=15",
+        ]
+        boundary = ''
+        if after is not None:
+            boundary = 'WHERE (hits.rank > %s OR (hits.rank = %s AND hits.post_id > %s))'
+            params += [after[0], after[0], after[1]]
+        cursor.execute(
+            f"WITH q AS (SELECT to_tsquery(%s, %s) AS query), "
+            f"hits AS ("
+            f"  SELECT s.post_id, -ts_rank_cd(s.document, q.query)::float8 AS rank "
+            f"  FROM {POSTGRES_TABLE} s, q WHERE s.document @@ q.query"
+            f") "
+            f"SELECT page.post_id, page.rank, "
+            f"ts_headline(%s, p.title, q.query, %s), "
+            f"ts_headline(%s, p.content, q.query, %s) "
+            f"FROM (SELECT * FROM hits {boundary} ORDER BY rank, post_id LIMIT %s) page "
+            f"JOIN {post_table} p ON p.id = page.post_id, q "
+            f"ORDER BY page.rank, page.post_id",
+            params + [limit],
+        )
+        return [SearchHit(*row) for row in cursor.fetchall()]
+
+
+class FallbackSearchBackend:
+    """
+    Unindexed search for databases without a supported full-text engine.
+    Every hit gets the same rank, so results come back in id order.
+    """
+    vendor = None
+
+    def install(self, cursor):
+        pass
+
+    def uninstall(self, cursor):
+        pass
+
+    def index(self, cursor, post_id, title, content, author):
+        pass
+
+    def remove(self, cursor, post_id):
+        pass
+
+    def rebuild(self, cursor):
+        pass
+
+    def search(self, cursor, terms, limit, after=None):
+        queryset = Post.objects.order_by('id')
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term) | Q(content__icontains=term) | Q(author__username__icontains=term)
+            )
+        if after is not None:
+            queryset = queryset.filter(id__gt=after[1])
+        return [
+            SearchHit(post_id, 0.0, title, content[:200])
+            for post_id, title, content in queryset.values_list('id', 'title', 'content')[:limit]
+        ]
+
+
+def backend_for_vendor(vendor):
+    if vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    if vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return FallbackSearchBackend()
+
+
+def get_backend(using='default'):
+    """
+    Returns the search backend for a database alias, falling back to the
+    unindexed backend when the index table is missing (for example an SQLite
+    build without FTS5, where the migration skipped it).
+    """
+    conn = connections[using]
+    backend = backend_for_vendor(conn.vendor)
+    table = {'sqlite': SQLITE_TABLE, 'postgresql': POSTGRES_TABLE}.get(conn.vendor)
+    if table is None:
+        return backend
+    if not getattr(conn, '_community_search_ready', False):
+        with conn.cursor() as cursor:
+            conn._community_search_ready = table in conn.introspection.table_names(cursor)
+    return backend if conn._community_search_ready else FallbackSearchBackend()
+
+
+def index_post(post):
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        backend.index(cursor, post.pk, post.title, post.content, post.author.username)
+
+
+def remove_post(post_id):
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        backend.remove(cursor, post_id)
+
+
+def rebuild_index():
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        backend.rebuild(cursor)
+    return backend
+
+
+def search_posts(query, limit, after=None):
+    """
+    Returns up to limit SearchHits for query, best match first, starting
+    after the (rank, post_id) boundary when given.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        return backend.search(cursor, terms, limit, after)
@@ -1,16 +1,82 @@
+import mimetypes
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Substr
+from django.urls import reverse
+from django.utils.text import Truncator
 from rest_framework import serializers
-from .models import Category, Post, Comment, Vote, PostImage, SavedPost
-from users.serializers import UserSerializer
+from rest_framework.permissions import SAFE_METHODS
+from .models import Category, Post, Comment, Vote, PostImage, SavedPost, VideoUpload
+from users.serializers import UserSerializer, UserSummarySerializer
+from .imaging import StrippedImageField, srcset
+from .attachments import attach_post_images, discard_post_images, store_post_images
+
+EXCERPT_LENGTH = 280
+
+def _field_list(value):
+    return {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets for reads. ?fields=a,b limits the response to those
+    fields; ?expand=c adds fields listed in Meta.expandable_fields, which
+    are otherwise left out. Only the response's top-level serializer
+    follows the query string (nested serializers always drop their
+    expandable fields), and fields that are left out are never evaluated,
+    so their SerializerMethodField lookups never run.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        expandable = set(getattr(self.Meta, 'expandable_fields', ()))
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not self._is_top_level():
+            return {name: field for name, field in fields.items() if name not in expandable}
+
+        params = getattr(request, 'query_params', request.GET)
+        requested = _field_list(params.get('fields')) & set(fields)
+        if requested:
+            return {name: field for name, field in fields.items() if name in requested}
+        expand = _field_list(params.get('expand'))
+        return {name: field for name, field in fields.items() if name not in expandable or name in expand}
+
+    def _is_top_level(self):
+        parent = getattr(self, 'parent', None)
+        if isinstance(parent, serializers.ListSerializer):
+            parent = getattr(parent, 'parent', None)
+        return parent is None
+
+def output_fields(serializer_class, request):
+    """
+    Names of the fields serializer_class will render for request, so views
+    can skip loading data nobody asked for.
+    """
+    return set(serializer_class(context={'request': request}).fields)
 
-class CategorySerializer(serializers.ModelSerializer):
+def has_sparse_params(request):
+    params = getattr(request, 'query_params', request.GET)
+    return 'fields' in params or 'expand' in params
+
+class CategorySummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ('id', 'name', 'slug')
+        read_only_fields = fields
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     post_count = serializers.IntegerField(read_only=True)
     created_by = UserSerializer(read_only=True)
+    icon = StrippedImageField(required=False, allow_null=True)
+    icon_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
-        fields = '__all__'
+        exclude = ('icon_variants',)
+
+    def get_icon_srcset(self, obj):
+        return srcset(obj.icon, obj.icon_variants)
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     
     user_vote = serializers.SerializerMethodField()
@@ -18,13 +84,32 @@ class CommentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ('id', 'post', 'author', 'content', 'parent', 'created_at', 'updated_at', 'vote_count', 'user_vote')
-        read_only_fields = ('id', 'author', 'created_at', 'updated_at')
+        fields = ('id', 'post', 'author', 'content', 'parent', 'depth', 'created_at', 'updated_at', 'vote_count', 'user_vote')
+        read_only_fields = ('id', 'author', 'depth', 'created_at', 'updated_at')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            # path/depth are fixed when the comment is created, so a comment
+            # cannot be moved to another post or parent afterwards
+            for name in ('post', 'parent'):
+                if name in fields:
+                    fields[name].read_only = True
+        return fields
+
+    def validate(self, attrs):
+        post = attrs.get('post', getattr(self.instance, 'post', None))
+        parent = attrs.get('parent')
+        if parent is not None and post is not None and parent.post_id != post.pk:
+            raise serializers.ValidationError({'parent': 'Parent comment belongs to a different post.'})
+        return attrs
 
     def get_vote_count(self, obj):
-        return obj.votes.filter(value=1).count() - obj.votes.filter(value=-1).count()
+        return obj.score
 
     def get_user_vote(self, obj):
+        if 'comment_votes' in self.context:
+            return self.context['comment_votes'].get(obj.pk, 0)
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             vote = obj.votes.filter(user=request.user).first()
@@ -32,24 +117,28 @@ class CommentSerializer(serializers.ModelSerializer):
                 return vote.value
         return 0
 
-class PostImageSerializer(serializers.ModelSerializer):
+class PostImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = PostImage
-        fields = ('id', 'image', 'created_at')
+        fields = ('id', 'image', 'srcset', 'created_at')
 
     def get_image(self, obj):
         if obj.image:
             return obj.image.url
         return None
 
-class PostSerializer(serializers.ModelSerializer):
+    def get_srcset(self, obj):
+        return srcset(obj.image, obj.image_variants)
+
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     category_detail = CategorySerializer(source='category', read_only=True)
     images = PostImageSerializer(many=True, read_only=True)
     uploaded_images = serializers.ListField(
-        child=serializers.ImageField(max_length=1000000, allow_empty_file=False, use_url=False),
+        child=StrippedImageField(max_length=1000000, allow_empty_file=False, use_url=False),
         write_only=True,
         required=False
     )
@@ -61,36 +150,45 @@ class PostSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = ('id', 'author', 'category', 'category_detail', 'title', 'content', 'post_type', 
-                  'image', 'images', 'uploaded_images', 'video', 'link_url', 'created_at', 'updated_at', 'vote_count', 'comment_count', 'user_vote', 'is_saved')
+                  'image', 'image_srcset', 'images', 'uploaded_images', 'video', 'video_stream_url', 'link_url', 'created_at', 'updated_at', 'vote_count', 'comment_count', 'user_vote', 'is_saved')
         read_only_fields = ('id', 'author', 'created_at', 'updated_at')
 
     def create(self, validated_data):
         uploaded_images = validated_data.pop('uploaded_images', [])
-        post = Post.objects.create(**validated_data)
-        
-        for image in uploaded_images:
-            PostImage.objects.create(post=post, image=image)
-            
+        # Every image has been validated by now; write them all before touching rows
+        stored = store_post_images(uploaded_images)
+        try:
+            with transaction.atomic():
+                post = Post.objects.create(**validated_data)
+                attach_post_images(post, stored)
+        except Exception:
+            discard_post_images(stored)
+            raise
         return post
 
     def update(self, instance, validated_data):
         uploaded_images = validated_data.pop('uploaded_images', [])
-        
-        # Update standard fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-        
-        # Add new images
-        for image in uploaded_images:
-            PostImage.objects.create(post=instance, image=image)
-            
+        stored = store_post_images(uploaded_images)
+        try:
+            with transaction.atomic():
+                # Update standard fields
+                for attr, value in validated_data.items():
+                    setattr(instance, attr, value)
+                instance.save()
+
+                # Add new images
+                attach_post_images(instance, stored)
+        except Exception:
+            discard_post_images(stored)
+            raise
         return instance
 
     def get_vote_count(self, obj):
-        return obj.votes.filter(value=1).count() - obj.votes.filter(value=-1).count()
+        return obj.score
 
     def get_user_vote(self, obj):
+        if 'post_votes' in self.context:
+            return self.context['post_votes'].get(obj.pk, 0)
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             vote = obj.votes.filter(user=request.user).first()
@@ -99,26 +197,77 @@ class PostSerializer(serializers.ModelSerializer):
         return 0
     
     def get_is_saved(self, obj):
+        if 'saved_post_ids' in self.context:
+            return obj.pk in self.context['saved_post_ids']
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return SavedPost.objects.filter(user=request.user, post=obj).exists()
         return False
 
     video = serializers.SerializerMethodField()
+    video_stream_url = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     def get_video(self, obj):
         if obj.video:
             return obj.video.url
         return None
 
+    def get_video_stream_url(self, obj):
+        # Range-capable endpoint players can seek through
+        if not obj.video:
+            return None
+        url = reverse('post-video', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
     def get_image(self, obj):
         if obj.image:
             return obj.image.url
         return None
 
+    def get_image_srcset(self, obj):
+        return srcset(obj.image, obj.image_variants)
+
     def get_comment_count(self, obj):
-        return obj.comments.count()
+        return obj.comment_count
+
+class PostListSerializer(PostSerializer):
+    """
+    Compact feed item, the default for list pages: an excerpt instead of the
+    content, and a summary author and category instead of the full nested
+    profiles. ?expand=content,updated_at adds the full text.
+    """
+    author = UserSummarySerializer(read_only=True)
+    category_detail = CategorySummarySerializer(source='category', read_only=True)
+    excerpt = serializers.SerializerMethodField()
+
+    class Meta(PostSerializer.Meta):
+        fields = ('id', 'author', 'category', 'category_detail', 'title', 'excerpt', 'content', 'post_type',
+                  'image', 'image_srcset', 'images', 'video', 'video_stream_url', 'link_url', 'created_at', 'updated_at',
+                  'vote_count', 'comment_count', 'user_vote', 'is_saved')
+        expandable_fields = ('content', 'updated_at')
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fields):
+        """
+        Trims a feed queryset to what fields need: no image prefetch unless
+        images are shown, and only the head of the content for the excerpt.
+        """
+        if 'images' not in fields:
+            queryset = queryset.prefetch_related(None)
+        if 'content' not in fields:
+            queryset = queryset.defer('content')
+            if 'excerpt' in fields:
+                queryset = queryset.annotate(content_head=Substr('content', 1, EXCERPT_LENGTH + 1))
+        return queryset
+
+    def get_excerpt(self, obj):
+        content = obj.__dict__.get('content_head')
+        if content is None:
+            content = obj.content
+        return Truncator(content).chars(EXCERPT_LENGTH)
 
 class VoteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -126,10 +275,29 @@ class VoteSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('id', 'user')
 
-class SavedPostSerializer(serializers.ModelSerializer):
+class SavedPostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     post = PostSerializer(read_only=True)
     
     class Meta:
         model = SavedPost
         fields = ('id', 'user', 'post', 'created_at')
         read_only_fields = ('id', 'user', 'created_at')
+
+class VideoUploadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = VideoUpload
+        fields = ('id', 'filename', 'size', 'offset', 'status', 'post', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'offset', 'status', 'post', 'created_at', 'updated_at')
+
+    def validate_filename(self, value):
+        content_type = mimetypes.guess_type(value)[0] or ''
+        if not content_type.startswith('video/'):
+            raise serializers.ValidationError('Only video files can be uploaded.')
+        return value
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Size must be positive.')
+        if value > settings.MAX_VIDEO_UPLOAD_SIZE:
+            raise serializers.ValidationError(f'Videos may be at most {settings.MAX_VIDEO_UPLOAD_SIZE} bytes.')
+        return value
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import search
+from .directory import adjust_post_count
+from .imaging import needs_variants, refresh_variants
+from .models import Category, Post, PostImage, Comment
+from .ranking import refresh_post_ranking
+
+
+def schedule_variants(instance, field_name):
+    """
+    Generates image variants once the upload's transaction commits, and only
+    when the stored file actually changed.
+    """
+    if needs_variants(getattr(instance, field_name), getattr(instance, f'{field_name}_variants')):
+        transaction.on_commit(lambda: refresh_variants(instance, field_name))
+
+
+@receiver(post_save, sender=Post)
+def sync_post_derived_data(sender, instance, created, raw=False, **kwargs):
+    # Category counts, the search row, the ranking row and image variants
+    if raw:
+        return
+    old_category_id = getattr(instance, '_loaded_category_id', None)
+    if created:
+        adjust_post_count(instance.category_id, 1)
+    elif old_category_id is not None and old_category_id != instance.category_id:
+        adjust_post_count(old_category_id, -1)
+        adjust_post_count(instance.category_id, 1)
+    instance._loaded_category_id = instance.category_id
+    search.index_post(instance)
+    refresh_post_ranking(instance.pk)
+    schedule_variants(instance, 'image')
+
+
+@receiver(post_delete, sender=Post)
+def sync_deleted_post(sender, instance, origin=None, **kwargs):
+    search.remove_post(instance.pk)
+    # Posts removed along with their category need no counting.
+    if not isinstance(origin, Category):
+        adjust_post_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    Post.objects.filter(pk=instance.post_id).update(comment_count=F('comment_count') + 1)
+    refresh_post_ranking(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, origin=None, **kwargs):
+    # Comments removed because their post is being deleted need no bookkeeping.
+    if isinstance(origin, Post):
+        return
+    Post.objects.filter(pk=instance.post_id).update(comment_count=F('comment_count') - 1)
+    refresh_post_ranking(instance.post_id)
+
+
+@receiver(post_save, sender=PostImage)
+def process_post_image(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_variants(instance, 'image')
+
+
+@receiver(post_save, sender=Category)
+def process_category_icon(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_variants(instance, 'icon')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def process_profile_picture(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_variants(instance, 'profile_picture')
@@ -1,3 +1,1193 @@
-from django.test import TestCase
+import asyncio
+import fcntl
+import gzip
+import importlib
+import json
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import ExifTags, Image
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config import metrics
+from config.compression import choose_encoding
+from config.renderers import FastJSONParser, FastJSONRenderer
+
+from .events import get_backend
+from .export import export_lines, export_queryset
+from .imaging import generate_variants
+from .management.commands.audit_queries import sqlite_findings
+from .models import Category, Comment, Post, PostImage, PostRanking, SavedPost, Vote
+from .pagination import encode_cursor
+from .ranking import refresh_post_ranking
+from .vote_buffer import VoteBuffer, cast_vote
+from .votes import apply_vote, rebuild_vote_counters
+
+User = get_user_model()
+
+
+def migration(name):
+    return importlib.import_module(f'community.migrations.{name}')
+
+
+class CommunityTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.faculty = User.objects.create_user('faculty', 'faculty@example.com', 'pw', role='FACULTY')
+        self.student = User.objects.create_user('student', 'student@example.com', 'pw')
+        self.category = Category.objects.create(name='General', slug='general', created_by=self.faculty)
+
+    def make_post(self, **kwargs):
+        kwargs.setdefault('author', self.faculty)
+        kwargs.setdefault('category', self.category)
+        kwargs.setdefault('title', 'A post')
+        kwargs.setdefault('content', 'Some content')
+        return Post.objects.create(**kwargs)
+
+    def use_temporary_media(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=f'{root}/media', CHUNKED_UPLOAD_DIR=f'{root}/uploads')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def make_comment(self, post, **kwargs):
+        kwargs.setdefault('author', self.student)
+        kwargs.setdefault('content', 'A comment')
+        return Comment.objects.create(post=post, **kwargs)
+
+
+class VoteCounterTests(CommunityTestCase):
+    def vote(self, user, url, value):
+        self.client.force_authenticate(user)
+        return self.client.post(url, {'value': value}, format='json')
+
+    def test_vote_flip_and_toggle_keep_counters_in_step(self):
+        post = self.make_post()
+        url = f'/api/community/posts/{post.pk}/vote/'
+
+        self.assertEqual(self.vote(self.student, url, 1).data['vote_count'], 1)
+        self.assertEqual(self.vote(self.faculty, url, -1).data['vote_count'], 0)
+        self.assertEqual(self.vote(self.student, url, -1).data['vote_count'], -2)
+        post.refresh_from_db()
+        self.assertEqual((post.upvotes, post.downvotes, post.score), (0, 2, -2))
+
+        self.assertEqual(self.vote(self.student, url, -1).data['status'], 'vote removed')
+        post.refresh_from_db()
+        self.assertEqual((post.upvotes, post.downvotes, post.score), (0, 1, -1))
+
+    def test_comment_votes(self):
+        comment = self.make_comment(self.make_post())
+        self.vote(self.faculty, f'/api/community/comments/{comment.pk}/vote/', 1)
+        comment.refresh_from_db()
+        self.assertEqual((comment.upvotes, comment.score), (1, 1))
+
+    def test_rebuild_vote_counters_recounts_from_votes(self):
+        post = self.make_post()
+        Vote.objects.create(user=self.student, post=post, value=1)
+        Vote.objects.create(user=self.faculty, post=post, value=-1)
+        Post.objects.filter(pk=post.pk).update(upvotes=7, downvotes=0, score=7)
+
+        rebuild_vote_counters(Post, Vote, 'post')
+        post.refresh_from_db()
+        self.assertEqual((post.upvotes, post.downvotes, post.score), (1, 1, 0))
+
+    def test_migration_backfill(self):
+        post = self.make_post()
+        comment = self.make_comment(post)
+        Vote.objects.create(user=self.student, post=post, value=1)
+        Vote.objects.create(user=self.faculty, comment=comment, value=-1)
+        Post.objects.update(upvotes=0, score=0)
+        Comment.objects.update(downvotes=0, score=0)
+
+        migration('0005_vote_counters').backfill_vote_counters(apps, None)
+        post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual((post.upvotes, post.score), (1, 1))
+        self.assertEqual((comment.downvotes, comment.score), (1, -1))
+
+
+class ViewerStateTests(CommunityTestCase):
+    def list_posts(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/community/posts/')
+        return response, len(queries)
+
+    def test_list_reports_the_viewers_votes_and_saves(self):
+        voted, saved, plain = self.make_post(), self.make_post(), self.make_post()
+        Vote.objects.create(user=self.student, post=voted, value=-1)
+        SavedPost.objects.create(user=self.student, post=saved)
+        self.client.force_authenticate(self.student)
+
+        response, _ = self.list_posts()
+        state = {item['id']: (item['user_vote'], item['is_saved']) for item in response.data['results']}
+        self.assertEqual(state, {voted.pk: (-1, False), saved.pk: (0, True), plain.pk: (0, False)})
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.client.force_authenticate(self.student)
+        self.make_post()
+        _, few = self.list_posts()
+        for _ in range(5):
+            post = self.make_post()
+            Vote.objects.create(user=self.student, post=post, value=1)
+        _, many = self.list_posts()
+        self.assertEqual(few, many)
+
+
+class KeysetPaginationTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.posts = [self.make_post(title=f'Post {i}') for i in range(5)]
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_cursor_walks_every_post_once_newest_first(self):
+        seen = self.walk('/api/community/posts/?pagination=cursor&page_size=2')
+        self.assertEqual(seen, [post.pk for post in reversed(self.posts)])
+
+    def test_ranked_feed_cursor(self):
+        seen = self.walk('/api/community/posts/?pagination=cursor&page_size=2&sort=hot')
+        self.assertCountEqual(seen, [post.pk for post in self.posts])
+
+    def test_tampered_cursors_are_not_found(self):
+        tampered = [
+            'not-base64!', encode_cursor(['yesterday', 1]), encode_cursor([[1], 1]),
+            encode_cursor(['2024-01-01T00:00:00+00:00', 'x']), encode_cursor([None, 1]),
+            encode_cursor(['2024-01-01T00:00:00+00:00']),
+        ]
+        for cursor in tampered:
+            for sort in ('', '&sort=hot'):
+                response = self.client.get(f'/api/community/posts/?cursor={cursor}{sort}')
+                self.assertEqual(response.status_code, 404, (cursor, sort))
+        # A number where the feed orders by a datetime
+        response = self.client.get(f"/api/community/posts/?cursor={encode_cursor([12, 1])}")
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_comment_tree_cursor(self):
+        post = self.posts[0]
+        self.make_comment(post)
+        url = f'/api/community/posts/{post.pk}/comment-tree/'
+        for cursor in (encode_cursor(['x', None]), encode_cursor([None, 5]), encode_cursor([True, None])):
+            self.assertEqual(self.client.get(f'{url}?cursor={cursor}').status_code, 404)
+        self.assertEqual(self.client.get(f'{url}?parent=abc').status_code, 404)
+        self.assertEqual(self.client.get(f'{url}?cursor={encode_cursor([None, None])}').status_code, 200)
+
+
+class SearchTests(CommunityTestCase):
+    def search(self, query, **params):
+        return self.client.get('/api/community/posts/search/', {'q': query, **params})
+
+    def test_title_matches_rank_first_and_are_highlighted(self):
+        body = self.make_post(title='Weekly notes', content='The library closes early for the exam')
+        title = self.make_post(title='Library hours', content='Opening times')
+        self.make_post(title='Unrelated', content='Nothing here')
+
+        response = self.search('library')
+        self.assertEqual([item['id'] for item in response.data['results']], [title.pk, body.pk])
+        self.assertIn('<mark>Library</mark>', response.data['results'][0]['highlight']['title'])
+
+    def test_edits_and_deletes_update_the_index(self):
+        post = self.make_post(title='Robotics club')
+        post.title = 'Chess club'
+        post.save()
+        self.assertEqual(self.search('robotics').data['results'], [])
+        self.assertEqual(len(self.search('chess').data['results']), 1)
+        post.delete()
+        self.assertEqual(self.search('chess').data['results'], [])
+
+    def test_prefix_match_and_cursor(self):
+        for i in range(3):
+            self.make_post(title=f'Hackathon {i}')
+        first = self.search('hack', page_size=2)
+        self.assertEqual(len(first.data['results']), 2)
+        second = self.client.get(first.data['next'])
+        ids = [item['id'] for item in first.data['results'] + second.data['results']]
+        self.assertEqual(len(set(ids)), 3)
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.make_post(title='Exam schedule')
+        for query in ('exam OR', '"exam', 'NEAR(exam', 'exam*)', '-'):
+            self.assertEqual(self.search(query).status_code, 200, query)
+
+
+class RankingTests(CommunityTestCase):
+    def feed(self, **params):
+        return [item['id'] for item in self.client.get('/api/community/posts/', params).data['results']]
+
+    def backdate(self, post, **delta):
+        Post.objects.filter(pk=post.pk).update(created_at=timezone.now() - timedelta(**delta))
+        refresh_post_ranking(post.pk)
+
+    def test_hot_prefers_recent_activity_and_follows_votes(self):
+        old, new = self.make_post(title='old'), self.make_post(title='new')
+        self.backdate(old, hours=30)
+        self.assertEqual(self.feed(sort='hot'), [new.pk, old.pk])
+
+        for user in (self.student, self.faculty):
+            self.client.force_authenticate(user)
+            self.client.post(f'/api/community/posts/{old.pk}/vote/', {'value': 1}, format='json')
+        self.client.force_authenticate(None)
+        self.assertEqual(self.feed(sort='hot'), [old.pk, new.pk])
+
+    def test_top_windows(self):
+        recent, last_month = self.make_post(), self.make_post()
+        apply_vote(self.student, last_month, 1)
+        self.backdate(last_month, days=30)
+
+        self.assertEqual(self.feed(sort='top', window='week'), [recent.pk])
+        self.assertEqual(self.feed(sort='top', window='all'), [last_month.pk, recent.pk])
+
+    def test_decay_expires_windows(self):
+        post = self.make_post()
+        Post.objects.filter(pk=post.pk).update(created_at=timezone.now() - timedelta(days=2))
+        call_command('decay_rankings', stdout=StringIO())
+        ranking = PostRanking.objects.get(post=post)
+        self.assertIsNone(ranking.top_day)
+        self.assertIsNotNone(ranking.top_week)
+
+    def test_migration_backfill(self):
+        post = self.make_post()
+        self.make_comment(post)
+        PostRanking.objects.all().delete()
+        Post.objects.update(comment_count=0)
+
+        migration('0007_post_ranking').backfill_rankings(apps, None)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(PostRanking.objects.get(post=post).top_day, 0)
+
+
+class CommentThreadTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.make_post()
+        self.first = self.make_comment(self.post)
+        self.second = self.make_comment(self.post)
+        self.reply = self.make_comment(self.post, parent=self.first)
+
+    def test_tree_is_depth_first(self):
+        response = self.client.get(f'/api/community/posts/{self.post.pk}/comment-tree/')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([item['id'] for item in results], [self.first.pk, self.second.pk])
+        self.assertEqual([item['id'] for item in results[0]['replies']], [self.reply.pk])
+        self.assertEqual(results[0]['replies'][0]['depth'], 1)
+
+    def test_non_positive_limits_return_one_comment(self):
+        for limit in (0, -5):
+            response = self.client.get(f'/api/community/posts/{self.post.pk}/comment-tree/?limit={limit}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([item['id'] for item in response.data['results']], [self.first.pk])
+            self.assertIn('cursor=', response.data['next'])
+
+    def test_update_cannot_move_a_comment(self):
+        other = self.make_post()
+        self.client.force_authenticate(self.student)
+        response = self.client.patch(
+            f'/api/community/comments/{self.reply.pk}/',
+            {'content': 'Edited', 'parent': self.second.pk, 'post': other.pk}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        path = self.reply.path
+        self.reply.refresh_from_db()
+        self.assertEqual((self.reply.content, self.reply.post, self.reply.parent), ('Edited', self.post, self.first))
+        self.assertEqual(self.reply.path, path)
+
+    def test_migration_backfill(self):
+        Comment.objects.update(path='', depth=0)
+        migration('0008_comment_tree_path').backfill_comment_paths(apps, None)
+        self.reply.refresh_from_db()
+        self.assertEqual(self.reply.path, f'{self.first.pk:010d}/{self.reply.pk:010d}')
+        self.assertEqual(self.reply.depth, 1)
+
+
+class ResponseCacheTests(CommunityTestCase):
+    def stats(self):
+        staff = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        self.client.force_authenticate(staff)
+        response = self.client.get('/api/community/cache-stats/')
+        self.client.force_authenticate(None)
+        return response.data['views']['post']
+
+    def test_anonymous_reads_are_served_from_the_cache(self):
+        post = self.make_post()
+        url = f'/api/community/posts/{post.pk}/'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data['title'], 'A post')
+        stats = self.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_writes_through_the_api_invalidate(self):
+        post = self.make_post()
+        url = f'/api/community/posts/{post.pk}/'
+        self.assertEqual(self.client.get(url).data['comment_count'], 0)
+
+        self.client.force_authenticate(self.student)
+        self.client.post('/api/community/comments/', {'post': post.pk, 'content': 'Hi'}, format='json')
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(url).data['comment_count'], 1)
+
+    def test_cache_stats_are_staff_only(self):
+        self.client.force_authenticate(self.faculty)
+        self.assertEqual(self.client.get('/api/community/cache-stats/').status_code, 403)
+
+
+def jpeg_upload(name='photo.jpg', size=(800, 600), gps=False):
+    exif = Image.Exif()
+    if gps:
+        exif[ExifTags.Base.GPSInfo] = {ExifTags.GPS.GPSLatitudeRef: 'N', ExifTags.GPS.GPSLatitude: (52.0, 12.0, 30.0)}
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImageVariantTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temporary_media()
+        self.client.force_authenticate(self.faculty)
+
+    def create_post(self, *images):
+        return self.client.post('/api/community/posts/', {
+            'category': self.category.pk, 'title': 'Photos', 'content': 'Pictures', 'uploaded_images': list(images),
+        }, format='multipart')
+
+    def test_upload_strips_location_and_renders_variants(self):
+        response = self.create_post(jpeg_upload(gps=True))
+        self.assertEqual(response.status_code, 201, response.data)
+
+        image = PostImage.objects.get(post_id=response.data['id'])
+        with image.image.open('rb'), Image.open(image.image) as original:
+            self.assertEqual(dict(original.getexif()), {})
+        self.assertEqual(sorted(image.image_variants['widths']), ['320', '640'])
+        srcset = response.data['images'][0]['srcset']
+        self.assertEqual(sorted(srcset['srcset']), ['jpeg', 'webp'])
+
+    def test_decompression_bombs_are_rejected(self):
+        # Over the limit but under the 2x where Pillow itself refuses to open
+        # it, so Pillow only warns
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000), self.assertWarns(Image.DecompressionBombWarning):
+            response = self.create_post(jpeg_upload(size=(40, 40)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('exceed 1000 pixels', str(response.data))
+        self.assertFalse(Post.objects.exists())
+
+    def test_variants_are_skipped_for_decompression_bombs(self):
+        post = self.make_post()
+        image = PostImage.objects.create(post=post, image=jpeg_upload(size=(40, 40)))
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000), self.assertWarns(Image.DecompressionBombWarning):
+            self.assertEqual(generate_variants(image.image), {})
+
+
+class PostImageAttachmentTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temporary_media()
+        self.client.force_authenticate(self.faculty)
+
+    def create_post(self, count):
+        return self.client.post('/api/community/posts/', {
+            'category': self.category.pk, 'title': 'Album', 'content': 'Pictures',
+            'uploaded_images': [jpeg_upload(f'{i}.jpg', size=(64, 48)) for i in range(count)],
+        }, format='multipart')
+
+    def media_files(self):
+        root = Path(PostImage._meta.get_field('image').storage.location)
+        return [path for path in root.rglob('*') if path.is_file()]
+
+    def test_images_are_inserted_in_one_query_in_upload_order(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.create_post(3)
+        self.assertEqual(response.status_code, 201)
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO "community_postimage"')]
+        self.assertEqual(len(inserts), 1)
+        names = [image.image.name for image in PostImage.objects.filter(post_id=response.data['id']).order_by('pk')]
+        self.assertEqual([Path(name).stem[0] for name in names], ['0', '1', '2'])
+
+    def test_a_failed_write_removes_every_stored_file(self):
+        calls = []
+
+        def flaky(field_file):
+            calls.append(field_file.name)
+            if len(calls) == 2:
+                raise OSError('disk full')
+            return {}
+
+        with mock.patch('community.attachments.generate_variants', side_effect=flaky):
+            with self.assertRaises(OSError):
+                self.create_post(3)
+        self.assertEqual(len(calls), 3)
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(self.media_files(), [])
+
+class VideoUploadTests(CommunityTestCase):
+    video = bytes(range(256)) * 40
+
+    def setUp(self):
+        super().setUp()
+        self.use_temporary_media()
+        self.post = self.make_post()
+        self.client.force_authenticate(self.faculty)
+        response = self.client.post('/api/community/video-uploads/', {'filename': 'lecture.mp4', 'size': len(self.video)})
+        self.url = f"/api/community/video-uploads/{response.data['id']}/"
+
+    def put_chunk(self, offset, data):
+        return self.client.put(f'{self.url}chunk/?offset={offset}', data, content_type='application/octet-stream')
+
+    def upload(self):
+        self.put_chunk(0, self.video[:4000])
+        self.put_chunk(4000, self.video[4000:])
+        return self.client.post(f'{self.url}finalize/', {'post': self.post.pk})
+
+    def test_chunks_must_arrive_at_the_current_offset(self):
+        self.assertEqual(self.put_chunk(0, self.video[:4000]).data['offset'], 4000)
+        response = self.put_chunk(1000, self.video[1000:2000])
+        self.assertEqual((response.status_code, response.data['offset']), (409, 4000))
+        self.assertEqual(self.client.get(self.url).data['offset'], 4000)
+        self.assertEqual(self.client.post(f'{self.url}finalize/', {'post': self.post.pk}).status_code, 409)
+        self.assertEqual(self.put_chunk(4000, self.video[4000:] + b'extra').status_code, 413)
+
+    def test_finalize_attaches_the_assembled_file(self):
+        self.assertEqual(self.upload().data['status'], 'COMPLETE')
+        self.post.refresh_from_db()
+        with self.post.video.open('rb') as video:
+            self.assertEqual(video.read(), self.video)
+
+    def test_only_the_author_can_attach(self):
+        other = self.make_post(author=User.objects.create_user('other', 'other@example.com', 'pw', role='FACULTY'))
+        self.put_chunk(0, self.video)
+        self.assertEqual(self.client.post(f'{self.url}finalize/', {'post': other.pk}).status_code, 403)
+
+    def test_post_must_be_an_id(self):
+        self.put_chunk(0, self.video)
+        for post in ('abc', ''):
+            self.assertEqual(self.client.post(f'{self.url}finalize/', {'post': post}).status_code, 400)
+        self.assertEqual(self.client.post(f'{self.url}finalize/', {'post': self.post.pk + 100}).status_code, 404)
+
+    def test_range_requests(self):
+        self.upload()
+        url = f'/api/community/posts/{self.post.pk}/video/'
+        response = self.client.get(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.video)}')
+        self.assertEqual(b''.join(response.streaming_content), self.video[100:200])
+
+        suffix = self.client.get(url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(suffix.streaming_content), self.video[-10:])
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f'bytes={len(self.video)}-').status_code, 416)
+        self.assertEqual(b''.join(self.client.get(url).streaming_content), self.video)
+
+
+class CategoryDirectoryTests(CommunityTestCase):
+    def counts(self):
+        return dict(Category.objects.values_list('slug', 'post_count'))
+
+    def test_post_counts_follow_creates_moves_and_deletes(self):
+        other = Category.objects.create(name='Events', slug='events', created_by=self.faculty)
+        post = self.make_post()
+        self.make_post()
+        self.assertEqual(self.counts(), {'general': 2, 'events': 0})
+
+        self.client.force_authenticate(self.faculty)
+        self.client.patch(f'/api/community/posts/{post.pk}/', {'category': other.pk}, format='json')
+        self.assertEqual(self.counts(), {'general': 1, 'events': 1})
+        self.client.delete(f'/api/community/posts/{post.pk}/')
+        self.assertEqual(self.counts(), {'general': 1, 'events': 0})
+
+    def test_listing_is_ordered_by_count_and_served_from_the_cache(self):
+        other = Category.objects.create(name='Events', slug='events', created_by=self.student)
+        self.make_post(category=other)
+        cache.clear()
+        self.client.force_authenticate(self.student)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/community/categories/')
+        self.assertEqual([item['slug'] for item in response.data], ['events', 'general'])
+        self.assertEqual(response.data[0]['created_by']['username'], 'student')
+        self.assertLessEqual(len([q for q in queries if 'community_category' in q['sql']]), 1)
+        with self.assertNumQueries(0):
+            self.client.get('/api/community/categories/')
+
+    def test_category_edits_refresh_the_listing(self):
+        self.client.get('/api/community/categories/')
+        self.client.force_authenticate(self.faculty)
+        response = self.client.patch(f'/api/community/categories/{self.category.pk}/', {'name': 'Announcements'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/community/categories/').data[0]['name'], 'Announcements')
+
+    def test_profile_edits_refresh_the_listing(self):
+        self.client.get('/api/community/categories/')
+        self.client.force_authenticate(self.faculty)
+        self.client.patch('/api/users/profile/', {'bio': 'Dean of students'}, format='json')
+        self.client.force_authenticate(None)
+        for url in ('/api/community/categories/', '/api/community/async/categories/'):
+            self.assertEqual(self.client.get(url).json()[0]['created_by']['bio'], 'Dean of students', url)
+
+    def test_category_filter_uses_the_slug_map(self):
+        other = Category.objects.create(name='Events', slug='events', created_by=self.faculty)
+        post = self.make_post(category=other)
+        self.make_post()
+        response = self.client.get('/api/community/posts/', {'category': 'events'})
+        self.assertEqual([item['id'] for item in response.data['results']], [post.pk])
+        self.assertEqual(self.client.get('/api/community/posts/', {'category': 'missing'}).data['results'], [])
+
+    def test_migration_backfill(self):
+        self.make_post()
+        Category.objects.update(post_count=0)
+        migration('0011_category_post_count').backfill_post_counts(apps, None)
+        self.assertEqual(self.counts(), {'general': 1})
+
+
+class ConditionalGetTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.make_post()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def rename_category(self):
+        self.client.force_authenticate(self.faculty)
+        self.client.patch(f'/api/community/categories/{self.category.pk}/', {'name': 'Renamed'}, format='json')
+        self.client.force_authenticate(None)
+
+    def test_unchanged_resources_return_304_without_queries(self):
+        url = f'/api/community/posts/{self.post.pk}/'
+        first = self.client.get(url)
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        self.client.force_authenticate(self.student)
+        self.client.post(f'/api/community/posts/{self.post.pk}/vote/', {'value': 1}, format='json')
+        self.client.force_authenticate(None)
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_votes_and_comments_leave_other_posts_and_categories_cached(self):
+        other = self.make_post()
+        urls = [f'/api/community/posts/{other.pk}/', '/api/community/categories/']
+        first = {url: self.client.get(url) for url in urls}
+        self.client.force_authenticate(self.student)
+        self.client.post(f'/api/community/posts/{self.post.pk}/vote/', {'value': 1}, format='json')
+        self.client.post('/api/community/comments/', {'post': self.post.pk, 'content': 'Hi'}, format='json')
+        self.client.force_authenticate(None)
+        for url in urls:
+            self.assertEqual(self.revalidate(url, first[url]).status_code, 304, url)
+
+        # A new post changes the category's count, which both responses embed
+        self.client.force_authenticate(self.faculty)
+        self.client.post('/api/community/posts/', {'category': self.category.pk, 'title': 'New', 'content': 'Post'}, format='json')
+        self.client.force_authenticate(None)
+        for url in urls:
+            self.assertEqual(self.revalidate(url, first[url]).status_code, 200, url)
+
+    def test_category_rename_invalidates_embedding_responses(self):
+        urls = [
+            f'/api/community/posts/{self.post.pk}/', '/api/community/posts/?category=general',
+            f'/api/community/async/posts/{self.post.pk}/', '/api/community/async/posts/?category=general',
+        ]
+        first = {url: self.client.get(url) for url in urls}
+        self.rename_category()
+        for url in urls:
+            response = self.revalidate(url, first[url])
+            self.assertEqual(response.status_code, 200, url)
+        detail = self.client.get(urls[0])
+        self.assertEqual(detail.data['category_detail']['name'], 'Renamed')
+
+    def test_profile_edit_invalidates_embedded_authors(self):
+        url = f'/api/community/posts/{self.post.pk}/'
+        first = self.client.get(url)
+        self.client.force_authenticate(self.faculty)
+        self.client.patch('/api/users/profile/', {'bio': 'Office hours on Fridays'}, format='json')
+        self.client.force_authenticate(None)
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+        self.assertEqual(self.client.get(url).data['author']['bio'], 'Office hours on Fridays')
+
+    def test_decay_invalidates_ranked_feeds(self):
+        url = '/api/community/posts/?sort=hot'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        call_command('decay_rankings', stdout=StringIO())
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+
+class AsyncReadTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.make_post()
+        self.make_comment(self.post)
+        Vote.objects.create(user=self.student, post=self.post, value=1)
+
+    def assertSamePayload(self, path, **headers):
+        sync = self.client.get(f'/api/community/{path}', **headers).json()
+        cache.clear()
+        asynchronous = self.client.get(f'/api/community/async/{path}', **headers).json()
+        self.assertEqual(asynchronous, sync)
+        return asynchronous
+
+    def bearer(self, user):
+        return {'HTTP_AUTHORIZATION': f"Bearer {AccessToken.for_user(user)}"}
+
+    def test_payloads_match_the_viewsets(self):
+        self.assertSamePayload('posts/')
+        self.assertSamePayload('posts/?sort=hot')
+        self.assertSamePayload(f'posts/{self.post.pk}/')
+        self.assertSamePayload(f'comments/?post={self.post.pk}')
+        self.assertSamePayload('categories/')
+
+    def test_viewer_state_for_bearer_tokens(self):
+        data = self.assertSamePayload('posts/', **self.bearer(self.student))
+        self.assertEqual(data['results'][0]['user_vote'], 1)
+
+    def test_errors(self):
+        self.assertEqual(self.client.get('/api/community/async/posts/999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/community/async/posts/?page=5').status_code, 404)
+        response = self.client.get('/api/community/async/posts/', HTTP_AUTHORIZATION='Bearer nonsense')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.post('/api/community/async/posts/').status_code, 405)
+
+
+class EventStreamTests(CommunityTestCase):
+    def test_streams_require_asgi(self):
+        response = self.client.get('/api/community/events/')
+        self.assertEqual(response.status_code, 501)
+
+    async def test_stream_delivers_published_events(self):
+        response = await self.async_client.get('/api/community/events/?post=7')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        message = json.dumps({'event': 'comment-created', 'data': {'id': 3, 'post': 7}})
+        get_backend().publish('feed', message)
+        get_backend().publish('post:7', message)
+        event = await asyncio.wait_for(pending, timeout=5)
+        self.assertEqual(event, b'event: comment-created\ndata: {"id": 3, "post": 7}\n\n')
+        await stream.aclose()
+
+    def test_votes_publish_score_changes_after_commit(self):
+        post = self.make_post()
+        self.client.force_authenticate(self.student)
+        with mock.patch.object(get_backend(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/api/community/posts/{post.pk}/vote/', {'value': 1}, format='json')
+                publish.assert_not_called()
+        self.assertEqual({call.args[0] for call in publish.call_args_list}, {'feed', 'category:general', f'post:{post.pk}'})
+        self.assertEqual(json.loads(publish.call_args.args[1])['data']['score'], 1)
+
+    async def test_invalid_post_id(self):
+        response = await self.async_client.get('/api/community/events/?post=abc')
+        self.assertEqual(response.status_code, 400)
+
+
+@mock.patch.object(VoteBuffer, '_ensure_worker')
+class VoteBufferTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.make_post()
+        self.buffer = VoteBuffer()
+
+    def stored(self):
+        self.post.refresh_from_db()
+        votes = dict(Vote.objects.filter(post=self.post).values_list('user__username', 'value'))
+        return votes, (self.post.upvotes, self.post.downvotes)
+
+    def test_clicks_coalesce_into_one_write(self, _):
+        self.assertEqual(self.buffer.record(self.student, self.post, 1), (1, 1))
+        self.assertEqual(self.buffer.record(self.student, self.post, -1), (-1, -1))
+        self.assertEqual(self.buffer.record(self.faculty, self.post, 1), (1, 0))
+        self.assertEqual(Vote.objects.count(), 0)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.stored(), ({'student': -1, 'faculty': 1}, (1, 1)))
+
+    def test_failed_flush_is_retried_with_newer_clicks_winning(self, _):
+        self.buffer.record(self.student, self.post, 1)
+        self.buffer.record(self.faculty, self.post, 1)
+        failure = mock.patch.object(VoteBuffer, '_write', side_effect=OperationalError('database is locked'))
+        with failure, self.assertLogs('community.vote_buffer', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(Vote.objects.count(), 0)
+
+        # Toggled off after the failed flush; the projection still counts
+        # the faculty vote from the failed batch
+        self.assertEqual(self.buffer.record(self.student, self.post, 1), (0, 1))
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.stored(), ({'faculty': 1}, (1, 0)))
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_votes_by_deleted_users_do_not_block_the_batch(self, _):
+        leaver = User.objects.create_user('leaver', 'leaver@example.com', 'pw')
+        self.buffer.record(leaver, self.post, 1)
+        self.buffer.record(self.student, self.post, 1)
+        leaver.delete()
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.stored(), ({'student': 1}, (1, 0)))
+
+    def test_only_one_process_buffers(self, _):
+        lock_path = Path(tempfile.mkdtemp()) / 'vote-buffer.lock'
+        self.addCleanup(shutil.rmtree, lock_path.parent, ignore_errors=True)
+        with lock_path.open('a') as other_process:
+            fcntl.flock(other_process, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            with override_settings(VOTE_BUFFER_ENABLED=True, VOTE_BUFFER_LOCK_FILE=str(lock_path)), \
+                    mock.patch('community.vote_buffer._buffer', None), self.assertLogs('community.vote_buffer'):
+                self.assertEqual(cast_vote(self.student, self.post, 1), (1, 1))
+        self.assertEqual(self.stored(), ({'student': 1}, (1, 0)))
+
+
+class SeedForumTests(CommunityTestCase):
+    def seed(self, **counts):
+        counts = {'users': 3, 'categories': 2, 'posts': 5, 'comments': 10, 'votes': 20, 'saves': 3, **counts}
+        args = [f'--{name}={value}' for name, value in counts.items()]
+        call_command('seed_forum', *args, '--seed=1', stdout=StringIO())
+
+    def seeded_names(self):
+        return sorted(User.objects.filter(username__startswith='seed_user_').values_list('username', flat=True))
+
+    def test_repeated_runs_take_the_next_free_names(self):
+        User.objects.create_user('seed_user_3', 'someone@example.com', 'pw')
+        self.seed()
+        self.seed()
+        self.assertEqual(self.seeded_names(), [f'seed_user_{i}' for i in range(3, 10)])
+        self.assertEqual(Post.objects.count(), 10)
+
+    def test_counts_are_validated(self):
+        for counts in ({'users': 0}, {'categories': 0}, {'votes': -1}, {'users': 0, 'posts': 0}):
+            with self.subTest(**counts), self.assertRaises(CommandError):
+                self.seed(**counts)
+        self.seed(users=0, posts=0, comments=0, votes=0, saves=0)
+        self.assertEqual(self.seeded_names(), [])
+
+
+class BenchmarkTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        call_command(
+            'seed_forum', '--users=5', '--categories=2', '--posts=10', '--comments=20', '--votes=30', '--saves=0',
+            '--seed=1', stdout=StringIO(),
+        )
+
+    def benchmark(self, *args):
+        output = StringIO()
+        call_command('benchmark_api', '--requests=5', '--label=test', *args, stdout=output)
+        return output.getvalue()
+
+    def test_vote_scenario_is_rolled_back(self):
+        scores = dict(Post.objects.values_list('pk', 'score'))
+        votes = Vote.objects.count()
+        output = self.benchmark('--scenario=vote', '--user=faculty', '--concurrency=2')
+        self.assertIn('vote runs on one thread', output)
+        self.assertEqual(Vote.objects.count(), votes)
+        self.assertEqual(dict(Post.objects.values_list('pk', 'score')), scores)
+
+    def test_concurrency_must_be_positive(self):
+        with self.assertRaises(CommandError):
+            self.benchmark('--concurrency=0')
+
+
+class MetricsTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('config.metrics.registry', metrics.Registry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+
+    def scrape(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_requests_are_recorded_per_route(self):
+        post = self.make_post()
+        self.client.get('/api/community/posts/')
+        self.client.force_authenticate(self.student)
+        self.client.post(f'/api/community/posts/{post.pk}/vote/', {'value': 1}, format='json')
+        self.client.get('/api/community/nowhere/')
+
+        text = self.scrape()
+        self.assertIn('api_requests_total{route="post-list",method="GET",status="200"} 1', text)
+        self.assertIn('api_requests_total{route="post-vote",method="POST",status="200"} 1', text)
+        self.assertIn('api_requests_total{route="unmatched",method="GET",status="404"} 1', text)
+        self.assertIn('api_request_duration_seconds_count{route="post-list",method="GET"} 1', text)
+        # The vote reads and writes, so it cannot fall in the zero-query bucket
+        self.assertIn('api_request_db_queries_bucket{route="post-vote",method="POST",le="0"} 0', text)
+        self.assertIn('api_response_size_bytes_count{route="post-list",method="GET"} 1', text)
+
+    def test_scrapes_are_staff_only(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    def test_worker_snapshots_are_summed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        labels = [['route', 'post-list'], ['method', 'GET'], ['status', '200']]
+        Path(directory, 'metrics-1.json').write_text(json.dumps({
+            'counters': [['api_requests_total', labels, 4]], 'histograms': [],
+        }))
+        self.registry.inc('api_requests_total', tuple(map(tuple, labels)), 3)
+
+        with override_settings(METRICS_MULTIPROC_DIR=directory):
+            self.assertIn('api_requests_total{route="post-list",method="GET",status="200"} 7', self.scrape())
+
+
+class QueryAuditTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        post = self.make_post()
+        comment = self.make_comment(post)
+        apply_vote(self.student, post, 1)
+        apply_vote(self.faculty, comment, 1)
+
+    def audit(self, *args):
+        output = StringIO()
+        call_command('audit_queries', *args, stdout=output)
+        statuses = {}
+        for line in output.getvalue().splitlines():
+            status, _, rest = line.partition(' ')
+            if status in ('OK', 'CHECK'):
+                statuses[rest.strip().split('  ')[0]] = status
+        return statuses
+
+    def test_hot_query_shapes_use_the_composite_indexes(self):
+        statuses = self.audit()
+        # The category directory sorts its handful of rows in memory
+        self.assertEqual(statuses.pop('category-list'), 'CHECK')
+        self.assertEqual(set(statuses.values()), {'OK'}, statuses)
+        self.assertIn('post-list ?category=general', statuses)
+
+    def test_fail_on_issues(self):
+        with self.assertRaisesMessage(CommandError, '1 queries scan or sort a table'):
+            self.audit('--fail-on-issues')
+
+    def test_sqlite_plan_parsing(self):
+        plan = '3 0 0 SCAN community_post\n8 0 0 SEARCH users_user USING INTEGER PRIMARY KEY (rowid=?)\n20 0 0 USE TEMP B-TREE FOR ORDER BY'
+        findings = sqlite_findings(plan)
+        self.assertEqual(findings['seq_scans'], ['community_post'])
+        self.assertEqual(findings['temp_sorts'], ['USE TEMP B-TREE FOR ORDER BY'])
+
+
+class SavedPostTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.student)
+
+    def toggle_save(self, post):
+        return self.client.post(f'/api/community/posts/{post.pk}/save_post/')
+
+    def saved_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/community/posts/saved/')
+        return response, len(queries)
+
+    def test_saved_ids_follow_saves(self):
+        first, second = self.make_post(), self.make_post()
+        self.toggle_save(second)
+        self.toggle_save(first)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/community/posts/saved-ids/')
+        self.assertEqual(response.data, {'ids': [first.pk, second.pk]})
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/community/posts/saved-ids/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.toggle_save(first).data['is_saved'], False)
+        response = self.client.get('/api/community/posts/saved-ids/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data, {'ids': [second.pk]})
+
+    def test_saved_list_hydrates_a_page_in_fixed_queries(self):
+        self.toggle_save(self.make_post())
+        _, few = self.saved_page()
+        for _ in range(5):
+            post = self.make_post(author=self.student)
+            PostImage.objects.create(post=post, image='posts/photo.jpg')
+            self.make_comment(post)
+            Vote.objects.create(user=self.student, post=post, value=1)
+            self.toggle_save(post)
+        response, many = self.saved_page()
+        self.assertEqual(few, many)
+
+        items = response.data['results']
+        self.assertEqual(len(items), 6)
+        self.assertEqual(items[0]['post']['id'], post.pk)
+        self.assertEqual(
+            (items[0]['post']['is_saved'], items[0]['post']['user_vote'], items[0]['post']['comment_count']), (True, 1, 1),
+        )
+        self.assertEqual(len(items[0]['post']['images']), 1)
+
+
+class SparseFieldsetTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.make_post(content='word ' * 100)
+        self.make_comment(self.post)
+        self.client.force_authenticate(self.student)
+
+    def get(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_list_items_are_compact_by_default(self):
+        data, _ = self.get('/api/community/posts/')
+        item = data['results'][0]
+        self.assertNotIn('content', item)
+        self.assertEqual(len(item['excerpt']), 280)
+        self.assertEqual(set(item['author']), {'id', 'username', 'role', 'profile_picture'})
+        self.assertEqual(set(item['category_detail']), {'id', 'name', 'slug'})
+
+        data, _ = self.get('/api/community/posts/?expand=content')
+        self.assertEqual(data['results'][0]['content'], self.post.content)
+        data, _ = self.get(f'/api/community/posts/{self.post.pk}/')
+        self.assertEqual(data['content'], self.post.content)
+        self.assertIn('email', data['author'])
+
+    def test_fields_limits_the_output_and_skips_its_queries(self):
+        _, full = self.get('/api/community/posts/')
+        data, sparse = self.get('/api/community/posts/?fields=id,title,nonsense')
+        self.assertEqual(data['results'], [{'id': self.post.pk, 'title': 'A post'}])
+        self.assertLess(sparse, full)
+
+        data, _ = self.get(f'/api/community/comments/?post={self.post.pk}&fields=id,content')
+        self.assertEqual([set(item) for item in data], [{'id', 'content'}])
+
+
+class JSONCodecTests(CommunityTestCase):
+    data = {
+        'when': timezone.now(), 'amount': Decimal('1.50'), 'id': uuid.UUID(int=1), 'big': 2 ** 70,
+        'text': 'naïve \u2028 line',
+    }
+
+    def test_fast_renderer_matches_drf(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        with mock.patch('config.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def parse(self, body):
+        return FastJSONParser().parse(BytesIO(body))
+
+    def test_parser(self):
+        self.assertEqual(self.parse('{"a": [1, "é"]}'.encode()), {'a': [1, 'é']})
+        with self.assertRaises(ParseError):
+            self.parse(b'{"a": ')
+
+    def test_api_round_trip(self):
+        self.client.force_authenticate(self.faculty)
+        response = self.client.post(
+            '/api/community/posts/', {'category': self.category.pk, 'title': 'Ünïcode', 'content': 'x'}, format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content)['title'], 'Ünïcode')
+
+
+class CompressionTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        for _ in range(10):
+            self.make_post(content='lecture notes ' * 50)
+
+    def test_large_responses_are_gzipped_when_accepted(self):
+        plain = self.client.get('/api/community/posts/?expand=content')
+        self.assertNotIn('Content-Encoding', plain)
+        response = self.client.get('/api/community/posts/?expand=content', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), json.loads(plain.content))
+        self.assertLess(len(response.content), len(plain.content))
+
+    def test_small_responses_are_sent_as_is(self):
+        response = self.client.get('/api/community/categories/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_negotiation(self):
+        with mock.patch('config.compression.brotli', None):
+            self.assertEqual(choose_encoding('br, gzip;q=0.5'), 'gzip')
+            self.assertEqual(choose_encoding('*'), 'gzip')
+            self.assertIsNone(choose_encoding('gzip;q=0, identity'))
+            self.assertIsNone(choose_encoding(''))
+        with mock.patch('config.compression.brotli', mock.Mock()):
+            self.assertEqual(choose_encoding('gzip, br'), 'br')
+            self.assertEqual(choose_encoding('gzip, br;q=0.1'), 'gzip')
+
+    def test_micro_benchmark_runs(self):
+        output = StringIO()
+        call_command('benchmark_json', '--posts=2', '--rounds=2', stdout=output)
+        self.assertIn('stdlib', output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('benchmark_json', '--rounds=0', stdout=output)
+
+
+class ExportTests(CommunityTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        other = Category.objects.create(name='Other', slug='other', created_by=self.faculty)
+        self.old, self.new = self.make_post(title='Old'), self.make_post(title='New')
+        Post.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=10))
+        self.make_post(category=other, title='Elsewhere')
+        top = self.make_comment(self.new, content='Top')
+        self.make_comment(self.new, content='Reply', parent=top)
+        apply_vote(self.student, self.new, 1)
+
+    def export(self, query=''):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(f'/api/community/export/{query}')
+        if response.status_code != 200:
+            return response, None
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return response, [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_exports_posts_with_comments_and_totals(self):
+        _, rows = self.export('?category=general')
+        self.assertEqual([row['title'] for row in rows], ['Old', 'New'])
+        new = rows[1]
+        self.assertEqual((new['upvotes'], new['score'], new['comment_count']), (1, 1, 2))
+        self.assertEqual([(c['content'], c['depth']) for c in new['comments']], [('Top', 0), ('Reply', 1)])
+
+    def test_date_filters(self):
+        today = timezone.now().date().isoformat()
+        _, rows = self.export(f'?since={today}&until={today}')
+        self.assertEqual({row['title'] for row in rows}, {'New', 'Elsewhere'})
+        for query in ('?category=missing', '?since=yesterday'):
+            self.assertEqual(self.export(query)[0].status_code, 400)
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get('/api/community/export/').status_code, 401)
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get('/api/community/export/').status_code, 403)
+
+    def test_comments_are_prefetched_per_chunk(self):
+        for _ in range(3):
+            self.make_comment(self.make_post())
+        queryset = export_queryset('general')
+        # One query for the posts, one comment prefetch for each chunk of two
+        with self.assertNumQueries(1 + 3):
+            lines = list(export_lines(queryset, chunk_size=2))
+        self.assertEqual(len(lines), 5)
+
+    def test_command_writes_a_file(self):
+        path = Path(tempfile.mkdtemp()) / 'export.ndjson'
+        self.addCleanup(shutil.rmtree, path.parent, ignore_errors=True)
+        stderr = StringIO()
+        call_command('export_forum', '--category=general', f'--output={path}', stderr=stderr)
+        self.assertEqual([json.loads(line)['title'] for line in path.read_text().splitlines()], ['Old', 'New'])
+        self.assertIn('Exported 2 posts', stderr.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('export_forum', '--since=soon', stderr=stderr)
+
+
+class ImportForumTests(CommunityTestCase):
+    records = [
+        {'type': 'user', 'id': 1, 'username': 'faculty'},
+        {'type': 'user', 'id': 2, 'username': 'grace', 'role': 'FACULTY', 'password': 'plain text'},
+        {'type': 'category', 'id': 'c1', 'name': 'Legacy Board', 'created_by': 2},
+        {'type': 'post', 'id': 10, 'author': 2, 'category': 'c1', 'title': 'Old thread', 'created_at': '2019-05-01T10:00:00Z'},
+        # A reply listed before its parent, in the same chunk
+        {'type': 'comment', 'id': 101, 'post': 10, 'author': 1, 'parent': 100, 'content': 'Reply'},
+        {'type': 'comment', 'id': 100, 'post': 10, 'author': 2, 'content': 'Top'},
+        {'type': 'vote', 'user': 1, 'post': 10, 'value': 1},
+        {'type': 'vote', 'user': 1, 'post': 10, 'value': -1},
+        {'type': 'vote', 'user': 2, 'comment': 101, 'value': 1},
+    ]
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = Path(directory) / 'forum.jsonl'
+
+    def write(self, records):
+        self.path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+
+    def run_import(self, *args):
+        output = StringIO()
+        call_command('import_forum', str(self.path), *args, stdout=output)
+        return output.getvalue()
+
+    def test_import(self):
+        self.write(self.records)
+        output = self.run_import('--batch-size=4')
+        self.assertRegex(output, r'vote\s+2 created\s+1 existing')
+        self.assertRegex(output, r'7 rows in [0-9.]+s \(\d+ rows/s\)')
+
+        # An existing username maps to the existing account
+        self.assertEqual(User.objects.filter(username='faculty').count(), 1)
+        grace = User.objects.get(username='grace')
+        self.assertFalse(grace.has_usable_password())
+        post = Post.objects.get(title='Old thread')
+        self.assertEqual((post.author, post.category.slug, post.created_at.year), (grace, 'legacy-board', 2019))
+        # The first of the repeated votes wins; counters are rebuilt afterwards
+        self.assertEqual((post.score, post.comment_count), (1, 2))
+        top, reply = Comment.objects.filter(post=post).order_by('path')
+        self.assertEqual((top.content, reply.content, reply.parent, reply.depth), ('Top', 'Reply', top, 1))
+        self.assertEqual(reply.score, 1)
+
+    def test_resume_after_a_failed_chunk(self):
+        broken = self.records[:6] + [{'type': 'vote', 'user': 99, 'post': 10, 'value': 1}] + self.records[7:]
+        self.write(broken)
+        with self.assertRaisesMessage(CommandError, "line 7: user refers to unknown user 99"):
+            self.run_import('--batch-size=3')
+        # The chunks before the bad line are committed and checkpointed
+        self.assertEqual(Comment.objects.filter(post__title='Old thread').count(), 2)
+        self.assertEqual(Vote.objects.count(), 0)
+
+        self.write(self.records)
+        with self.assertRaisesMessage(CommandError, 'pass --resume'):
+            self.run_import('--batch-size=3')
+        self.assertIn('Resuming after line 6', self.run_import('--batch-size=3', '--resume'))
+        self.assertEqual(Post.objects.filter(title='Old thread').count(), 1)
+        self.assertEqual(Vote.objects.count(), 2)
+
+    def test_uncommitted_checkpoint_entries_are_dropped(self):
+        self.write(self.records[:4])
+        self.run_import()
+        checkpoint = Path(f'{self.path}.checkpoint')
+        with checkpoint.open('a') as f:
+            f.write(json.dumps({'line': 9, 'ids': {'post': [[11, 10 ** 6]]}}) + '\n')
+        self.write(self.records)
+        output = self.run_import('--resume')
+        self.assertIn('Dropped the last checkpoint entry', output)
+        self.assertIn('Resuming after line 4', output)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_skip_orphans(self):
+        self.write(self.records + [{'type': 'comment', 'id': 102, 'post': 404, 'author': 1}])
+        with self.assertRaises(CommandError):
+            self.run_import()
+        # Nothing was committed, so there is no checkpoint to resume from
+        output = self.run_import('--skip-orphans')
+        self.assertRegex(output, r'comment\s+2 created\s+0 existing\s+1 skipped')
@@ -0,0 +1,101 @@
+"""
+Threaded comment loading.
+
+Comments carry a materialized path (see models.comment_tree_position), so a
+whole thread, a bounded slice of it, or the subtree under one comment is a
+single range query on the (post, path) index, returned in display order.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Comment, comment_tree_position
+
+
+def rebuild_comment_paths(comment_model, batch_size=1000):
+    """
+    Recomputes path/depth for every comment from the parent links. Takes the
+    model as an argument so migrations can pass their historical version.
+    """
+    parents = dict(comment_model.objects.values_list('id', 'parent_id'))
+    positions = {}
+
+    def position(pk):
+        # Walk up to the nearest ancestor with a known position, then back down.
+        chain = []
+        while pk is not None and pk not in positions:
+            chain.append(pk)
+            pk = parents.get(pk)
+        for node in reversed(chain):
+            parent = positions.get(parents[node])
+            positions[node] = comment_tree_position(
+                parent[0] if parent else None, parent[1] if parent else 0, node
+            )
+        return positions[chain[0]] if chain else positions[pk]
+
+    batch = []
+    with transaction.atomic():
+        for pk in sorted(parents):
+            path, depth = position(pk)
+            batch.append(comment_model(pk=pk, path=path, depth=depth))
+            if len(batch) >= batch_size:
+                comment_model.objects.bulk_update(batch, ['path', 'depth'])
+                batch = []
+        if batch:
+            comment_model.objects.bulk_update(batch, ['path', 'depth'])
+    return len(parents)
+
+
+def load_comment_slice(post, root=None, max_depth=None, after_path=None, limit=200):
+    """
+    Returns (comments, has_more) for up to limit comments of post in thread
+    order. root restricts the slice to the replies under that comment,
+    max_depth is relative to the slice's top level, and after_path resumes
+    a previous slice after its last comment.
+    """
+    queryset = Comment.objects.filter(post=post).select_related('author').order_by('path')
+    base_depth = 0
+    if root is not None:
+        queryset = queryset.filter(path__startswith=f"{root.path}/")
+        base_depth = root.depth + 1
+    if max_depth is not None:
+        queryset = queryset.filter(depth__lte=base_depth + max_depth)
+    if after_path:
+        queryset = queryset.filter(path__gt=after_path)
+
+    comments = list(queryset[:limit + 1])
+    return comments[:limit], len(comments) > limit
+
+
+def count_hidden_replies(comments, max_depth_reached):
+    """
+    Returns {comment_id: reply_count} for the comments sitting at the depth
+    cut-off, whose replies were not loaded. One aggregate query.
+    """
+    boundary = [comment.pk for comment in comments if comment.depth == max_depth_reached]
+    if not boundary:
+        return {}
+    return dict(
+        Comment.objects.filter(parent_id__in=boundary)
+        .values('parent_id')
+        .annotate(total=Count('pk'))
+        .values_list('parent_id', 'total')
+    )
+
+
+def assemble_tree(nodes):
+    """
+    Links serialized comments (dicts with 'id' and 'parent', in path order)
+    into nested 'replies' lists. Comments whose parent is not in the slice
+    become top-level entries of the returned list.
+    """
+    by_id = {}
+    roots = []
+    for node in nodes:
+        node['replies'] = []
+        by_id[node['id']] = node
+        parent = by_id.get(node['parent'])
+        if parent is not None:
+            parent['replies'].append(node)
+        else:
+            roots.append(node)
+    return roots
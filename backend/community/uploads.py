@@ -0,0 +1,96 @@
+"""
+Chunked, resumable video uploads.
+
+A client creates a VideoUpload with the file's name and total size, then
+appends chunks with the byte offset it is writing at; the server only
+accepts a chunk at the current offset, so after a dropped connection the
+client reads the upload back and resumes from its offset. Finalizing moves
+the assembled temp file into storage as the Post's video.
+"""
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from .models import VideoUpload
+
+BLOCK_SIZE = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, expected):
+        super().__init__(f"Expected a chunk at offset {expected}")
+        self.expected = expected
+
+
+class ChunkTooLarge(Exception):
+    pass
+
+
+class AssembledFile(File):
+    """
+    Lets storage backends move the temp file into place instead of copying
+    it (FileSystemStorage checks for temporary_file_path()).
+    """
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def append_chunk(upload_id, offset, stream, length):
+    """
+    Appends length bytes read from stream at offset. Returns the updated
+    upload. The row is locked for the duration so concurrent chunks for the
+    same upload are serialized.
+    """
+    max_chunk = getattr(settings, 'MAX_VIDEO_CHUNK_SIZE', 16 * 1024 ** 2)
+    if length > max_chunk:
+        raise ChunkTooLarge(f"Chunks may be at most {max_chunk} bytes")
+
+    with transaction.atomic():
+        upload = VideoUpload.objects.select_for_update().get(pk=upload_id)
+        if upload.status != VideoUpload.Status.PENDING or offset != upload.offset:
+            raise OffsetMismatch(upload.offset)
+        if offset + length > upload.size:
+            raise ChunkTooLarge("Chunk runs past the declared upload size")
+
+        os.makedirs(os.path.dirname(upload.temp_path), exist_ok=True)
+        mode = 'r+b' if os.path.exists(upload.temp_path) else 'wb'
+        written = 0
+        with open(upload.temp_path, mode) as target:
+            # Discard anything a previously interrupted chunk left past the offset.
+            target.seek(offset)
+            target.truncate()
+            while written < length:
+                block = stream.read(min(BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                target.write(block)
+                written += len(block)
+
+        upload.offset = offset + written
+        upload.save(update_fields=['offset', 'updated_at'])
+    return upload
+
+
+def finalize_upload(upload, post):
+    """
+    Attaches the completed upload to post as its video and removes the
+    temp file.
+    """
+    with open(upload.temp_path, 'rb') as assembled:
+        post.video.save(os.path.basename(upload.filename), AssembledFile(assembled), save=False)
+    post.save(update_fields=['video', 'updated_at'])
+    if os.path.exists(upload.temp_path):
+        os.remove(upload.temp_path)
+
+    upload.post = post
+    upload.status = VideoUpload.Status.COMPLETE
+    upload.save(update_fields=['post', 'status', 'updated_at'])
+    return upload
+
+
+def discard_upload(upload):
+    if os.path.exists(upload.temp_path):
+        os.remove(upload.temp_path)
+    upload.delete()
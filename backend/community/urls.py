@@ -1,13 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, PostViewSet, CommentViewSet, PostImageViewSet
+from . import async_views
+from .views import CategoryViewSet, PostViewSet, CommentViewSet, PostImageViewSet, VideoUploadViewSet, CacheStatsView, ExportView
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet)
 router.register(r'posts', PostViewSet)
 router.register(r'comments', CommentViewSet)
 router.register(r'post-images', PostImageViewSet)
+router.register(r'video-uploads', VideoUploadViewSet, basename='videoupload')
 
 urlpatterns = [
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('export/', ExportView.as_view(), name='export'),
+    path('async/posts/', async_views.post_list, name='async-post-list'),
+    path('async/posts/<int:pk>/', async_views.post_detail, name='async-post-detail'),
+    path('async/comments/', async_views.comment_list, name='async-comment-list'),
+    path('async/categories/', async_views.category_list, name='async-category-list'),
+    path('events/', async_views.event_stream, name='event-stream'),
     path('', include(router.urls)),
 ]
@@ -0,0 +1,66 @@
+from .models import Vote, SavedPost
+
+# Serializer fields filled in from hydrate_viewer_state()
+VIEWER_FIELDS = {'user_vote', 'is_saved'}
+
+
+def hydrate_viewer_state(user, posts=(), comments=(), saved_post_ids=None):
+    """
+    Loads the requesting user's votes and saves for a page of posts and/or
+    comments with one query per kind, instead of one per serialized row.
+    Callers that already know which of the posts are saved pass
+    saved_post_ids to skip that query.
+
+    The returned dict is merged into the serializer context; PostSerializer
+    and CommentSerializer read 'post_votes', 'saved_post_ids' and
+    'comment_votes' from it when present.
+    """
+    post_ids = [post.pk for post in posts]
+    comment_ids = [comment.pk for comment in comments]
+    state = {}
+
+    if post_ids:
+        state['post_votes'] = {}
+        state['saved_post_ids'] = set()
+    if comment_ids:
+        state['comment_votes'] = {}
+
+    if user is None or not user.is_authenticated:
+        return state
+
+    if post_ids:
+        state['post_votes'] = dict(
+            Vote.objects.filter(user=user, post_id__in=post_ids).values_list('post_id', 'value')
+        )
+        if saved_post_ids is not None:
+            state['saved_post_ids'] = set(saved_post_ids)
+        else:
+            state['saved_post_ids'] = set(
+                SavedPost.objects.filter(user=user, post_id__in=post_ids).values_list('post_id', flat=True)
+            )
+    if comment_ids:
+        state['comment_votes'] = dict(
+            Vote.objects.filter(user=user, comment_id__in=comment_ids).values_list('comment_id', 'value')
+        )
+    return state
+
+
+class ViewerStateMixin:
+    """
+    ViewSet mixin that hydrates viewer state whenever a list of objects is
+    serialized (list pages and paginated custom actions).
+    """
+    viewer_state_kind = 'posts'
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and args:
+            objects = list(args[0])
+            args = (objects,) + args[1:]
+            context = kwargs.get('context') or self.get_serializer_context()
+            kwargs['context'] = context
+            serializer = super().get_serializer(*args, **kwargs)
+            # Skipped when ?fields= leaves out every viewer field
+            if VIEWER_FIELDS & set(serializer.child.fields):
+                context.update(hydrate_viewer_state(self.request.user, **{self.viewer_state_kind: objects}))
+            return serializer
+        return super().get_serializer(*args, **kwargs)
@@ -1,10 +1,27 @@
-from rest_framework import viewsets, permissions, status, filters
-from rest_framework.pagination import PageNumberPagination
+from rest_framework import viewsets, mixins, permissions, status, filters
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.utils.urls import replace_query_param
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Category, Post, Comment, Vote, PostImage, SavedPost
-from .serializers import CategorySerializer, PostSerializer, CommentSerializer, VoteSerializer, PostImageSerializer, SavedPostSerializer
+from .models import Category, Post, Comment, Vote, PostImage, SavedPost, VideoUpload
+from .serializers import CategorySerializer, PostSerializer, PostListSerializer, CommentSerializer, VoteSerializer, PostImageSerializer, SavedPostSerializer, VideoUploadSerializer, has_sparse_params, output_fields
+from .vote_buffer import cast_vote
+from .viewer_state import ViewerStateMixin, hydrate_viewer_state
+from .pagination import FeedPagination, KeysetPagination, StandardResultsSetPagination, decode_cursor, encode_cursor
+from .search import render_highlight, search_posts
+from .ranking import sort_field
+from .threads import assemble_tree, count_hidden_replies, load_comment_slice
+from .events import publish_comment_created, publish_post_created, publish_score_changed
+from .directory import category_id_for_slug, get_category_listing
+from .cache import CachedResponseMixin, get_stats, invalidate_categories, invalidate_post, invalidate_viewer, invalidate_viewers
+from .streaming import ranged_file_response
+from .export import CONTENT_TYPE as NDJSON_CONTENT_TYPE, aiter_lines, export_lines, export_queryset
+from .uploads import ChunkTooLarge, OffsetMismatch, append_chunk, discard_upload, finalize_upload
 
 class IsAuthorOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -54,43 +71,159 @@ class IsCategoryOwnerOrAdmin(permissions.BasePermission):
         return obj.created_by == request.user
 
 
-from django.db.models import Count
+def _int_param(value, default, maximum, minimum=0):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return min(max(value, minimum), maximum)
 
-class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.annotate(post_count=Count('posts')).order_by('-post_count')
+def feed_ordering(ranking_field=None):
+    if ranking_field is not None:
+        # ranking.post_id rather than post.id, so the ranking index also
+        # covers the tie-break
+        return (f'-ranking__{ranking_field}', '-ranking__post_id')
+    return ('-created_at', '-id')
+
+def post_feed_queryset(params, ranking_field=None):
+    """
+    Posts filtered by ?category= and ?author=, newest first or ordered by a
+    PostRanking column. Shared by PostViewSet and the async read views.
+    """
+    queryset = (
+        Post.objects.all()
+        .select_related('author', 'category__created_by')
+        .prefetch_related('images')
+    )
+    category_slug = params.get('category', None)
+    author_id = params.get('author', None)
+
+    if ranking_field is not None:
+        # Drive the query from the ranking table's (category, <field>)
+        # indexes rather than sorting posts.
+        queryset = queryset.select_related('ranking').filter(**{f'ranking__{ranking_field}__isnull': False})
+        if category_slug is not None:
+            queryset = queryset.filter(ranking__category_id=category_id_for_slug(category_slug))
+    elif category_slug is not None:
+        queryset = queryset.filter(category_id=category_id_for_slug(category_slug))
+    if author_id is not None:
+        queryset = queryset.filter(author__id=author_id)
+
+    return queryset.order_by(*feed_ordering(ranking_field))
+
+# Cache scopes shared by the ViewSets and the async read views. Besides the
+# resource itself, each lists the scopes of what its payload embeds.
+CATEGORY_SCOPES = ['categories', 'users']
+
+def post_detail_scopes(pk):
+    return [f'post:{pk}', 'categories', 'users']
+
+def post_list_scopes(params):
+    category_slug = params.get('category')
+    feed = f'category:{category_slug}' if category_slug is not None else 'posts'
+    return [feed, 'rankings', 'categories', 'users']
+
+def comment_list_scopes(params):
+    post_id = params.get('post')
+    return [f'post:{post_id}' if post_id is not None else 'comments', 'users']
+
+def comment_list_queryset(params):
+    queryset = Comment.objects.all().select_related('author').order_by('-created_at')
+    post_id = params.get('post', None)
+    author_id = params.get('author', None)
+
+    if post_id is not None:
+        queryset = queryset.filter(post__id=post_id)
+    if author_id is not None:
+        queryset = queryset.filter(author__id=author_id)
+
+    return queryset
+
+class CategoryViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = Category.objects.select_related('created_by').order_by('-post_count', 'name')
     serializer_class = CategorySerializer
     permission_classes = [IsFacultyOrAdminOrReadOnly, IsCategoryOwnerOrAdmin]
 
+    def get_cache_scopes(self):
+        return CATEGORY_SCOPES
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.list_directory, request, *args, **kwargs)
+
+    def list_directory(self, request, *args, **kwargs):
+        if has_sparse_params(request):
+            # Trimmed listings only go through the per-URL response cache
+            return super().list(request, *args, **kwargs)
+        # The listing carries no per-viewer fields, so every viewer shares it
+        listing = get_category_listing(lambda queryset: self.get_serializer(queryset, many=True).data)
+        return Response(listing)
+
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
+        invalidate_categories()
+
+    def perform_update(self, serializer):
+        serializer.save()
+        invalidate_categories()
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidate_categories()
 
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all().order_by('-created_at')
+class PostViewSet(CachedResponseMixin, ViewerStateMixin, viewsets.ModelViewSet):
+    queryset = Post.objects.all().order_by('-created_at', '-id')
     serializer_class = PostSerializer
     permission_classes = [IsFacultyOrAdminOrReadOnly, IsAuthorOrReadOnly]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = FeedPagination
     filter_backends = [filters.SearchFilter]
     search_fields = ['title', 'content', 'author__username']
 
-    def get_queryset(self):
-        queryset = Post.objects.all().order_by('-created_at')
-        category_slug = self.request.query_params.get('category', None)
-        author_id = self.request.query_params.get('author', None)
+    def get_ranking_field(self):
+        """
+        Returns the PostRanking column for ?sort=hot|top&window=day|week|all,
+        or None for the default newest-first feed.
+        """
+        if self.action != 'list':
+            return None
+        return sort_field(self.request.query_params.get('sort'), self.request.query_params.get('window'))
 
-        if category_slug is not None:
-            queryset = queryset.filter(category__slug=category_slug)
-        if author_id is not None:
-            queryset = queryset.filter(author__id=author_id)
-            
+    @property
+    def cursor_ordering(self):
+        return feed_ordering(self.get_ranking_field())
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return PostListSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        queryset = post_feed_queryset(self.request.query_params, self.get_ranking_field())
+        if self.action == 'list':
+            queryset = PostListSerializer.optimize_queryset(queryset, output_fields(PostListSerializer, self.request))
         return queryset
 
+    def get_cache_scopes(self):
+        if self.action == 'retrieve':
+            return post_detail_scopes(self.kwargs[self.lookup_field])
+        if self.action == 'saved_ids':
+            # Only the viewer's own saves (and deletes of saved posts) change it
+            return []
+        return post_list_scopes(self.request.query_params)
+
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        invalidate_post(post, categories=True)
+        publish_post_created(post)
+
+    def perform_update(self, serializer):
+        old_category_slug = serializer.instance.category.slug
+        post = serializer.save()
+        invalidate_post(post, old_category_slug, categories=post.category.slug != old_category_slug)
+
+    def perform_destroy(self, instance):
+        invalidate_post(instance, categories=True)
+        invalidate_viewers(instance.saved_by.values_list('user_id', flat=True))
+        instance.delete()
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def vote(self, request, pk=None):
@@ -101,22 +234,118 @@ class PostViewSet(viewsets.ModelViewSet):
         if value not in [1, -1]:
             return Response({'error': 'Invalid vote value'}, status=status.HTTP_400_BAD_REQUEST)
 
-        vote, created = Vote.objects.get_or_create(user=user, post=post, defaults={'value': value})
-        
-        if not created:
-            if vote.value == value:
-                vote.delete() # Toggle off if same vote
-                return Response({'status': 'vote removed'})
-            else:
-                vote.value = value
-                vote.save()
-        
-        return Response({'status': 'voted', 'value': value})
+        new_value, score = cast_vote(user, post, value)
+        invalidate_post(post)
+        publish_score_changed(post, score)
+        if new_value == 0:
+            return Response({'status': 'vote removed', 'vote_count': score})
+        return Response({'status': 'voted', 'value': new_value, 'vote_count': score})
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text search: ?q=<terms>, best match first, with highlighted
+        title/content snippets and an opaque next cursor.
+        """
+        page_size = KeysetPagination().get_page_size(request)
+        after = None
+        if request.query_params.get('cursor'):
+            try:
+                (rank, post_id), _ = decode_cursor(request.query_params['cursor'])
+                after = (float(rank), int(post_id))
+            except (TypeError, ValueError):
+                raise NotFound('Invalid cursor')
+
+        hits = search_posts(request.query_params.get('q', ''), page_size + 1, after)
+        has_more = len(hits) > page_size
+        hits = hits[:page_size]
+
+        posts = (
+            Post.objects.select_related('author', 'category__created_by')
+            .prefetch_related('images')
+            .in_bulk([hit.post_id for hit in hits])
+        )
+        hits = [hit for hit in hits if hit.post_id in posts]
+        serializer = self.get_serializer([posts[hit.post_id] for hit in hits], many=True)
+
+        results = []
+        for hit, data in zip(hits, serializer.data):
+            data['search_rank'] = -hit.rank
+            data['highlight'] = {
+                'title': render_highlight(hit.title),
+                'content': render_highlight(hit.snippet),
+            }
+            results.append(data)
+
+        next_link = None
+        if has_more and hits:
+            cursor = encode_cursor([hits[-1].rank, hits[-1].post_id])
+            next_link = replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
+        return Response({'next': next_link, 'results': results})
+
+    @action(detail=True, methods=['get'], url_path='comment-tree')
+    def comment_tree(self, request, pk=None):
+        """
+        Returns the post's comments nested under 'replies' in thread order,
+        loaded with one query. Accepts max_depth, limit and parent (to load
+        the replies under one comment). Comments cut off by max_depth carry
+        'more_replies' with a continuation link, and a truncated slice
+        returns a 'next' link; comments in a continuation whose parent was in
+        an earlier response are returned at the top level.
+        """
+        post = self.get_object()
+        max_depth = _int_param(request.query_params.get('max_depth'), default=None, maximum=50)
+        # An empty slice would have no last path to continue after
+        limit = _int_param(request.query_params.get('limit'), default=200, maximum=500, minimum=1)
+
+        root_id = request.query_params.get('parent')
+        after_path = None
+        if request.query_params.get('cursor'):
+            try:
+                (root_id, after_path), _ = decode_cursor(request.query_params['cursor'])
+            except (TypeError, ValueError):
+                raise NotFound('Invalid cursor')
+            valid_root = root_id is None or (isinstance(root_id, int) and not isinstance(root_id, bool))
+            if not valid_root or not isinstance(after_path, (str, type(None))):
+                raise NotFound('Invalid cursor')
+        elif root_id and not root_id.isdigit():
+            raise NotFound('Invalid parent')
+        root = get_object_or_404(Comment, pk=root_id, post=post) if root_id else None
+
+        comments, has_more = load_comment_slice(post, root, max_depth, after_path, limit)
+        context = self.get_serializer_context()
+        context.update(hydrate_viewer_state(request.user, comments=comments))
+        nodes = CommentSerializer(comments, many=True, context=context).data
+
+        base_url = request.build_absolute_uri()
+        if max_depth is not None:
+            base_depth = root.depth + 1 if root else 0
+            hidden = count_hidden_replies(comments, base_depth + max_depth)
+            for node in nodes:
+                if node['id'] in hidden:
+                    node['more_replies'] = {
+                        'count': hidden[node['id']],
+                        'next': replace_query_param(base_url, 'cursor', encode_cursor([node['id'], None])),
+                    }
+
+        next_link = None
+        if has_more:
+            cursor = encode_cursor([root.pk if root else None, comments[-1].path])
+            next_link = replace_query_param(base_url, 'cursor', cursor)
+        return Response({'next': next_link, 'results': assemble_tree(nodes)})
+
+    @action(detail=True, methods=['get'])
+    def video(self, request, pk=None):
+        post = self.get_object()
+        if not post.video:
+            raise NotFound('This post has no video.')
+        return ranged_file_response(request, post.video)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def save_post(self, request, pk=None):
         post = self.get_object()
         saved, created = SavedPost.objects.get_or_create(user=request.user, post=post)
+        invalidate_viewer(request.user)
         if not created:
             saved.delete()
             return Response({'status': 'unsaved', 'is_saved': False})
@@ -124,33 +353,67 @@ class PostViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def saved(self, request):
-        saved_posts = SavedPost.objects.filter(user=request.user)
+        """
+        The user's saved posts, most recently saved first. Every post on the
+        page is loaded with its author, category and images up front, and
+        is_saved is known without asking.
+        """
+        saved_posts = (
+            SavedPost.objects.filter(user=request.user)
+            .select_related('post__author', 'post__category__created_by')
+            .prefetch_related('post__images')
+            .order_by('-created_at', '-id')
+        )
         page = self.paginate_queryset(saved_posts)
+        items = page if page is not None else list(saved_posts)
+        posts = [item.post for item in items]
+        context = {'request': request}
+        context.update(hydrate_viewer_state(request.user, posts=posts, saved_post_ids=[post.pk for post in posts]))
+        serializer = SavedPostSerializer(items, many=True, context=context)
         if page is not None:
-            serializer = SavedPostSerializer(page, many=True, context={'request': request})
             return self.get_paginated_response(serializer.data)
-        serializer = SavedPostSerializer(saved_posts, many=True, context={'request': request})
         return Response(serializer.data)
 
-class CommentViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'], url_path='saved-ids', permission_classes=[permissions.IsAuthenticated])
+    def saved_ids(self, request):
+        """
+        IDs of every post the user has saved, so clients can mark bookmarks
+        without fetching the saved list. Answers If-None-Match with 304
+        until the user saves or unsaves something.
+        """
+        return self.cached_response(self.list_saved_ids, request)
+
+    def list_saved_ids(self, request):
+        ids = SavedPost.objects.filter(user=request.user).order_by().values_list('post_id', flat=True)
+        return Response({'ids': sorted(ids)})
+
+class CommentViewSet(CachedResponseMixin, ViewerStateMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    viewer_state_kind = 'comments'
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
 
     def get_queryset(self):
-        queryset = Comment.objects.all().order_by('-created_at')
-        post_id = self.request.query_params.get('post', None)
-        author_id = self.request.query_params.get('author', None)
-        
-        if post_id is not None:
-            queryset = queryset.filter(post__id=post_id)
-        if author_id is not None:
-            queryset = queryset.filter(author__id=author_id)
-            
-        return queryset
+        return comment_list_queryset(self.request.query_params)
+
+    def get_cache_scopes(self):
+        if self.action == 'list':
+            return comment_list_scopes(self.request.query_params)
+        return ['comments', 'users']
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        comment = serializer.save(author=self.request.user)
+        invalidate_post(comment.post)
+        publish_comment_created(comment)
+
+    def perform_update(self, serializer):
+        comment = serializer.save()
+        invalidate_post(comment.post)
+
+    def perform_destroy(self, instance):
+        post = instance.post
+        instance.delete()
+        invalidate_post(post)
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def vote(self, request, pk=None):
@@ -161,20 +424,123 @@ class CommentViewSet(viewsets.ModelViewSet):
         if value not in [1, -1]:
             return Response({'error': 'Invalid vote value'}, status=status.HTTP_400_BAD_REQUEST)
 
-        vote, created = Vote.objects.get_or_create(user=user, comment=comment, defaults={'value': value})
-        
-        if not created:
-            if vote.value == value:
-                vote.delete()
-                return Response({'status': 'vote removed'})
-            else:
-                vote.value = value
-                vote.save()
-        
-        return Response({'status': 'voted', 'value': value})
+        new_value, score = cast_vote(user, comment, value)
+        invalidate_post(comment.post)
+        publish_score_changed(comment, score)
+        if new_value == 0:
+            return Response({'status': 'vote removed', 'vote_count': score})
+        return Response({'status': 'voted', 'value': new_value, 'vote_count': score})
 
 class PostImageViewSet(viewsets.ModelViewSet):
     queryset = PostImage.objects.all()
     serializer_class = PostImageSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsPostAuthor]
     http_method_names = ['get', 'delete', 'head', 'options'] # Only allow reading and deleting individually
+
+    def perform_destroy(self, instance):
+        post = instance.post
+        instance.delete()
+        invalidate_post(post)
+
+class VideoUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Chunked, resumable video uploads: create with filename and size, PUT
+    raw bytes to chunk/?offset=N (or an Upload-Offset header) until offset
+    reaches size, then POST finalize with the post to attach the video to.
+    GET returns the current offset to resume from.
+    """
+    serializer_class = VideoUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return VideoUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        discard_upload(instance)
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        upload = self.get_object()
+        try:
+            offset = int(request.query_params.get('offset', request.headers.get('Upload-Offset')))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (TypeError, ValueError):
+            return Response({'error': 'An offset and a Content-Length are required'}, status=status.HTTP_400_BAD_REQUEST)
+        if length <= 0:
+            return Response({'error': 'Empty chunk'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            upload = append_chunk(upload.pk, offset, request.stream, length)
+        except OffsetMismatch as exc:
+            return Response({'error': str(exc), 'offset': exc.expected}, status=status.HTTP_409_CONFLICT)
+        except ChunkTooLarge as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        return Response(self.get_serializer(upload).data)
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        upload = self.get_object()
+        if upload.status != VideoUpload.Status.PENDING or upload.offset != upload.size:
+            return Response(
+                {'error': 'Upload is not complete', 'offset': upload.offset, 'size': upload.size},
+                status=status.HTTP_409_CONFLICT,
+            )
+        try:
+            post_id = int(request.data.get('post'))
+        except (TypeError, ValueError):
+            return Response({'error': 'post must be a post id'}, status=status.HTTP_400_BAD_REQUEST)
+        post = get_object_or_404(Post, pk=post_id)
+        if post.author_id != request.user.id and not request.user.is_staff:
+            return Response({'error': 'You can only attach videos to your own posts'}, status=status.HTTP_403_FORBIDDEN)
+
+        finalize_upload(upload, post)
+        invalidate_post(post)
+        return Response(self.get_serializer(upload).data)
+
+class CacheStatsView(APIView):
+    """
+    Response cache hit/miss counters, overall and per ViewSet.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_stats(['category', 'post', 'comment']))
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Always uses the first renderer, for views whose successful responses
+    are not rendered by DRF and would otherwise 406 on their own media type.
+    """
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ExportView(APIView):
+    """
+    Streams posts with their comments and vote totals as NDJSON, filtered by
+    ?category=<slug>, ?since= and ?until= (ISO dates or datetimes).
+    """
+    permission_classes = [permissions.IsAdminUser]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            queryset = export_queryset(params.get('category'), params.get('since'), params.get('until'))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        lines = export_lines(queryset)
+        if isinstance(request._request, ASGIRequest):
+            lines = aiter_lines(lines)
+        response = StreamingHttpResponse(lines, content_type=NDJSON_CONTENT_TYPE)
+        response['Content-Disposition'] = f'attachment; filename="{params.get("category") or "forum"}-export.ndjson"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,279 @@
+"""
+Write-coalescing vote ingestion.
+
+With VOTE_BUFFER_ENABLED, vote clicks do not touch the Vote table directly.
+Each click resolves the toggle against the user's latest intent, records
+the resulting vote (1, -1 or 0 for "no vote") in a per-process buffer and
+answers with the projected score. A background thread flushes the buffer
+every VOTE_BUFFER_FLUSH_MS milliseconds: the latest intent per (user,
+target) is written with bulk inserts/updates/deletes and the counter
+deltas, computed against the rows actually stored, are applied with one
+UPDATE per target, all in one transaction. Later clicks overwrite earlier
+ones in the buffer, so the flush is last-write-wins per (user, target).
+
+A flush that fails (e.g. the database is briefly unavailable) puts its
+batch back into the buffer, under any newer clicks for the same (user,
+target), and is retried on the next tick.
+
+The buffer lives in process memory, so it is only correct with a single
+process accepting votes: two buffers would each project scores from their
+own pending clicks and could write conflicting intents for the same user.
+The first process to buffer takes an exclusive lock on
+VOTE_BUFFER_LOCK_FILE; any other process on the host applies its votes
+directly instead (and logs an error), so run the vote-accepting server with
+one worker when enabling the mode. The lock cannot see processes on other
+hosts.
+
+Trade-offs: buffered votes are lost if the process dies before the next
+flush, and a user's own vote shows up in other endpoints (user_vote) only
+once it has been flushed.
+"""
+import atexit
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+from .cache import invalidate_post
+from .models import Comment, Post, Vote
+from .ranking import refresh_post_ranking
+from .votes import _counter_delta, adjust_counters, apply_vote
+
+logger = logging.getLogger(__name__)
+
+MODELS = {'post': Post, 'comment': Comment}
+
+
+def buffering_enabled():
+    return getattr(settings, 'VOTE_BUFFER_ENABLED', False)
+
+
+class VoteBuffer:
+    def __init__(self, interval_ms=250, max_pending=10000):
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # (kind, target_id, user_id) -> latest value, and
+        # (kind, target_id) -> [upvotes delta, downvotes delta], for the
+        # votes still buffered and for the batch currently being written
+        self._pending, self._deltas = {}, {}
+        self._flushing, self._flushing_deltas = {}, {}
+        self._worker = None
+        self._stopped = threading.Event()
+
+    def _current(self, key):
+        return self._pending.get(key, self._flushing.get(key))
+
+    def record(self, user, target, value):
+        """
+        Buffers user's click of value on target with the same toggle rules
+        as votes.apply_vote. Returns (value, projected score).
+        """
+        kind = target._meta.model_name
+        key = (kind, target.pk, user.pk)
+        with self._lock:
+            current = self._current(key)
+        if current is None:
+            current = Vote.objects.filter(user=user, **{kind: target}).values_list('value', flat=True).first() or 0
+
+        with self._lock:
+            buffered = self._current(key)
+            current = current if buffered is None else buffered
+            new_value = 0 if current == value else value
+            self._pending[key] = new_value
+            up, down = _counter_delta(current, new_value)
+            delta = self._deltas.setdefault((kind, target.pk), [0, 0])
+            delta[0] += up
+            delta[1] += down
+            in_flight = self._flushing_deltas.get((kind, target.pk), (0, 0))
+            projected = delta[0] - delta[1] + in_flight[0] - in_flight[1]
+            overflowing = len(self._pending) >= self.max_pending
+
+        score = MODELS[kind].objects.filter(pk=target.pk).values_list('score', flat=True).get() + projected
+        self._ensure_worker()
+        if overflowing:
+            self.flush()
+        target.score = score
+        return new_value, score
+
+    def flush(self):
+        """
+        Writes everything buffered so far. Returns the number of (user,
+        target) votes written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._pending = self._pending, {}
+                self._flushing_deltas, self._deltas = self._deltas, {}
+            pending = self._flushing
+            if not pending:
+                return 0
+            try:
+                posts = list(self._write(pending))
+            except Exception:
+                logger.exception('Could not write %d buffered votes; retrying on the next flush', len(pending))
+                self._requeue()
+                return 0
+            with self._lock:
+                self._flushing, self._flushing_deltas = {}, {}
+            for post in posts:
+                invalidate_post(post)
+            return len(pending)
+
+    def _requeue(self):
+        """
+        Puts the batch that failed to write back into the buffer. Clicks
+        buffered since then were resolved against it, so they win, and the
+        counter deltas of both add up.
+        """
+        with self._lock:
+            self._pending = {**self._flushing, **self._pending}
+            for target, (up, down) in self._flushing_deltas.items():
+                delta = self._deltas.setdefault(target, [0, 0])
+                delta[0] += up
+                delta[1] += down
+            self._flushing, self._flushing_deltas = {}, {}
+
+    def _write(self, pending):
+        touched_posts = set()
+        with transaction.atomic():
+            for kind, model in MODELS.items():
+                wanted = {
+                    (target_id, user_id): value
+                    for (entry_kind, target_id, user_id), value in pending.items() if entry_kind == kind
+                }
+                if not wanted:
+                    continue
+                # Drop votes on targets or by users deleted since the click,
+                # which would otherwise fail the batch on every retry
+                live = set(model.objects.filter(pk__in={t for t, _ in wanted}).values_list('pk', flat=True))
+                users = set(get_user_model().objects.filter(pk__in={u for _, u in wanted}).values_list('pk', flat=True))
+                wanted = {pair: value for pair, value in wanted.items() if pair[0] in live and pair[1] in users}
+
+                field = f'{kind}_id'
+                existing = {
+                    (getattr(vote, field), vote.user_id): vote
+                    for vote in Vote.objects.select_for_update().filter(
+                        **{f'{field}__in': {t for t, _ in wanted}, 'user_id__in': {u for _, u in wanted}}
+                    )
+                }
+
+                creates, updates, deletes, deltas = [], [], [], {}
+                for (target_id, user_id), value in wanted.items():
+                    vote = existing.get((target_id, user_id))
+                    old_value = vote.value if vote else 0
+                    if value == old_value:
+                        continue
+                    if vote is None:
+                        creates.append(Vote(user_id=user_id, value=value, **{field: target_id}))
+                    elif value == 0:
+                        deletes.append(vote.pk)
+                    else:
+                        vote.value = value
+                        updates.append(vote)
+                    up, down = _counter_delta(old_value, value)
+                    delta = deltas.setdefault(target_id, [0, 0])
+                    delta[0] += up
+                    delta[1] += down
+
+                Vote.objects.filter(pk__in=deletes).delete()
+                Vote.objects.bulk_update(updates, ['value'])
+                Vote.objects.bulk_create(creates)
+                for target_id, (up, down) in deltas.items():
+                    adjust_counters(model, target_id, up, down)
+
+                if kind == 'post':
+                    touched_posts.update(deltas)
+                    for post_id in deltas:
+                        refresh_post_ranking(post_id)
+                else:
+                    touched_posts.update(
+                        model.objects.filter(pk__in=list(deltas)).values_list('post_id', flat=True)
+                    )
+        return Post.objects.filter(pk__in=touched_posts).select_related('category')
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='vote-buffer', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+_lock_file = None
+
+
+def _claim_buffer_lock():
+    """
+    Takes VOTE_BUFFER_LOCK_FILE for the life of the process. Returns False
+    while another process holds it.
+    """
+    global _lock_file
+    if fcntl is None:
+        return True
+    default = os.path.join(tempfile.gettempdir(), 'community-vote-buffer.lock')
+    handle = open(getattr(settings, 'VOTE_BUFFER_LOCK_FILE', default), 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _lock_file = handle
+    return True
+
+
+def get_buffer():
+    """
+    Returns this process's buffer, or None when another process on the host
+    is already buffering votes.
+    """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                if not _claim_buffer_lock():
+                    return None
+                _buffer = VoteBuffer(
+                    interval_ms=getattr(settings, 'VOTE_BUFFER_FLUSH_MS', 250),
+                    max_pending=getattr(settings, 'VOTE_BUFFER_MAX_PENDING', 10000),
+                )
+                atexit.register(_buffer.stop)
+    return _buffer
+
+
+def cast_vote(user, target, value):
+    """
+    Entry point for the vote actions: buffers the vote when
+    VOTE_BUFFER_ENABLED is set, otherwise applies it immediately. Returns
+    (value, score) either way.
+    """
+    if buffering_enabled():
+        buffer = get_buffer()
+        if buffer is not None:
+            return buffer.record(user, target, value)
+        logger.error('Another process is buffering votes; applying this vote directly')
+    return apply_vote(user, target, value)
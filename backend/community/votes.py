@@ -0,0 +1,89 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Post, Vote
+from .ranking import refresh_post_ranking
+
+
+def _counter_delta(old_value, new_value):
+    """
+    Returns the (upvotes, downvotes) change caused by moving a vote from
+    old_value to new_value, where 0 means "no vote".
+    """
+    up = (new_value == 1) - (old_value == 1)
+    down = (new_value == -1) - (old_value == -1)
+    return up, down
+
+
+def adjust_counters(model, pk, up, down):
+    """
+    Applies a counter delta to a Post or Comment row with a single UPDATE.
+    """
+    if not up and not down:
+        return
+    model.objects.filter(pk=pk).update(
+        upvotes=F('upvotes') + up,
+        downvotes=F('downvotes') + down,
+        score=F('score') + up - down,
+    )
+
+
+def apply_vote(user, target, value):
+    """
+    Casts, flips or toggles off user's vote on target (a Post or Comment) and
+    keeps the target's counters in step, all in one transaction.
+
+    Returns (value, score) where value is the user's resulting vote (0 when
+    the vote was removed) and score is the target's updated score.
+    """
+    field = target._meta.model_name
+    model = type(target)
+
+    with transaction.atomic():
+        vote, created = Vote.objects.select_for_update().get_or_create(
+            user=user, **{field: target}, defaults={'value': value}
+        )
+
+        if created:
+            old_value, new_value = 0, value
+        elif vote.value == value:
+            # Toggle off if same vote
+            old_value, new_value = vote.value, 0
+            vote.delete()
+        else:
+            old_value, new_value = vote.value, value
+            vote.value = value
+            vote.save(update_fields=['value'])
+
+        adjust_counters(model, target.pk, *_counter_delta(old_value, new_value))
+        score = model.objects.filter(pk=target.pk).values_list('score', flat=True).get()
+        if model is Post:
+            refresh_post_ranking(target.pk)
+
+    target.score = score
+    return new_value, score
+
+
+def rebuild_vote_counters(model, vote_model, field):
+    """
+    Recomputes upvotes/downvotes/score for every row of model from the Vote
+    table. field is the Vote foreign key pointing at model ('post' or
+    'comment'). Takes the models as arguments so migrations can pass their
+    historical versions.
+    """
+    def tally(value):
+        votes = (
+            vote_model.objects
+            .filter(**{field: OuterRef('pk'), 'value': value})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return Coalesce(Subquery(votes), Value(0))
+
+    with transaction.atomic():
+        updated = model.objects.update(upvotes=tally(1), downvotes=tally(-1))
+        model.objects.update(score=F('upvotes') - F('downvotes'))
+    return updated
@@ -0,0 +1,97 @@
+"""
+Negotiated response compression.
+
+Like django.middleware.gzip.GZipMiddleware, but it also speaks brotli
+(when the brotli or brotlicffi package is installed) and is limited to
+what benefits from it: non-streaming responses of COMPRESSION_MIN_SIZE
+bytes or more with a textual content type, i.e. API JSON and the
+browsable API. Streams are left alone so Server-Sent Events and ranged
+video responses are not buffered, and images, videos and whitenoise's
+precompressed static files already carry their own encoding.
+"""
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+# Dynamic content: fast settings rather than the smallest output
+BROTLI_QUALITY = 4
+
+_coding_re = re.compile(r'^\s*([a-z*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def accepted_encodings(header):
+    """
+    Returns {coding: q} from an Accept-Encoding header.
+    """
+    accepted = {}
+    for part in header.lower().split(','):
+        match = _coding_re.match(part)
+        if not match:
+            continue
+        try:
+            accepted[match[1]] = float(match[2]) if match[2] else 1.0
+        except ValueError:
+            continue
+    return accepted
+
+
+def choose_encoding(header):
+    """
+    The coding to compress with for an Accept-Encoding header: brotli when
+    available and acceptable, else gzip, else None.
+    """
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get('*', 0)
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    best = max(candidates, key=lambda coding: accepted.get(coding, wildcard), default=None)
+    if best is None or accepted.get(best, wildcard) <= 0:
+        return None
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    # Same BREACH mitigation as GZipMiddleware
+    max_random_bytes = 100
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if encoding == 'br':
+            compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        else:
+            compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The body differs from the one the ETag was computed for
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,329 @@
+"""
+Per-route request metrics in the Prometheus text format.
+
+MetricsMiddleware records, for every request, the resolved route name
+(e.g. post-list, post-vote, comment-list; 'unmatched' for 404s outside any
+route), the method and the status:
+
+    api_requests_total                  counter
+    api_request_duration_seconds        histogram
+    api_request_db_queries              histogram of queries per request
+    api_request_db_duration_seconds     histogram of time spent in the database
+    api_response_size_bytes             histogram (skipped for streams of unknown length)
+
+Queries are counted by an execute wrapper installed on every database
+connection, attributed through a context variable so ORM calls made from
+sync_to_async threads under ASGI count towards their request.
+
+Metrics are aggregated in memory per process. Under gunicorn each worker
+only sees its own requests, so set METRICS_MULTIPROC_DIR to a directory
+shared by the workers: each worker then writes a snapshot there every
+METRICS_SYNC_INTERVAL seconds and /metrics sums all of them. Snapshots of
+exited workers are kept so counters never go backwards; empty the directory
+when the server is restarted.
+"""
+import atexit
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'api_requests_total': ('counter', 'Requests handled', None),
+    'api_request_duration_seconds': ('histogram', 'Time to produce the response', DURATION_BUCKETS),
+    'api_request_db_queries': ('histogram', 'Database queries per request', QUERY_BUCKETS),
+    'api_request_db_duration_seconds': ('histogram', 'Time spent in database queries per request', DURATION_BUCKETS),
+    'api_response_size_bytes': ('histogram', 'Response body size', SIZE_BUCKETS),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    """
+    Counters and histograms keyed by (metric name, label tuple).
+    Histograms are stored as per-bucket counts (the last one being +Inf)
+    plus the sum of observed values.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._worker = None
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.counters = {}
+        self.histograms = {}
+        self.dirty = False
+
+    def _check_fork(self):
+        # A forked worker must not report its parent's numbers as its own
+        if self.pid != os.getpid():
+            self._reset()
+            self._worker = None
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._check_fork()
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self.dirty = True
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self._lock:
+            self._check_fork()
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = [[0] * (len(buckets) + 1), 0]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            self.dirty = True
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            self.dirty = False
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, labels, list(counts), total] for (name, labels), (counts, total) in self.histograms.items()
+                ],
+            }
+
+    def write_snapshot(self, directory):
+        """
+        Atomically replaces this process's snapshot file in directory.
+        """
+        data = json.dumps(self.snapshot())
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(directory, f'metrics-{os.getpid()}.json'))
+
+    def ensure_sync(self, directory, interval):
+        """
+        Starts the thread that writes this process's snapshot every
+        interval seconds while there is something new to write.
+        """
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            os.makedirs(directory, exist_ok=True)
+
+            def run():
+                while True:
+                    time.sleep(interval)
+                    if self.dirty:
+                        self.sync(directory)
+
+            self._worker = threading.Thread(target=run, name='metrics-sync', daemon=True)
+            self._worker.start()
+            atexit.register(self.sync, directory)
+
+    def sync(self, directory):
+        # Skip the write if the directory was removed under a running
+        # server, rather than killing the sync thread or the exit hook
+        try:
+            self.write_snapshot(directory)
+        except OSError:
+            pass
+
+
+registry = Registry()
+
+
+def multiproc_dir():
+    return getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+
+
+def collect():
+    """
+    Returns the snapshot to expose: this process's, or with
+    METRICS_MULTIPROC_DIR the sum over every worker's snapshot file.
+    """
+    directory = multiproc_dir()
+    if not directory:
+        return registry.snapshot()
+
+    registry.write_snapshot(directory)
+    counters, histograms = {}, {}
+    for filename in os.listdir(directory):
+        if not (filename.startswith('metrics-') and filename.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, counts, total] for (name, labels), (counts, total) in histograms.items()],
+    }
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """
+    Formats a snapshot in the Prometheus text exposition format.
+    """
+    samples = {name: [] for name in METRICS}
+    for name, labels, value in sorted(snapshot['counters']):
+        samples[name].append(f'{name}{{{_format_labels(labels)}}} {_format_number(value)}')
+    for name, labels, counts, total in sorted(snapshot['histograms']):
+        labels = _format_labels(labels)
+        cumulative = 0
+        for bound, count in zip(METRICS[name][2] + ('+Inf',), counts):
+            cumulative += count
+            samples[name].append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        samples[name].append(f'{name}_sum{{{labels}}} {_format_number(total)}')
+        samples[name].append(f'{name}_count{{{labels}}} {cumulative}')
+
+    lines = []
+    for name, (kind, help_text, _) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples[name])
+    return '\n'.join(lines) + '\n'
+
+
+class QueryStats:
+    __slots__ = ('count', 'duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+_current_stats = contextvars.ContextVar('metrics_query_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.duration += time.perf_counter() - started
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    length = response.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    def start(self):
+        # Connections opened before this module was imported missed the signal
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        stats = QueryStats()
+        return stats, _current_stats.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, started):
+        duration = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else 'unmatched'
+        labels = (('route', route), ('method', request.method))
+
+        registry.inc('api_requests_total', labels + (('status', str(response.status_code)),))
+        registry.observe('api_request_duration_seconds', labels, duration)
+        registry.observe('api_request_db_queries', labels, stats.count)
+        registry.observe('api_request_db_duration_seconds', labels, stats.duration)
+        size = response_size(response)
+        if size is not None:
+            registry.observe('api_response_size_bytes', labels, size)
+
+        directory = multiproc_dir()
+        if directory:
+            registry.ensure_sync(directory, getattr(settings, 'METRICS_SYNC_INTERVAL', 1))
+
+
+class MetricsView(APIView):
+    """
+    Prometheus scrape endpoint. Staff only; point the scraper at it with a
+    staff user's bearer token.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
@@ -0,0 +1,76 @@
+"""
+orjson-backed JSON renderer and parser for DRF.
+
+Drop-in replacements for rest_framework's JSONRenderer and JSONParser that
+encode/decode with orjson when it is installed and fall back to the stdlib
+json module (i.e. the DRF classes) when it is not. Output matches
+JSONRenderer's compact, non-ASCII-escaped JSON (the DRF defaults) except
+for float spelling (1e-7 vs 1e-07) and NaN/Infinity, which orjson writes
+as null: types orjson does not handle natively, and datetimes, go through
+DRF's JSONEncoder, and U+2028/U+2029 are still escaped. Pretty-printed
+output (the browsable API, '; indent=' media types) always uses the stdlib.
+"""
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """
+    Compact JSON bytes for data, as FastJSONRenderer renders it. For code
+    that builds responses outside DRF's renderer machinery.
+    """
+    return FastJSONRenderer().render(data)
+
+
+def loads(data):
+    """
+    Decodes JSON bytes or str with orjson when installed. Raises ValueError
+    (which both libraries' decode errors subclass) for malformed input.
+    """
+    if orjson is None:
+        return json.loads(data)
+    return orjson.loads(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits; the stdlib either copes or
+            # raises the error DRF would have raised
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding') or 'utf-8'
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
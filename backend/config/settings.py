@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.metrics.MetricsMiddleware',
+    'config.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -96,6 +98,21 @@ if database_url:
     DATABASES["default"] = dj_database_url.parse(database_url)
 
 
+# Cache
+# Local memory by default; set CACHE_BACKEND/CACHE_LOCATION to a shared backend
+# (e.g. django.core.cache.backends.redis.RedisCache) when running several workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'community'),
+    }
+}
+
+COMMUNITY_CACHE_ALIAS = 'default'
+COMMUNITY_CACHE_TIMEOUT = int(os.environ.get('COMMUNITY_CACHE_TIMEOUT', 60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -141,12 +158,34 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
+# JSON is rendered and parsed with orjson when it is installed (config.renderers)
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'users.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'config.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'config.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # Writes by accounts deleted mid-request get a 401 instead of a 500
+    'EXCEPTION_HANDLER': 'users.exceptions.exception_handler',
+}
+
+# Token-bucket limits for login/registration (users.throttling), per worker process
+AUTH_THROTTLE_RATES = {
+    'login': '10/min',
+    'login_account': '5/min',
+    'register': '5/hour',
 }
 
+# Per-process cache for users of tokens issued without role/is_staff claims
+JWT_USER_CACHE_TTL = 30
+
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -155,10 +194,41 @@ SIMPLE_JWT = {
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# EmailBackend also accepts usernames, so ModelBackend would only repeat a failed lookup
 AUTHENTICATION_BACKENDS = [
     'users.authentication.EmailBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Chunked video uploads
+CHUNKED_UPLOAD_DIR = os.environ.get('CHUNKED_UPLOAD_DIR', str(BASE_DIR / 'tmp_uploads'))
+MAX_VIDEO_UPLOAD_SIZE = int(os.environ.get('MAX_VIDEO_UPLOAD_SIZE', 2 * 1024 ** 3))
+MAX_VIDEO_CHUNK_SIZE = 16 * 1024 ** 2
+
+# Concurrent storage writes for multi-image posts
+POST_IMAGE_UPLOAD_WORKERS = int(os.environ.get('POST_IMAGE_UPLOAD_WORKERS', 4))
+
+# Live update events (community.events); use community.events.RedisEventBackend
+# with COMMUNITY_EVENT_REDIS_URL when running more than one process.
+COMMUNITY_EVENT_BACKEND = os.environ.get('COMMUNITY_EVENT_BACKEND', 'community.events.LocalEventBackend')
+COMMUNITY_EVENT_REDIS_URL = os.environ.get('COMMUNITY_EVENT_REDIS_URL')
+
+# Write-coalescing vote ingestion (community.vote_buffer); off by default.
+# The buffer is per process: only one process per host may buffer (enforced
+# with a lock on VOTE_BUFFER_LOCK_FILE), so enable it with a single worker.
+VOTE_BUFFER_ENABLED = os.environ.get('VOTE_BUFFER_ENABLED', 'False').lower() == 'true'
+VOTE_BUFFER_FLUSH_MS = int(os.environ.get('VOTE_BUFFER_FLUSH_MS', 250))
+VOTE_BUFFER_MAX_PENDING = 10000
+VOTE_BUFFER_LOCK_FILE = os.environ.get('VOTE_BUFFER_LOCK_FILE', str(BASE_DIR / 'vote-buffer.lock'))
+
+# Per-route request metrics (config.metrics), served to staff at /metrics. Set
+# METRICS_MULTIPROC_DIR to a directory shared by all workers to aggregate
+# across gunicorn/uvicorn worker processes.
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+METRICS_SYNC_INTERVAL = 1
+
+# API responses of at least this many bytes are sent gzip- or brotli-encoded
+# when the client accepts it (config.compression)
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
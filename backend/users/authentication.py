@@ -1,14 +1,116 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
+from django.db import router
+from django.db.models import Q
+from django.db.models.functions import Lower
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+# Claims copied into every token by CustomTokenObtainPairSerializer
+USER_CLAIMS = ('role', 'is_staff')
 
 class EmailBackend(ModelBackend):
+    """
+    Logs users in by email (case-insensitive, through the
+    users_user_email_ci_unique index) or by username, with a single indexed
+    query per attempt. Replaces ModelBackend in AUTHENTICATION_BACKENDS.
+    """
     def authenticate(self, request, username=None, password=None, **kwargs):
         UserModel = get_user_model()
-        try:
-            user = UserModel.objects.get(email=username)
-        except UserModel.DoesNotExist:
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
             return None
-        
-        if user.check_password(password):
+
+        by_username = Q(**{UserModel.USERNAME_FIELD: username})
+        if '@' in username:
+            # Usernames may contain '@' too; an email match wins.
+            by_email = Q(email_lower=username.lower()) & ~Q(email='')
+            candidates = UserModel._default_manager.alias(email_lower=Lower('email')).filter(by_email | by_username)[:2]
+            candidates = sorted(candidates, key=lambda user: user.email.lower() != username.lower())
+        else:
+            candidates = UserModel._default_manager.filter(by_username)[:1]
+
+        if not candidates:
+            # Run the hasher anyway so timing doesn't reveal unknown accounts
+            UserModel().set_password(password)
+            return None
+        user = candidates[0]
+        if user.check_password(password) and self.user_can_authenticate(user):
             return user
         return None
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that does not load the user row on every request.
+
+    For safe (read) requests, tokens carrying the USER_CLAIMS are turned
+    into a User instance with only the id and those claims loaded; the
+    remaining fields are deferred and the first access to any of them loads
+    them all in one query (see User.refresh_from_db). Older tokens without
+    the claims fall back to a database lookup, cached per process for
+    JWT_USER_CACHE_TTL seconds.
+
+    The trade-off: until the access token expires (ACCESS_TOKEN_LIFETIME),
+    reads authorize from the claims even if the account has since been
+    deactivated, deleted or had its role changed. Writes do not take that
+    risk: unsafe requests always load the user row, so a deleted or
+    inactive account gets a 401 there. Refreshing (CustomTokenRefreshView)
+    refuses such accounts and stamps the claims from the current row.
+    """
+    _user_cache = {}
+    _user_cache_lock = threading.Lock()
+    verify_account = False
+
+    def authenticate(self, request):
+        self.verify_account = request.method not in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if (
+            self.verify_account or api_settings.CHECK_REVOKE_TOKEN
+            or api_settings.USER_ID_CLAIM not in validated_token
+        ):
+            return super().get_user(validated_token)
+        if all(claim in validated_token for claim in USER_CLAIMS):
+            return self.user_from_claims(validated_token)
+        return self.cached_user(validated_token)
+
+    def user_from_claims(self, validated_token):
+        user_model = self.user_model
+        id_field = user_model._meta.get_field(api_settings.USER_ID_FIELD)
+        values = {
+            id_field.attname: id_field.to_python(validated_token[api_settings.USER_ID_CLAIM]),
+            **{claim: validated_token[claim] for claim in USER_CLAIMS},
+        }
+        if id_field.attname != user_model._meta.pk.attname:
+            # Claims identify the user by a non-pk field; look the row up.
+            return super().get_user(validated_token)
+        # from_db expects the loaded values in concrete field order
+        names = [field.attname for field in user_model._meta.concrete_fields if field.attname in values]
+        user = user_model.from_db(router.db_for_read(user_model), names, [values[name] for name in names])
+        user._loaded_from_claims = True
+        return user
+
+    def cached_user(self, validated_token):
+        key = validated_token[api_settings.USER_ID_CLAIM]
+        ttl = getattr(settings, 'JWT_USER_CACHE_TTL', 30)
+        now = time.monotonic()
+        with self._user_cache_lock:
+            entry = self._user_cache.get(key)
+        if entry is not None and entry[0] > now:
+            # Requests must not share one mutable instance
+            return copy.copy(entry[1])
+
+        user = super().get_user(validated_token)
+        with self._user_cache_lock:
+            if len(self._user_cache) >= getattr(settings, 'JWT_USER_CACHE_SIZE', 1000):
+                self._user_cache.clear()
+            self._user_cache[key] = (now + ttl, user)
+        return copy.copy(user)
@@ -0,0 +1,21 @@
+"""
+DRF exception handler (REST_FRAMEWORK['EXCEPTION_HANDLER']).
+"""
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.views import exception_handler as drf_exception_handler
+
+
+def exception_handler(exc, context):
+    """
+    DRF's handler, except that an IntegrityError raised for an account that
+    no longer exists gets a 401 rather than a 500. That happens when the
+    account is deleted after authentication but before the write that
+    references it, so the foreign key fails.
+    """
+    if isinstance(exc, IntegrityError):
+        user = getattr(context.get('request'), 'user', None)
+        if user is not None and user.is_authenticated and not get_user_model()._default_manager.filter(pk=user.pk).exists():
+            exc = AuthenticationFailed('User not found', code='user_not_found')
+    return drf_exception_handler(exc, context)
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:28
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    Refuses to build the index while two accounts share an email (ignoring
+    case); they have to be merged or renamed by hand first.
+    """
+    User = apps.get_model('users', 'User')
+    duplicates = list(
+        User.objects.exclude(email='')
+        .annotate(email_lower=Lower('email'))
+        .values('email_lower')
+        .annotate(total=Count('pk'))
+        .filter(total__gt=1)
+        .values_list('email_lower', flat=True)
+    )
+    if duplicates:
+        accounts = [
+            f"{email}: {', '.join(User.objects.filter(email__iexact=email).values_list('username', flat=True))}"
+            for email in duplicates
+        ]
+        raise RuntimeError(
+            "Cannot add the case-insensitive unique email index; these emails are used by more than one "
+            "account:\n  " + "\n  ".join(accounts)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='users_user_email_ci_unique'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 
 class User(AbstractUser):
     class Role(models.TextChoices):
@@ -9,7 +10,27 @@ class User(AbstractUser):
 
     role = models.CharField(max_length=50, choices=Role.choices, default=Role.STUDENT)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(blank=True)
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Backs case-insensitive email login (users.authentication.EmailBackend)
+            models.UniqueConstraint(
+                Lower('email'),
+                condition=~models.Q(email=''),
+                name='users_user_email_ci_unique',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.role})"
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Users built from token claims (users.authentication) have most
+        # fields deferred; load all of them on the first access instead of
+        # one query per field.
+        if fields is not None and getattr(self, '_loaded_from_claims', False):
+            fields = list({*fields, *self.get_deferred_fields()})
+            self._loaded_from_claims = False
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
@@ -1,20 +1,54 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Lower
+from community.imaging import StrippedImageField, srcset
 
 User = get_user_model()
 
+def validate_unique_email(value, instance=None):
+    # Mirrors the case-insensitive unique index on email
+    if not value:
+        return value
+    others = User.objects.exclude(email='').alias(email_lower=Lower('email')).filter(email_lower=value.lower())
+    if instance is not None:
+        others = others.exclude(pk=instance.pk)
+    if others.exists():
+        raise serializers.ValidationError('A user with that email already exists.')
+    return value
+
 class UserSerializer(serializers.ModelSerializer):
+    profile_picture = StrippedImageField(required=False, allow_null=True)
+    profile_picture_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ('id', 'username', 'email', 'role', 'profile_picture', 'bio', 'date_joined')
+        fields = ('id', 'username', 'email', 'role', 'profile_picture', 'profile_picture_srcset', 'bio', 'date_joined')
         read_only_fields = ('id', 'date_joined')
 
+    def validate_email(self, value):
+        return validate_unique_email(value, self.instance)
+
+    def get_profile_picture_srcset(self, obj):
+        return srcset(obj.profile_picture, obj.profile_picture_variants)
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """
+    Public byline for list items: no email, bio or join date.
+    """
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'role', 'profile_picture')
+        read_only_fields = fields
+
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     
     class Meta:
         model = User
         fields = ('username', 'email', 'password', 'role')
+
+    def validate_email(self, value):
+        return validate_unique_email(value)
     
     def create(self, validated_data):
         user = User.objects.create_user(
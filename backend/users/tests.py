@@ -1,3 +1,167 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate, get_user_model
+from django.db import IntegrityError
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from community.models import Category, Post
+from .throttling import LoginAccountThrottle, LoginRateThrottle
+from .token_views import CustomTokenObtainPairSerializer
+
+User = get_user_model()
+
+
+def reset_login_throttles():
+    for throttle in (LoginRateThrottle, LoginAccountThrottle):
+        throttle._buckets.clear()
+
+
+class TokenTestCase(APITestCase):
+    def setUp(self):
+        reset_login_throttles()
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw', role='FACULTY')
+        self.user = User.objects.create_user('ada', 'ada@example.com', 'secret-pw', role='FACULTY')
+        category = Category.objects.create(name='General', slug='general', created_by=self.author)
+        self.post = Post.objects.create(author=self.author, category=category, title='Hello', content='World')
+
+    def tokens(self, user):
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
+        return str(refresh.access_token), str(refresh)
+
+    def use(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def comment(self):
+        return self.client.post('/api/community/comments/', {'post': self.post.pk, 'content': 'Hi'}, format='json')
+
+    def refresh(self, token):
+        return self.client.post('/api/users/token/refresh/', {'refresh': token}, format='json')
+
+
+class ClaimsAuthenticationTests(TokenTestCase):
+    def test_login_tokens_carry_the_claims(self):
+        response = self.client.post('/api/users/login/', {'username': 'ada', 'password': 'secret-pw'}, format='json')
+        token = AccessToken(response.data['access'])
+        self.assertEqual((token['role'], token['is_staff']), ('FACULTY', False))
+        self.assertEqual(response.data['user']['username'], 'ada')
+
+    def test_writes_by_a_deleted_account_are_unauthorized(self):
+        access, _ = self.tokens(self.user)
+        self.user.delete()
+        self.use(access)
+        self.assertEqual(self.comment().status_code, 401)
+
+    def test_writes_by_an_inactive_account_are_unauthorized(self):
+        access, _ = self.tokens(self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.use(access)
+        self.assertEqual(self.comment().status_code, 401)
+        # Reads keep trusting the claims until the token expires
+        self.assertEqual(self.client.get('/api/community/posts/').status_code, 200)
+
+    def test_writes_use_the_stored_role(self):
+        access, _ = self.tokens(self.user)
+        User.objects.filter(pk=self.user.pk).update(role='STUDENT')
+        self.use(access)
+        response = self.client.post(
+            '/api/community/posts/', {'category': self.post.category_id, 'title': 'New', 'content': 'Post'}, format='json',
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.comment().status_code, 201)
+
+
+class TokenRefreshTests(TokenTestCase):
+    def test_refresh_stamps_the_current_claims(self):
+        _, refresh = self.tokens(self.user)
+        User.objects.filter(pk=self.user.pk).update(role='STUDENT', is_staff=True)
+        response = self.refresh(refresh)
+        self.assertEqual(response.status_code, 200)
+        token = AccessToken(response.data['access'])
+        self.assertEqual((token['role'], token['is_staff']), ('STUDENT', True))
+
+    def test_refresh_refuses_deleted_and_inactive_accounts(self):
+        _, refresh = self.tokens(self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+        self.user.delete()
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+
+    def test_invalid_refresh_token(self):
+        self.assertEqual(self.refresh('not-a-token').status_code, 401)
+
+
+class DeletedMidRequestTests(APITransactionTestCase):
+    def test_foreign_key_failure_is_unauthorized(self):
+        author = User.objects.create_user('author', 'author@example.com', 'pw', role='FACULTY')
+        category = Category.objects.create(name='General', slug='general', created_by=author)
+        post = Post.objects.create(author=author, category=category, title='Hello', content='World')
+        user = User.objects.create_user('ada', 'ada@example.com', 'pw')
+        # Authenticated, then deleted before the comment row is written
+        self.client.force_authenticate(user)
+        User.objects.filter(pk=user.pk).delete()
+
+        response = self.client.post('/api/community/comments/', {'post': post.pk, 'content': 'Hi'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class LoginThrottleTests(APITestCase):
+    def setUp(self):
+        reset_login_throttles()
+        # Password hashing is slow enough for buckets to refill mid-test
+        clock = mock.patch('users.throttling.time')
+        clock.start().monotonic.return_value = 1000.0
+        self.addCleanup(clock.stop)
+        User.objects.create_user('ada', 'ada@example.com', 'secret-pw')
+
+    def login(self, password, username='ada', address='10.0.0.1'):
+        return self.client.post(
+            '/api/users/login/', {'username': username, 'password': password}, format='json', REMOTE_ADDR=address,
+        )
+
+    def test_successful_logins_do_not_spend_the_account_bucket(self):
+        for i in range(8):
+            self.assertEqual(self.login('secret-pw', address=f'10.0.0.{i}').status_code, 200)
+
+    def test_failures_from_any_address_lock_the_account(self):
+        for i in range(5):
+            self.assertEqual(self.login('wrong', address=f'10.0.1.{i}').status_code, 401)
+        response = self.login('secret-pw', address='10.0.2.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.login('wrong', username='someone-else', address='10.0.2.1').status_code, 401)
+
+    def test_every_attempt_spends_the_address_bucket(self):
+        for _ in range(10):
+            self.login('secret-pw')
+        self.assertEqual(self.login('secret-pw').status_code, 429)
+        self.assertEqual(self.login('secret-pw', address='10.0.0.2').status_code, 200)
+
+
+class EmailBackendTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ada', 'Ada@Example.com', 'secret-pw')
+
+    def test_email_login_ignores_case_and_usernames_still_work(self):
+        self.assertEqual(authenticate(username='ada@example.COM', password='secret-pw'), self.user)
+        self.assertEqual(authenticate(username='ada', password='secret-pw'), self.user)
+        self.assertIsNone(authenticate(username='ada@example.com', password='wrong'))
+        self.assertIsNone(authenticate(username='nobody@example.com', password='secret-pw'))
+
+    def test_email_login_is_one_query(self):
+        with self.assertNumQueries(1):
+            authenticate(username='ADA@example.com', password='wrong')
+
+    def test_emails_are_unique_ignoring_case(self):
+        with self.assertRaises(IntegrityError):
+            User.objects.create_user('grace', 'ada@EXAMPLE.com', 'pw')
+
+    def test_profile_edits_cannot_take_another_accounts_email(self):
+        grace = User.objects.create_user('grace', 'grace@example.com', 'pw')
+        self.client.force_authenticate(grace)
+        response = self.client.patch('/api/users/profile/', {'email': 'ADA@example.com'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.data)
+        # Changing the case of one's own address is fine
+        response = self.client.patch('/api/users/profile/', {'email': 'Grace@Example.com'}, format='json')
+        self.assertEqual((response.status_code, response.data['email']), (200, 'Grace@Example.com'))
@@ -0,0 +1,125 @@
+"""
+In-memory token-bucket throttles for the authentication endpoints.
+
+Each client gets a bucket of `count` tokens refilled at count/period; a
+request spends one token and is rejected (429 with Retry-After) when the
+bucket is empty. Unlike a fixed window this allows short bursts while
+capping the sustained rate, so brute-force attempts against password
+hashing cannot monopolise the workers (the per-account login bucket is
+only spent by failed logins). Buckets live in process memory:
+each worker process throttles independently, at no cache round-trip cost.
+"""
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+DEFAULT_RATES = {
+    'login': '10/min',
+    'login_account': '5/min',
+    'register': '5/hour',
+}
+MAX_BUCKETS = 10000
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    '10/min' -> (10, 60.0)
+    """
+    count, period = rate.split('/')
+    return int(count), float(PERIODS[period[0]])
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+    _buckets = None
+    _lock = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # One bucket table per throttle class
+        cls._buckets = {}
+        cls._lock = threading.Lock()
+
+    def __init__(self):
+        rates = {**DEFAULT_RATES, **getattr(settings, 'AUTH_THROTTLE_RATES', {})}
+        self.capacity, period = parse_rate(rates[self.scope])
+        self.refill_rate = self.capacity / period
+        self.retry_after = None
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+    def allow_request(self, request, view):
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+        return self.take(key)
+
+    def take(self, key, spend=True):
+        """
+        Returns whether key's bucket holds a token, spending it if spend is
+        set.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self.retry_after = (1 - tokens) / self.refill_rate
+                return False
+            if spend:
+                if len(self._buckets) >= MAX_BUCKETS:
+                    self._prune(now)
+                self._buckets[key] = (tokens - 1, now)
+        return True
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state
+        full = [
+            key for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self.refill_rate >= self.capacity
+        ]
+        for key in full:
+            del self._buckets[key]
+        if len(self._buckets) >= MAX_BUCKETS:
+            self._buckets.clear()
+
+    def wait(self):
+        return self.retry_after
+
+
+class LoginRateThrottle(TokenBucketThrottle):
+    scope = 'login'
+
+
+class LoginAccountThrottle(TokenBucketThrottle):
+    """
+    Limits failed logins against one account from any number of addresses.
+    Only failures spend a token (the view calls record_failure), so the
+    owner's successful logins never count against them; once the bucket is
+    empty every attempt is refused, including correct ones. Raw attempts
+    are capped per address by LoginRateThrottle.
+    """
+    scope = 'login_account'
+
+    def get_key(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        return str(username).lower() if username else None
+
+    def allow_request(self, request, view):
+        key = self.get_key(request, view)
+        return key is None or self.take(key, spend=False)
+
+    def record_failure(self, request, view):
+        key = self.get_key(request, view)
+        if key is not None:
+            self.take(key)
+
+
+class RegisterRateThrottle(TokenBucketThrottle):
+    scope = 'register'
@@ -1,7 +1,23 @@
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.views import TokenObtainPairView
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+from .authentication import USER_CLAIMS
+from .throttling import LoginAccountThrottle, LoginRateThrottle
+
+def stamp_user_claims(token, user):
+    # Lets ClaimsJWTAuthentication authorize requests without loading the user
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return stamp_user_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)
         # Add extra responses to the dashboard
@@ -15,3 +31,32 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = (LoginRateThrottle, LoginAccountThrottle)
+
+    def post(self, request, *args, **kwargs):
+        try:
+            return super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            LoginAccountThrottle().record_failure(request, self)
+            raise
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Reloads the user before issuing a new access token: deleted and
+    inactive accounts get a 401, and the USER_CLAIMS are stamped from the
+    current row instead of being copied from the refresh token, so role and
+    staff changes take effect at the next refresh.
+    """
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = get_user_model()._default_manager.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        # The re-signed token keeps its jti and expiry, so rotation and
+        # blacklisting in the parent class work unchanged
+        stamp_user_claims(refresh, user)
+        return super().validate({**attrs, 'refresh': str(refresh)})
+
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
@@ -1,7 +1,9 @@
 from rest_framework import generics, permissions
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
+from community.cache import invalidate_users
 from .serializers import RegisterSerializer, UserSerializer
+from .throttling import RegisterRateThrottle
 
 User = get_user_model()
 
@@ -9,6 +11,7 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (permissions.AllowAny,)
     serializer_class = RegisterSerializer
+    throttle_classes = (RegisterRateThrottle,)
 
 class UserProfileView(generics.RetrieveUpdateAPIView):
     queryset = User.objects.all()
@@ -16,4 +19,10 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
 
     def get_object(self):
-        return self.request.user
+        # request.user may only carry the token claims; edit the stored row
+        return User.objects.get(pk=self.request.user.pk)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        # Posts, comments and categories embed their author's profile
+        invalidate_users()
@@ -73,6 +73,9 @@ const PostCard = ({ post }) => {
         }
     };
 
+    // Feed items carry an excerpt; full posts (e.g. saved items) carry the content
+    const text = post.excerpt ?? post.content;
+
     // Determine which image to show
     let displayImage = null;
     if (post.images && post.images.length > 0) {
@@ -132,7 +135,7 @@ const PostCard = ({ post }) => {
 
                     {/* Post Body/Media */}
                     <div className="mb-2">
-                        {post.content && <p className="text-sm text-gray-800 mb-3 whitespace-pre-wrap">{post.content}</p>}
+                        {text && <p className="text-sm text-gray-800 mb-3 whitespace-pre-wrap">{text}</p>}
 
                         {imageUrl && (
                             <div className="rounded-lg overflow-hidden border border-gray-200 bg-black flex justify-center items-center relative max-h-[512px]">
@@ -228,6 +228,11 @@ export const apiSlice = createApi({
                     ]
                     : ['SavedPost'],
         }),
+        getSavedPostIds: builder.query({
+            query: () => 'community/posts/saved-ids/',
+            transformResponse: (response) => response.ids,
+            providesTags: ['SavedPost'],
+        }),
         createCategory: builder.mutation({
             query: (data) => ({
                 url: 'community/categories/',
@@ -272,6 +277,7 @@ export const {
     useVoteCommentMutation,
     useSavePostMutation,
     useGetSavedPostsQuery,
+    useGetSavedPostIdsQuery,
     useCreateCategoryMutation,
     useDeleteCategoryMutation,
     useDeletePostImageMutation,
@@ -94,7 +94,7 @@ const CategoryPage = () => {
 
                                 {/* Post Body/Media */}
                                 <div className="mb-2">
-                                    {post.content && <p className="text-sm text-gray-800 mb-3 whitespace-pre-wrap">{post.content}</p>}
+                                    {(post.excerpt ?? post.content) && <p className="text-sm text-gray-800 mb-3 whitespace-pre-wrap">{post.excerpt ?? post.content}</p>}
 
                                     {(post.images?.length > 0 || post.image) && (
                                         <div className="rounded-lg overflow-hidden border border-gray-200 bg-black flex justify-center max-h-[512px]">
@@ -178,7 +178,7 @@ const DashboardPage = () => {
                                                 </div>
                                             </div>
                                             <p className="text-sm text-gray-500 line-clamp-2 mt-1">
-                                                {post.content || 'No text content'}
+                                                {post.excerpt || post.content || 'No text content'}
                                             </p>
                                             <div className="flex items-center space-x-4 mt-2 text-xs text-gray-500">
                                                 <span className="flex items-center">